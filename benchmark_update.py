@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+更新程序端到端性能测试
+启动本地模拟更新源（mock_release_server.py），在临时目录中放置旧版本程序，
+通过 UpdateWorker 依次执行检查、下载、安装，分别记录各阶段耗时和各源传输的数据量
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import statistics
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+# 添加程序目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PySide2.QtCore import QCoreApplication, QEventLoop, QTimer
+from update import UpdateChecker, UpdateWorker, VersionType
+from mock_release_server import (MockReleaseServer, SOURCES, make_bundle, change_bundle,
+                                 write_bundle, package_assets)
+
+STAGES = ('check', 'download', 'install')
+
+
+class PipelineRun:
+    """按界面中的顺序驱动 UpdateWorker：检查完成后下载，下载完成后安装"""
+
+    def __init__(self, checker, timeout):
+        self.checker = checker
+        self.worker = UpdateWorker(checker)
+        self.timeout = timeout
+        self.loop = QEventLoop()
+        self.timings = {}
+        self.started = None
+        self.result = {}
+        self.error = None
+        self.worker.log_signal.connect(self.on_log)
+        self.worker.check_finished_signal.connect(lambda source: self.result.update(source=source))
+        self.worker.download_finished_signal.connect(
+            lambda success, filename: self.result.update(downloaded=success, filename=filename))
+        self.worker.install_finished_signal.connect(lambda success: self.result.update(installed=success))
+        self.worker.finished.connect(self.next_stage)
+
+    def on_log(self, msg):
+        self.error = msg
+
+    def run(self):
+        QTimer.singleShot(int(self.timeout * 1000), lambda: self.fail("超时"))
+        self.started = time.perf_counter()
+        self.worker.run_check(force=True)
+        self.loop.exec_()
+        return self.error is None
+
+    def fail(self, message):
+        if self.error is None:
+            self.error = message
+        self.loop.quit()
+
+    def next_stage(self):
+        now = time.perf_counter()
+        self.timings[self.worker.task] = now - self.started
+        self.started = now
+        if self.worker.task == 'check':
+            source = self.result.get('source')
+            if not source:
+                return self.fail("未检查到新版本")
+            release = source['release']
+            url = self.checker.find_download_url(release, release['tag_name'])
+            if not url:
+                return self.fail("未找到下载地址")
+            self.worker.run_download(url, self.checker.package_filename(release['tag_name']), release)
+        elif self.worker.task == 'download':
+            if not self.result.get('downloaded'):
+                return self.fail("下载失败")
+            self.worker.run_install(self.result['filename'], self.result['source']['release']['tag_name'])
+        else:
+            if not self.result.get('installed'):
+                self.error = self.error or "安装失败"
+            self.loop.quit()
+
+
+def run_round(server, old_files, args):
+    """在新的临时目录中完成一次更新，返回各阶段耗时和传输量"""
+    work_dir = tempfile.mkdtemp(prefix='update_bench_')
+    previous_dir = os.getcwd()
+    logs = []
+    try:
+        write_bundle(old_files, work_dir)
+        # 更新程序以工作目录为程序目录
+        os.chdir(work_dir)
+        checker = UpdateChecker(
+            log_callback=logs.append,
+            progress_callback=None,
+            version_type=VersionType(args.version_type),
+            cache_ttl=0,
+            download_segments=args.segments,
+            min_download_speed=args.min_speed,
+            side_by_side=not args.in_place,
+            endpoints=server.endpoints(),
+        )
+        server.reset_stats()
+        pipeline = PipelineRun(checker, args.timeout)
+        ok = pipeline.run()
+        if args.verbose:
+            print('\n'.join(logs))
+        return {
+            'ok': ok,
+            'error': pipeline.error,
+            'seconds': {stage: round(pipeline.timings.get(stage, 0.0), 4) for stage in STAGES},
+            'total': round(sum(pipeline.timings.values()), 4),
+            'delta': pipeline.result.get('filename', '').endswith('.delta.zip'),
+            'bytes': {source: server.stats[source]['bytes'] for source in SOURCES},
+            'requests': {source: server.stats[source]['requests'] for source in SOURCES},
+        }
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def summarize(rounds):
+    summary = {}
+    for key in STAGES + ('total',):
+        values = [r['seconds'][key] if key in STAGES else r['total'] for r in rounds if r['ok']]
+        if values:
+            summary[key] = {'median': round(statistics.median(values), 4),
+                            'min': round(min(values), 4), 'max': round(max(values), 4)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="更新程序端到端性能测试（本地模拟更新源）")
+    parser.add_argument('--rounds', type=int, default=3, help="重复次数，默认 3")
+    parser.add_argument('--files', type=int, default=40, help="模拟程序的文件数，默认 40")
+    parser.add_argument('--size', type=float, default=8, help="模拟程序的总大小(MB)，默认 8")
+    parser.add_argument('--changed', type=float, default=0.1, help="新版本中修改的文件比例，默认 0.1")
+    parser.add_argument('--no-manifest', action='store_true', help="不发布文件清单，强制完整下载")
+    parser.add_argument('--in-place', action='store_true', help="覆盖安装而不是并列安装")
+    parser.add_argument('--version-type', choices=['pyinstaller', 'nuitka'], default='pyinstaller')
+    parser.add_argument('--segments', type=int, default=1, help="并行下载的分段数，默认 1")
+    parser.add_argument('--min-speed', type=int, default=0, help="切换下载源的速度下限(KB/s)，默认 0")
+    parser.add_argument('--latency', type=float, default=0.0, help="所有源的请求延迟(秒)")
+    parser.add_argument('--bandwidth', type=int, default=0, help="所有源每个连接的带宽上限(KB/s)")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="请求直接失败的概率")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="下载中途断开的概率")
+    parser.add_argument('--source', action='append', default=[], metavar='源:参数=值',
+                        help="单独设置某个源，如 github:bandwidth=64 或 mirror:latency=0.5，可重复")
+    parser.add_argument('--timeout', type=float, default=300, help="每轮超时(秒)，默认 300")
+    parser.add_argument('--json', action='store_true', help="以 JSON 输出结果")
+    parser.add_argument('-v', '--verbose', action='store_true', help="输出更新程序日志")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    tag = 'v99.0'
+    old_files = make_bundle(args.files, int(args.size * 1024 * 1024))
+    new_files = change_bundle(old_files, args.changed)
+
+    with MockReleaseServer() as server:
+        server.configure(latency=args.latency, bandwidth=args.bandwidth,
+                         fail_rate=args.fail_rate, drop_rate=args.drop_rate)
+        for option in args.source:
+            source, _, setting = option.partition(':')
+            key, _, value = setting.partition('=')
+            current = server.profiles[source][key]
+            if isinstance(current, bool):
+                value = value.lower() in ('1', 'true', 'yes')
+            server.configure(source, **{key: type(current)(value)})
+        server.add_release(tag, package_assets(new_files, tag, args.version_type, not args.no_manifest))
+
+        rounds = [run_round(server, old_files, args) for _ in range(args.rounds)]
+
+    result = {
+        'rounds': rounds,
+        'summary': summarize(rounds),
+        'package_bytes': sum(len(data) for data in new_files.values()),
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for index, r in enumerate(rounds, 1):
+            status = '成功' if r['ok'] else f"失败: {r['error']}"
+            stages = '  '.join(f"{stage} {r['seconds'][stage]:.3f}s" for stage in STAGES)
+            transferred = sum(r['bytes'].values()) / 1024 / 1024
+            mode = '增量' if r['delta'] else '完整'
+            print(f"第 {index} 轮 {status}  {stages}  合计 {r['total']:.3f}s  {mode}下载 {transferred:.2f} MB")
+        for stage, values in result['summary'].items():
+            print(f"{stage:>8}: 中位数 {values['median']:.3f}s  最快 {values['min']:.3f}s  最慢 {values['max']:.3f}s")
+    del app
+    sys.exit(0 if all(r['ok'] for r in rounds) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -128,6 +128,12 @@ a_daemon = Analysis(
         'os',
         'sys',
         'psutil',
+        'json',
+        'socket',
+        'secrets',
+        'random',
+        'single_instance',
+        'versions',
     ],
     hookspath=[],
     hooksconfig={},
@@ -144,8 +150,6 @@ a_daemon = Analysis(
         'winsound',
         'keyboard',
         'configparser',
-        'json',
-        'random',
         'tqdm',
     ],
     win_no_prefer_redirects=False,
@@ -177,6 +181,7 @@ a_launcher = Analysis(
         'os',
         'pathlib',
         'csv',
+        'versions',
     ],
     hookspath=[],
     hooksconfig={},
@@ -307,6 +312,9 @@ a_update = Analysis(
         'psutil',
         'subprocess',
         'pyside2',
+        'random',
+        'single_instance',
+        'versions',
     ],
     hookspath=[],
     hooksconfig={},
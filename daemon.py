@@ -1,11 +1,18 @@
 import os
 import sys
+import json
 import time
+import random
+import socket
+import secrets
 import logging
 import subprocess
 import argparse
+from collections import deque
 from datetime import datetime
-from psutil import process_iter, NoSuchProcess, AccessDenied, ZombieProcess
+from single_instance import InstanceLock, register as register_instance, unregister as unregister_instance
+from versions import VersionStore
+from psutil import Process, NoSuchProcess, AccessDenied, ZombieProcess
 
 
 def setup_logging():
@@ -24,11 +31,533 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 
-def start_program(program, args):
-    """启动主程序"""
+def start_program(program, args, env=None):
+    """启动主程序，相对路径按 current 指针解析到当前版本的目录"""
+    if not os.path.isabs(program):
+        program = VersionStore().resolve(program)
     cmd = [program] + args
     logger.info(f"Starting program: {' '.join(cmd)}")
-    return subprocess.Popen(cmd)
+    return subprocess.Popen(cmd, env=env)
+
+
+def create_heartbeat_socket():
+    """创建接收主程序心跳的本机 UDP 套接字"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    return sock
+
+
+class HeartbeatHub:
+    """
+    接收所有子进程的心跳，并按令牌分发给对应的监视器
+    同一端口也接收启动器携带 control_token 的关闭请求
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.monitors = {}
+        self.control_token = secrets.token_hex(8)
+        self.shutdown_requested = False
+
+    @property
+    def port(self):
+        return self.sock.getsockname()[1]
+
+    def register(self, monitor):
+        self.monitors[monitor.token] = monitor
+
+    def unregister(self, monitor):
+        self.monitors.pop(monitor.token, None)
+
+    def drain(self, wait):
+        """在 wait 秒内接收所有到达的心跳"""
+        self.sock.settimeout(wait)
+        while True:
+            try:
+                data, address = self.sock.recvfrom(4096)
+            except socket.timeout:
+                return
+            except OSError:
+                return
+            try:
+                payload = json.loads(data.decode('utf-8'))
+            except ValueError:
+                continue
+            monitor = self.monitors.get(payload.get('token'))
+            if monitor is not None:
+                monitor.feed(payload, address)
+            elif payload.get('token') == self.control_token and payload.get('action') == 'shutdown':
+                self.shutdown_requested = True
+            self.sock.settimeout(0)
+
+    def send(self, port, payload):
+        """向子进程的本机端口发送指令"""
+        self.sock.sendto(json.dumps(payload).encode('utf-8'), ('127.0.0.1', port))
+
+    def reply(self, monitor, payload):
+        """沿心跳的来源地址回送指令，失败返回 False"""
+        if monitor.address is None:
+            return False
+        try:
+            self.sock.sendto(json.dumps(payload).encode('utf-8'), monitor.address)
+        except OSError as e:
+            logger.warning(f"发送指令失败: {e}")
+            return False
+        return True
+
+
+class HeartbeatMonitor:
+    """
+    根据主程序的心跳判断其是否卡死
+    收到第一次心跳后才开始计时，兼容不发送心跳的旧版主程序
+    """
+    def __init__(self, token, timeout, max_latency_ms, max_busy):
+        self.token = token
+        self.timeout = timeout
+        self.max_latency_ms = max_latency_ms
+        self.max_busy = max_busy
+        self.last_beat = None
+        self.started_at = time.monotonic()
+        self.beats = 0
+        self.latency_strikes = 0
+        self.new_latencies = []
+        self.last_payload = {}
+        self.address = None
+
+    @property
+    def standby_ready(self):
+        """热备实例已完成初始化并上报了接管端口"""
+        return bool(self.last_payload.get('standby') and self.last_payload.get('control_port'))
+
+    @property
+    def active(self):
+        """已收到过非热备状态的心跳"""
+        return self.last_payload.get('standby') is False
+
+    def feed(self, payload, address=None):
+        now = time.monotonic()
+        if self.last_beat is None:
+            logger.info(f"收到首次心跳，启动耗时 {now - self.started_at:.1f} 秒")
+        elif now - self.last_beat > self.timeout / 2:
+            logger.warning(f"心跳间隔异常: {now - self.last_beat:.1f} 秒")
+        self.last_beat = now
+        self.beats += 1
+        self.last_payload = payload
+        self.address = address
+        self.new_latencies.append(payload.get('loop_latency_ms', 0))
+
+    def check(self):
+        """检查主程序状态，返回需要重启的原因，正常时返回 None"""
+        if self.last_beat is None:
+            return None
+        now = time.monotonic()
+        silence = now - self.last_beat
+        if silence > self.timeout:
+            return f"心跳停止 {silence:.1f} 秒"
+
+        latencies, self.new_latencies = self.new_latencies, []
+        for latency in latencies:
+            if latency > self.max_latency_ms:
+                self.latency_strikes += 1
+                logger.warning(f"事件循环延迟过高: {latency:.0f} ms ({self.latency_strikes}/3)")
+                # 连续三次超过阈值才重启，避免偶发的系统卡顿导致误判
+                if self.latency_strikes >= 3:
+                    return f"事件循环延迟持续超过 {self.max_latency_ms} ms (最近 {latency:.0f} ms)"
+            else:
+                self.latency_strikes = 0
+
+        payload = self.last_payload
+        for key, name in (('worker_busy_ms', '抽号线程'), ('tts_busy_ms', '语音播报')):
+            busy = payload.get(key, 0) / 1000.0 + silence
+            if payload.get(key, 0) > 0 and busy > self.max_busy:
+                return f"{name}卡住 {busy:.1f} 秒"
+        # None 表示监听线程从未启动（仅影响快捷键，主程序仍可用），不重启
+        if payload.get('listener_alive') is False:
+            return "快捷键监听线程已退出"
+        return None
+
+
+class ResourceWatchdog:
+    """
+    低频采样主程序的资源占用并写入时间序列文件，用于发现长期运行时的缓慢泄漏
+    每行记录: 时间, 角色, PID, 常驻内存(MB), CPU(%), 线程数, 句柄数
+    超过限制时返回原因，由守护进程平滑重启主程序；0 表示不限制
+    """
+    CPU_STRIKES = 3
+
+    def __init__(self, pid, role, interval, max_rss_mb, max_cpu, max_threads, max_handles, log_dir='logs'):
+        self.process = Process(pid)
+        self.role = role
+        self.interval = interval
+        self.max_rss_mb = max_rss_mb
+        self.max_cpu = max_cpu
+        self.max_threads = max_threads
+        self.max_handles = max_handles
+        self.log_dir = log_dir
+        self.next_sample = time.monotonic() + interval
+        self.cpu_strikes = 0
+        self.last_sample = None
+        # 第一次调用只建立基准，之后返回两次调用之间的 CPU 占用
+        self.process.cpu_percent(None)
+
+    def count_handles(self):
+        if hasattr(self.process, 'num_handles'):
+            return self.process.num_handles()
+        return self.process.num_fds()
+
+    def sample(self):
+        """采样一次并追加到当天的时间序列文件"""
+        with self.process.oneshot():
+            sample = {
+                'rss_mb': self.process.memory_info().rss / (1024 * 1024),
+                'cpu': self.process.cpu_percent(None),
+                'threads': self.process.num_threads(),
+                'handles': self.count_handles(),
+            }
+        self.last_sample = sample
+        path = os.path.join(self.log_dir, f'resources_{datetime.now().strftime("%Y%m%d")}.csv')
+        try:
+            new_file = not os.path.exists(path)
+            with open(path, 'a', encoding='utf-8') as f:
+                if new_file:
+                    f.write('time,role,pid,rss_mb,cpu,threads,handles\n')
+                f.write(f'{datetime.now().strftime("%Y-%m-%d %H:%M:%S")},{self.role},{self.process.pid},'
+                        f'{sample["rss_mb"]:.1f},{sample["cpu"]:.1f},{sample["threads"]},{sample["handles"]}\n')
+        except OSError as e:
+            logger.warning(f"写入资源记录失败: {e}")
+        return sample
+
+    def check(self):
+        """到达采样时间时采样并检查限制，返回需要重启的原因，正常时返回 None"""
+        now = time.monotonic()
+        if now < self.next_sample:
+            return None
+        self.next_sample = now + self.interval
+        try:
+            sample = self.sample()
+        except (NoSuchProcess, AccessDenied, ZombieProcess):
+            return None
+
+        if self.max_rss_mb and sample['rss_mb'] > self.max_rss_mb:
+            return f"内存占用 {sample['rss_mb']:.0f} MB 超过上限 {self.max_rss_mb} MB"
+        if self.max_threads and sample['threads'] > self.max_threads:
+            return f"线程数 {sample['threads']} 超过上限 {self.max_threads}"
+        if self.max_handles and sample['handles'] > self.max_handles:
+            return f"句柄数 {sample['handles']} 超过上限 {self.max_handles}"
+        if self.max_cpu and sample['cpu'] > self.max_cpu:
+            self.cpu_strikes += 1
+            # 连续多次采样超限才重启，抽号动画和语音合成会造成短时高占用
+            if self.cpu_strikes >= self.CPU_STRIKES:
+                return f"CPU 占用持续超过 {self.max_cpu}% (最近 {sample['cpu']:.0f}%)"
+        else:
+            self.cpu_strikes = 0
+        return None
+
+
+class RestartPolicy:
+    """
+    重启策略：指数退避 + 随机抖动 + 滑动窗口崩溃预算
+    1. 连续崩溃时重启延迟按 base_delay * 2^(n-1) 增长，上限 max_delay，并加入随机抖动避免同步重启
+    2. window 秒内崩溃次数达到 max_crashes 时放弃重启
+    3. 单次运行超过 stable_time 秒视为稳定运行，连续失败计数清零
+    """
+    def __init__(self, base_delay, max_delay, max_crashes, window, stable_time):
+        self.base_delay = base_delay
+        self.max_delay = max(max_delay, base_delay)
+        self.max_crashes = max_crashes
+        self.window = window
+        self.stable_time = stable_time
+        self.crash_times = deque()
+        self.consecutive_failures = 0
+
+    def record_crash(self, run_duration):
+        now = time.monotonic()
+        if run_duration >= self.stable_time:
+            if self.consecutive_failures:
+                logger.info(f"上次稳定运行 {run_duration:.0f} 秒，连续失败计数清零")
+            self.consecutive_failures = 0
+        self.consecutive_failures += 1
+        self.crash_times.append(now)
+        self._prune(now)
+
+    def _prune(self, now):
+        while self.crash_times and now - self.crash_times[0] > self.window:
+            self.crash_times.popleft()
+
+    def crashes_in_window(self):
+        self._prune(time.monotonic())
+        return len(self.crash_times)
+
+    def allowed(self):
+        return self.crashes_in_window() < self.max_crashes
+
+    def next_delay(self):
+        delay = min(self.max_delay, self.base_delay * (2 ** max(self.consecutive_failures - 1, 0)))
+        # 等量抖动：在 [delay/2, delay] 内随机
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+def stop_program(process, timeout=5):
+    """终止主程序，超时后强制结束"""
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning("强制终止主程序进程")
+        process.kill()
+        process.wait()
+
+
+class Child:
+    """一个受监视的主程序实例"""
+    def __init__(self, process, monitor, watchdog, standby):
+        self.process = process
+        self.monitor = monitor
+        self.watchdog = watchdog
+        self.standby = standby
+        self.started_at = time.monotonic()
+
+    @property
+    def name(self):
+        return "热备实例" if self.standby else "主程序"
+
+    def run_duration(self):
+        return time.monotonic() - self.started_at
+
+
+class Supervisor:
+    """
+    守护主程序：监视心跳、按重启策略重启，可选维护一个热备实例
+    热备实例完成初始化后保持静默，主程序退出或卡死时立即接管，省去冷启动时间
+    """
+    POLL_INTERVAL = 0.25
+    PROMOTE_TIMEOUT = 10
+    # poll() 的返回值：因资源超限被主动回收，不属于崩溃
+    RECYCLED = -2
+
+    def __init__(self, args, program_args, hub):
+        self.args = args
+        self.program_args = program_args
+        self.hub = hub
+        self.policy = RestartPolicy(args.restart_delay, args.max_restart_delay, args.max_restarts,
+                                    args.crash_window, args.stable_time)
+        self.warm_standby = args.warm_standby
+        if self.warm_standby and hub is None:
+            logger.warning("未启用心跳通道，无法使用热备模式")
+            self.warm_standby = False
+        self.standby_policy = RestartPolicy(args.restart_delay, args.max_restart_delay, args.max_restarts,
+                                            args.crash_window, args.stable_time)
+        self.standby_retry_at = 0.0
+        self.recycle_count = 0
+        self.active = None
+        self.standby = None
+
+    def spawn(self, standby=False):
+        """启动一个主程序实例，失败时返回 None"""
+        env = os.environ.copy()
+        monitor = None
+        if self.hub:
+            # 每个实例使用独立的令牌，丢弃已退出进程残留的心跳
+            monitor = HeartbeatMonitor(secrets.token_hex(8), self.args.heartbeat_timeout,
+                                       self.args.max_latency, self.args.max_busy)
+            env['LOTTERY_HEARTBEAT_PORT'] = str(self.hub.port)
+            env['LOTTERY_HEARTBEAT_TOKEN'] = monitor.token
+        if standby:
+            env['LOTTERY_STANDBY'] = '1'
+        try:
+            process = start_program(self.args.program, self.program_args, env)
+        except Exception as e:
+            logger.error(f"启动程序失败: {str(e)}")
+            return None
+        if monitor:
+            self.hub.register(monitor)
+        watchdog = None
+        if self.args.resource_interval > 0:
+            try:
+                watchdog = ResourceWatchdog(process.pid, 'standby' if standby else 'active',
+                                            self.args.resource_interval, self.args.max_rss,
+                                            self.args.max_cpu, self.args.max_threads, self.args.max_handles)
+            except (NoSuchProcess, AccessDenied, ZombieProcess) as e:
+                logger.warning(f"无法监视进程资源: {e}")
+        child = Child(process, monitor, watchdog, standby)
+        if standby:
+            logger.info(f"已启动热备实例 (PID {process.pid})")
+        return child
+
+    def discard(self, child):
+        """终止并注销一个实例"""
+        if child.process.poll() is None:
+            stop_program(child.process)
+        if child.monitor and self.hub:
+            self.hub.unregister(child.monitor)
+
+    def wait(self, seconds):
+        if self.hub:
+            self.hub.drain(seconds)
+        else:
+            time.sleep(seconds)
+
+    def backoff(self, seconds):
+        """等待重启延迟，期间继续接收心跳和关闭请求；收到关闭请求时返回 False"""
+        deadline = time.monotonic() + seconds
+        while True:
+            if self.hub and self.hub.shutdown_requested:
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            self.wait(min(self.POLL_INTERVAL, remaining))
+
+    def poll(self, child):
+        """
+        检查实例状态
+        Returns:
+            int: 实例退出码，因卡死被终止时为 -1，因资源超限被回收时为 RECYCLED；仍在正常运行时返回 None
+        """
+        exit_code = child.process.poll()
+        if exit_code is not None:
+            return exit_code
+        if child.monitor is not None:
+            reason = child.monitor.check()
+            if reason:
+                last_beat = child.monitor.last_beat
+                stall = time.monotonic() - last_beat if last_beat else 0.0
+                logger.error(f"检测到{child.name}无响应: {reason}，卡顿时长 {stall:.1f} 秒，正在重启")
+                stop_program(child.process)
+                return -1
+        if child.watchdog is not None:
+            reason = child.watchdog.check()
+            if reason:
+                logger.error(f"{child.name}资源超限: {reason}，正在重启")
+                self.stop_gracefully(child, reason)
+                return self.RECYCLED
+        return None
+
+    def stop_gracefully(self, child, reason):
+        """先请求主程序自行退出（保存状态、释放快捷键），超时后再强制终止"""
+        if self.hub and child.monitor and self.hub.reply(
+                child.monitor, {'token': child.monitor.token, 'action': 'shutdown', 'reason': reason}):
+            try:
+                child.process.wait(timeout=self.args.graceful_timeout)
+                logger.info(f"{child.name}已自行退出")
+                return
+            except subprocess.TimeoutExpired:
+                logger.warning(f"{child.name}未在 {self.args.graceful_timeout:.0f} 秒内退出")
+        stop_program(child.process)
+
+    def maintain_standby(self):
+        """主程序运行正常后补充热备实例，热备实例异常时按独立的重启策略重建"""
+        if not self.warm_standby:
+            return
+        if self.standby is not None:
+            exit_code = self.poll(self.standby)
+            if exit_code is None:
+                return
+            self.discard(self.standby)
+            self.standby = None
+            if exit_code == self.RECYCLED:
+                # 资源回收不计入崩溃，下一轮直接补充热备
+                return
+            logger.warning(f"热备实例异常退出 (代码: {exit_code})")
+            self.standby_policy.record_crash(0)
+            if not self.standby_policy.allowed():
+                logger.error("热备实例频繁崩溃，停用热备模式")
+                self.warm_standby = False
+                return
+            self.standby_retry_at = time.monotonic() + self.standby_policy.next_delay()
+            return
+        # 等主程序发出首次心跳后再启动热备，避免两个实例同时初始化拖慢开机
+        if self.active is None or self.active.monitor is None or self.active.monitor.last_beat is None:
+            return
+        if time.monotonic() >= self.standby_retry_at:
+            self.standby = self.spawn(standby=True)
+
+    def promote_standby(self, failed_at):
+        """让热备实例接管，成功返回 True"""
+        standby = self.standby
+        if standby is None or standby.process.poll() is not None or not standby.monitor.standby_ready:
+            return False
+        self.standby = None
+        port = standby.monitor.last_payload['control_port']
+        deadline = time.monotonic() + self.PROMOTE_TIMEOUT
+        next_send = 0.0
+        while time.monotonic() < deadline:
+            if time.monotonic() >= next_send:
+                self.hub.send(port, {'token': standby.monitor.token, 'action': 'promote'})
+                next_send = time.monotonic() + 0.5
+            self.hub.drain(0.02)
+            if standby.process.poll() is not None:
+                break
+            if standby.monitor.active:
+                standby.standby = False
+                standby.started_at = time.monotonic()
+                if standby.watchdog:
+                    standby.watchdog.role = 'active'
+                self.active = standby
+                logger.info(f"热备实例 (PID {standby.process.pid}) 已接管，"
+                            f"故障切换耗时 {(time.monotonic() - failed_at) * 1000:.0f} ms")
+                return True
+        logger.error("热备实例接管失败，改为冷启动")
+        self.discard(standby)
+        return False
+
+    def run(self):
+        self.active = self.spawn()
+        while True:
+            if self.active is not None:
+                self.wait(self.POLL_INTERVAL)
+                if self.hub and self.hub.shutdown_requested:
+                    logger.info("收到关闭请求，停止主程序后退出")
+                    self.stop_gracefully(self.active, "启动器请求关闭")
+                    return
+                exit_code = self.poll(self.active)
+                if exit_code is None:
+                    self.maintain_standby()
+                    continue
+                if exit_code == 0:
+                    logger.info("程序正常退出，守护进程结束")
+                    return
+                if exit_code == self.RECYCLED:
+                    # 资源回收是主动重启，不计入崩溃预算，也不退避
+                    self.discard(self.active)
+                    self.active = None
+                    self.recycle_count += 1
+                    logger.info(f"资源回收重启 (累计 {self.recycle_count} 次)，不计入崩溃次数")
+                    if not self.promote_standby(time.monotonic()):
+                        self.active = self.spawn()
+                    continue
+                run_duration = self.active.run_duration()
+                logger.warning(f"程序异常退出 (代码: {exit_code})，本次运行 {run_duration:.1f} 秒")
+                self.discard(self.active)
+                self.active = None
+            else:
+                run_duration = 0.0
+            failed_at = time.monotonic()
+
+            self.policy.record_crash(run_duration)
+            crashes = self.policy.crashes_in_window()
+            if not self.policy.allowed():
+                logger.error(
+                    f"{self.args.crash_window:.0f} 秒内已崩溃 {crashes} 次，"
+                    f"达到上限 {self.args.max_restarts}，守护进程放弃重启"
+                )
+                return
+            if self.promote_standby(failed_at):
+                continue
+            delay = self.policy.next_delay()
+            logger.warning(
+                f"将在 {delay:.1f} 秒后重启 (连续失败 {self.policy.consecutive_failures} 次, "
+                f"窗口内崩溃 {crashes}/{self.args.max_restarts})"
+            )
+            if not self.backoff(delay):
+                logger.info("等待重启期间收到关闭请求，守护进程退出")
+                return
+            self.active = self.spawn()
+
+    def shutdown(self):
+        for child in (self.active, self.standby):
+            if child is not None and child.process.poll() is None:
+                logger.info(f"终止{child.name}进程")
+                stop_program(child.process)
 
 
 def main():
@@ -48,8 +577,22 @@ def main():
     parser = argparse.ArgumentParser(description="课堂抽号程序守护进程")
     parser.add_argument('program', help="主程序路径")
     parser.add_argument('args', nargs='*', help="传递给主程序的参数")
-    parser.add_argument('--max-restarts', type=int, default=10, help="最大重启次数")
-    parser.add_argument('--restart-delay', type=int, default=5, help="重启延迟(秒)")
+    parser.add_argument('--max-restarts', type=int, default=10, help="崩溃窗口内允许的最大重启次数")
+    parser.add_argument('--restart-delay', type=float, default=5, help="首次重启延迟(秒)，连续失败时指数增长")
+    parser.add_argument('--max-restart-delay', type=float, default=300, help="重启延迟上限(秒)")
+    parser.add_argument('--crash-window', type=float, default=600, help="崩溃计数的滑动窗口(秒)")
+    parser.add_argument('--stable-time', type=float, default=300, help="运行超过该时长(秒)视为稳定，连续失败计数清零")
+    parser.add_argument('--warm-standby', action='store_true', help="保持一个已初始化的热备实例，主程序异常时立即接管")
+    parser.add_argument('--heartbeat-timeout', type=float, default=15, help="心跳超时(秒)，0表示不检测")
+    parser.add_argument('--max-latency', type=int, default=3000, help="事件循环延迟阈值(毫秒)")
+    parser.add_argument('--max-busy', type=float, default=60, help="抽号/语音单次执行时长阈值(秒)")
+    parser.add_argument('--resource-interval', type=float, default=60, help="资源采样间隔(秒)，0表示不采样")
+    # 资源上限默认关闭，只记录采样：不同机器上正常的占用差别很大，应参考 resources_日期.csv 中的记录再设置
+    parser.add_argument('--max-rss', type=int, default=0, help="常驻内存上限(MB)，0表示不限制")
+    parser.add_argument('--max-cpu', type=float, default=0, help="持续CPU占用上限(%%)，0表示不限制")
+    parser.add_argument('--max-threads', type=int, default=0, help="线程数上限，0表示不限制")
+    parser.add_argument('--max-handles', type=int, default=0, help="句柄数上限，0表示不限制")
+    parser.add_argument('--graceful-timeout', type=float, default=10, help="资源超限时等待主程序自行退出的时长(秒)")
     
     # 分离传递给守护进程本身的参数和传递给主程序的参数
     # 找到 '--' 分隔符
@@ -68,40 +611,42 @@ def main():
         args = parser.parse_args(daemon_args)
         program_args = program_args_list
     
-    restart_count = 0
-    process = None
+    # 同一时间只允许一个守护进程，避免重复拉起主程序
+    instance_lock = InstanceLock('daemon')
+    if not instance_lock.acquire():
+        logger.error("已有守护进程在运行，本次启动退出")
+        return
+
+    hub = None
+    if args.heartbeat_timeout > 0:
+        try:
+            hub = HeartbeatHub(create_heartbeat_socket())
+            logger.info(f"心跳监听端口: {hub.port}")
+        except OSError as e:
+            logger.error(f"创建心跳套接字失败，将不检测主程序卡死: {e}")
+
     try:
-        while restart_count < args.max_restarts:
-            try:
-                process = start_program(args.program, program_args)
-                exit_code = process.wait()
-                if exit_code == 0:
-                    logger.info("程序正常退出，守护进程结束")
-                    break
-                else:
-                    restart_count += 1
-                    logger.warning(
-                        f"程序异常退出 (代码: {exit_code}), "
-                        f"重启次数: {restart_count}/{args.max_restarts}"
-                    )
-                    if restart_count < args.max_restarts:
-                        time.sleep(args.restart_delay)
-            except Exception as e:
-                restart_count += 1
-                logger.error(f"启动程序失败: {str(e)}")
-                if restart_count < args.max_restarts:
-                    time.sleep(args.restart_delay)
+        register_instance('daemon', {
+            'port': hub.port if hub else None,
+            'token': hub.control_token if hub else None,
+        })
+    except OSError as e:
+        logger.warning(f"写入实例登记表失败: {e}")
+
+    supervisor = Supervisor(args, program_args, hub)
+    try:
+        supervisor.run()
     except KeyboardInterrupt:
         logger.info("收到中断信号，守护进程退出")
     finally:
-        if process and process.poll() is None:
-            logger.info("终止主程序进程")
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                logger.warning("强制终止主程序进程")
-                process.kill()
+        supervisor.shutdown()
+        if hub:
+            hub.sock.close()
+        try:
+            unregister_instance('daemon')
+        except OSError:
+            pass
+        instance_lock.release()
 
 
 if __name__ == '__main__':
@@ -4,25 +4,297 @@ from configparser import ConfigParser
 from subprocess import Popen
 from glob import glob
 import json
+import socket
+import platform
+import threading
+import urllib.request
+
+from single_instance import is_running, wait_until_stopped, read_registry
+from roster_store import RosterStore, SAMPLER_PARAM_KEYS
+from versions import VersionStore
 
 from PySide2.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                                QLabel, QLineEdit, QPushButton, QRadioButton, QCheckBox,
-                               QComboBox, QFileDialog, QMessageBox, QGroupBox, QButtonGroup)
-from PySide2.QtCore import Qt
+                               QComboBox, QFileDialog, QMessageBox, QGroupBox, QButtonGroup,
+                               QProgressDialog, QInputDialog, QDialog, QFormLayout, QDialogButtonBox)
+from PySide2.QtCore import Qt, QObject, Signal
+
+# 请求正在运行的实例自行退出后的等待时长（秒），守护进程需要先停止主程序
+DAEMON_STOP_TIMEOUT = 15
+MAIN_STOP_TIMEOUT = 5
+
+# 语音列表缓存，按语音驱动和系统版本区分
+VOICE_CACHE_FILE = 'voices_cache.json'
+
+# 后台更新代理预下载完成后写入的记录，与 update.py 中的 UPDATE_READY_FILE 一致
+UPDATE_READY_FILE = 'update_ready.json'
+
+
+def voice_cache_key():
+    """语音驱动 + 系统版本，系统升级或换机后缓存自动失效"""
+    driver = {'win32': 'sapi5', 'darwin': 'nsss'}.get(sys.platform, 'espeak')
+    return f"{driver}|{platform.platform()}"
+
+
+def load_voice_cache():
+    """读取缓存的语音列表 [(名称, ID), ...]，缓存不存在或已失效时返回 None"""
+    try:
+        with open(VOICE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('key') != voice_cache_key():
+        return None
+    return [tuple(item) for item in cache.get('voices', [])]
+
+
+def save_voice_cache(voices):
+    try:
+        tmp_path = VOICE_CACHE_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': voice_cache_key(), 'voices': voices}, f, ensure_ascii=False)
+        os.replace(tmp_path, VOICE_CACHE_FILE)
+    except OSError as e:
+        print(f"保存语音列表缓存失败: {e}")
+
+
+# ==================== 学生名单导入 ====================
+STUDENTS_FILE = 'students.json'
+# 导入结果中最多展示的问题行数，完整列表放在详细信息中
+IMPORT_REPORT_PREVIEW = 10
+
+
+def sniff_encoding(path, sample_size=64 * 1024):
+    """
+    根据文件开头判断 CSV 编码：带 BOM 的 UTF-8/UTF-16，其次尝试 UTF-8，
+    都不符合时按 GB18030（兼容 GBK，Excel 中文版默认导出编码）处理
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+    if sample.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if sample.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return 'utf-16'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # 采样恰好截断在多字节字符中间时不算解码失败
+        if e.start < len(sample) - 3:
+            return 'gb18030'
+    return 'utf-8'
+
+
+def iter_csv_rows(path):
+    """逐行读取 CSV，返回 (行号, 单元格列表, 已读字节数)"""
+    import csv
+    total = os.path.getsize(path)
+    with open(path, 'r', encoding=sniff_encoding(path), newline='') as f:
+        for row_number, row in enumerate(csv.reader(f), start=1):
+            yield row_number, row, min(f.buffer.tell(), total)
+
+
+def iter_xlsx_rows(path):
+    """以只读模式流式读取 XLSX 的活动工作表，返回 (行号, 单元格列表, 已读行数)"""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        for row_number, row in enumerate(ws.iter_rows(values_only=True), start=1):
+            yield row_number, row, row_number
+    finally:
+        wb.close()
+
+
+def parse_student_number(value):
+    """解析学号，兼容 Excel 中的浮点数（如 12.0）和带空格的文本"""
+    if isinstance(value, bool) or value is None:
+        raise ValueError
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        return int(value)
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        number = float(text)
+        if not number.is_integer():
+            raise
+        return int(number)
+
+
+def write_students_atomic(students, path=STUDENTS_FILE):
+    """先写临时文件再替换，导入中途出错或被打断时不会留下损坏的名单"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(students, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class RosterImporter(QObject):
+    """
+    在后台线程中流式导入学生名单
+    第一行视为标题行；学号无效、姓名为空的行记为错误，重复学号保留第一次出现的姓名。
+    工作线程结束时总会发出 finished、failed、aborted 之一，调用方在收到后再做清理
+    """
+    progress = Signal(int, int)
+    finished = Signal(dict)
+    failed = Signal(str)
+    aborted = Signal()
+
+    def __init__(self, file_path, output_path=STUDENTS_FILE):
+        super().__init__()
+        self.file_path = file_path
+        self.output_path = output_path
+        self.cancelled = False
+        # 取消与写入名单互斥：取消要么在写入前生效，要么等写入完成后才返回（此时导入已完成）
+        self.write_lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='RosterImporter')
+        thread.daemon = True
+        thread.start()
+
+    def cancel(self):
+        with self.write_lock:
+            self.cancelled = True
+
+    def _run(self):
+        try:
+            result = self.import_file()
+        except Exception as e:
+            self.failed.emit(f"导入失败: {str(e)}")
+            return
+        if result is None:
+            self.aborted.emit()
+        else:
+            self.finished.emit(result)
+
+    def import_file(self):
+        if self.file_path.lower().endswith('.csv'):
+            rows = iter_csv_rows(self.file_path)
+            total = os.path.getsize(self.file_path)
+        else:
+            rows = iter_xlsx_rows(self.file_path)
+            total = self._xlsx_row_count()
+
+        students = {}
+        errors = []
+        duplicates = []
+        last_reported = 0
+        # 限制信号频率，避免大文件导入时刷新界面拖慢解析；总量未知时每 500 行报告一次
+        step = max(total // 100, 1) if total else 500
+        for row_number, row, position in rows:
+            if self.cancelled:
+                return None
+            if position - last_reported >= step:
+                last_reported = position
+                self.progress.emit(position, total)
+            if row_number == 1:
+                continue  # 标题行
+            cells = list(row or [])
+            if not any(cell is not None and str(cell).strip() for cell in cells):
+                continue  # 空行
+            if len(cells) < 2:
+                errors.append((row_number, "缺少姓名列"))
+                continue
+            try:
+                number = parse_student_number(cells[0])
+            except (ValueError, TypeError):
+                errors.append((row_number, f"学号无效: {cells[0]}"))
+                continue
+            name = str(cells[1]).strip() if cells[1] is not None else ""
+            if not name:
+                errors.append((row_number, f"学号 {number} 的姓名为空"))
+                continue
+            if number in students:
+                duplicates.append((row_number, number, students[number], name))
+                continue
+            students[number] = name
+
+        with self.write_lock:
+            if self.cancelled:
+                return None
+            if students:
+                write_students_atomic(students, self.output_path)
+        self.progress.emit(total, total)
+        return {
+            'students': len(students),
+            'min_number': min(students, default=None),
+            'max_number': max(students, default=None),
+            'errors': errors,
+            'duplicates': duplicates,
+        }
+
+    def _xlsx_row_count(self):
+        import openpyxl
+        wb = openpyxl.load_workbook(self.file_path, read_only=True)
+        try:
+            # 只读模式下依赖文件中记录的维度，缺失时返回 None
+            return wb.active.max_row or 0
+        finally:
+            wb.close()
+
+
+class VoiceLoader(QObject):
+    """在后台线程中枚举系统语音，避免加载语音驱动时界面卡住"""
+    finished = Signal(list)
+    failed = Signal(str)
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='VoiceLoader')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        com_initialized = False
+        try:
+            if sys.platform == 'win32':
+                # SAPI5 通过 COM 访问，新线程需要先初始化 COM
+                import comtypes
+                comtypes.CoInitialize()
+                com_initialized = True
+            import pyttsx3
+            engine = pyttsx3.init()
+            voices = [(voice.name or f"Voice {i}", voice.id)
+                      for i, voice in enumerate(engine.getProperty('voices') or [])]
+            del engine
+            self.finished.emit(voices)
+        except ImportError:
+            self.failed.emit('pyttsx3未安装')
+        except Exception as e:
+            print(f"获取语音列表时出错: {e}")
+            self.failed.emit('获取语音列表失败')
+        finally:
+            if com_initialized:
+                comtypes.CoUninitialize()
 
 
 class LauncherApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("课堂抽号程序启动器")
-        self.setGeometry(100, 100, 500, 600)
-        self.setFixedSize(500, 600)
+        self.setGeometry(100, 100, 500, 640)
+        self.setFixedSize(500, 640)
 
         # 读取配置
         self.config = ConfigParser()
         self.config_file = 'config.ini'
         self.load_config()
 
+        # 多班级名单存储，首次使用时把旧的 students.json 迁移为默认班级
+        self.roster_store = RosterStore()
+        try:
+            self.roster_store.migrate_legacy(
+                "默认班级",
+                self.config.getint('lottery', 'min_number', fallback=1),
+                self.config.getint('lottery', 'max_number', fallback=48),
+            )
+        except (OSError, ValueError) as e:
+            print(f"迁移旧学生名单失败: {e}")
+
         # 初始化exe文件列表为空
         self.exe_files = {}
         self.selected_version = None
@@ -30,6 +302,7 @@ class LauncherApp(QMainWindow):
 
         # 创建界面
         self.init_ui()
+        self.show_update_notice()
 
     def load_config(self):
         """加载配置文件"""
@@ -41,19 +314,100 @@ class LauncherApp(QMainWindow):
 
 
     def check_student_list(self):
-        """检查是否存在学生名单"""
-        try:
-            if os.path.exists('students.json'):
-                with open('students.json', 'r', encoding='utf-8') as f:
-                    students = json.load(f)
-                # 更新显示
-                self.student_info_label.setText(f"已成功加载{len(students)}名学生的信息")
-                return True
-        except Exception as e:
-            pass
+        """显示当前班级的名单信息（只读取索引，不解析名单文件）"""
+        class_id, entry = self.roster_store.active_class()
+        if entry is not None:
+            self.student_info_label.setText(
+                f"当前班级“{entry['name']}”：已成功加载{entry['count']}名学生的信息，"
+                f"号码 {entry['min_number']}-{entry['max_number']}")
+            return True
         self.student_info_label.setText("未加载学生名单")
         return False
 
+    def populate_class_list(self):
+        """填充班级下拉框并选中当前班级"""
+        self.class_combo.blockSignals(True)
+        self.class_combo.clear()
+        active_id, _ = self.roster_store.active_class()
+        for class_id, entry in self.roster_store.list_classes():
+            self.class_combo.addItem(f"{entry['name']} ({entry['count']}人)", class_id)
+        if self.class_combo.count() == 0:
+            self.class_combo.addItem("尚未导入班级", None)
+        index = self.class_combo.findData(active_id)
+        if index >= 0:
+            self.class_combo.setCurrentIndex(index)
+        self.class_combo.setEnabled(active_id is not None)
+        self.delete_class_button.setEnabled(active_id is not None)
+        self.sampler_params_button.setEnabled(active_id is not None)
+        self.class_combo.blockSignals(False)
+
+    def on_class_changed(self, index):
+        """切换当前班级：只修改索引中的指针，并把号码范围同步到配置编辑框"""
+        class_id = self.class_combo.itemData(index)
+        if not class_id:
+            return
+        try:
+            self.roster_store.set_active(class_id)
+        except (OSError, KeyError) as e:
+            QMessageBox.critical(self, "错误", f"切换班级失败: {e}")
+            return
+        entry = self.roster_store.get(class_id)
+        self.min_edit.setText(str(entry['min_number']))
+        self.max_edit.setText(str(entry['max_number']))
+        self.check_student_list()
+
+    def delete_current_class(self):
+        class_id, entry = self.roster_store.active_class()
+        if entry is None:
+            return
+        result = QMessageBox.question(
+            self, "确认", f"确定删除班级“{entry['name']}”及其抽号记录吗？",
+            QMessageBox.Ok | QMessageBox.Cancel
+        )
+        if result != QMessageBox.Ok:
+            return
+        try:
+            self.roster_store.delete_class(class_id)
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"删除班级失败: {e}")
+        self.populate_class_list()
+        if self.class_combo.currentData():
+            self.on_class_changed(self.class_combo.currentIndex())
+        else:
+            self.check_student_list()
+
+    def edit_sampler_params(self):
+        """编辑当前班级的抽样器参数，留空的参数使用默认值；抽号程序下次启动时生效"""
+        class_id, entry = self.roster_store.active_class()
+        if entry is None:
+            return
+        current = entry.get('sampler', {})
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"抽样参数 - {entry['name']}")
+        layout = QFormLayout(dialog)
+        layout.addRow(QLabel("留空表示使用默认值，修改后在抽号程序下次启动时生效"))
+        edits = {}
+        for key in SAMPLER_PARAM_KEYS:
+            edit = QLineEdit(str(current[key]) if key in current else "")
+            edit.setPlaceholderText("默认")
+            layout.addRow(key, edit)
+            edits[key] = edit
+        buttons = QDialogButtonBox()
+        buttons.addButton(QDialogButtonBox.Ok)
+        buttons.addButton(QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow(buttons)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        params = {key: edit.text().strip() for key, edit in edits.items() if edit.text().strip()}
+        try:
+            self.roster_store.set_sampler_params(class_id, params)
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", f"抽样参数无效: {e}")
+        except (OSError, KeyError) as e:
+            QMessageBox.critical(self, "错误", f"保存抽样参数失败: {e}")
+
     def init_ui(self):
         # 创建中央部件
         central_widget = QWidget()
@@ -167,10 +521,6 @@ class LauncherApp(QMainWindow):
         self.voice_combo = QComboBox()
         self.voice_combo.setFixedWidth(200)
         self.populate_voice_list()
-        current_voice_id = self.config.get('lottery', 'voice_id', fallback='')
-        index = self.voice_combo.findData(current_voice_id)
-        if index >= 0:
-            self.voice_combo.setCurrentIndex(index)
         voice_select_layout.addWidget(self.voice_combo)
         config_layout.addLayout(voice_select_layout)
 
@@ -180,6 +530,22 @@ class LauncherApp(QMainWindow):
         student_group = QGroupBox("学生名单管理")
         student_layout = QVBoxLayout(student_group)
 
+        # 班级选择
+        class_layout = QHBoxLayout()
+        class_layout.addWidget(QLabel("当前班级:"), 1)
+        self.class_combo = QComboBox()
+        self.class_combo.setFixedWidth(200)
+        class_layout.addWidget(self.class_combo)
+        self.delete_class_button = QPushButton("删除班级")
+        self.delete_class_button.clicked.connect(self.delete_current_class)
+        class_layout.addWidget(self.delete_class_button)
+        self.sampler_params_button = QPushButton("抽样参数")
+        self.sampler_params_button.clicked.connect(self.edit_sampler_params)
+        class_layout.addWidget(self.sampler_params_button)
+        self.populate_class_list()
+        self.class_combo.currentIndexChanged.connect(self.on_class_changed)
+        student_layout.addLayout(class_layout)
+
         import_button = QPushButton("导入学生名单(CSV/XLSX)")
         import_button.clicked.connect(self.import_student_list)
         student_layout.addWidget(import_button)
@@ -189,7 +555,7 @@ class LauncherApp(QMainWindow):
         self.check_student_list()
         student_layout.addWidget(self.student_info_label)
 
-        note_label = QLabel("注意: CSV文件应包含'学号','姓名'列，Excel文件第一列为学号，第二列为姓名")
+        note_label = QLabel("注意: CSV文件应包含'学号','姓名'列，Excel文件第一列为学号，第二列为姓名；导入时填写已有班级名称将覆盖该班级的名单")
         note_label.setWordWrap(True)
         student_layout.addWidget(note_label)
 
@@ -226,6 +592,13 @@ class LauncherApp(QMainWindow):
 
             self.config.set('lottery', 'min_number', self.min_edit.text())
             self.config.set('lottery', 'max_number', self.max_edit.text())
+            # 号码范围同时保存到当前班级
+            class_id, _ = self.roster_store.active_class()
+            if class_id:
+                try:
+                    self.roster_store.update_range(class_id, int(self.min_edit.text()), int(self.max_edit.text()))
+                except ValueError:
+                    pass
             self.config.set('lottery', 'delay', self.delay_edit.text())
             self.config.set('lottery', 'keep', self.keep_edit.text())
 
@@ -238,7 +611,7 @@ class LauncherApp(QMainWindow):
             self.config.set('lottery', 'voice_template', self.voice_template_edit.text())
             self.config.set('lottery', 'voice_rate', self.voice_rate_edit.text())
             self.config.set('lottery', 'voice_volume', self.voice_volume_edit.text())
-            self.config.set('lottery', 'voice_id', self.voice_combo.currentData() or '')
+            self.config.set('lottery', 'voice_id', self.selected_voice_id())
             self.config.set('lottery', 'dynamic_voice', '1'
             if self.dynamic_voice_layout.isChecked() else '0')
             # 写入文件
@@ -250,56 +623,80 @@ class LauncherApp(QMainWindow):
             QMessageBox.critical(self, "错误", f"保存配置失败: {e}")
 
     def is_lottery_running(self):
-        """检查是否有抽号程序或守护进程正在运行"""
-        try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    proc_name = proc.info['name'].lower()
-                    cmdline = proc.info.get('cmdline', [])
-                    if ("课堂抽号程序" in proc_name or
-                            "daemon.exe" in proc_name or
-                            (proc_name == "python.exe" and any(
-                                "daemon.py" in arg for arg in cmdline
-                            ))):
-                        return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    pass
-        except ImportError:
-            # 如果没有安装psutil，则跳过检查
-            pass
-        return False
+        """检查是否有抽号程序或守护进程正在运行（通过单实例锁判断）"""
+        return is_running('main') or is_running('daemon')
 
     def close_lottery_processes(self):
-        """关闭所有正在运行的抽号程序和守护进程"""
+        """
+        关闭正在运行的抽号程序和守护进程
+        先通过登记表中的端点请求其自行退出，超时后再按登记的 PID 强制结束
+        """
+        registry = read_registry()
         closed = False
-        try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name']):
+
+        # 先关守护进程，由它平滑停止主程序，避免主程序被关闭后又被重新拉起
+        if is_running('daemon'):
+            closed = True
+            entry = registry.get('daemon', {})
+            if entry.get('port') and entry.get('token'):
                 try:
-                    proc_name = proc.info['name'].lower()
-                    cmdline = proc.info.get('cmdline', [])
-                    # 关闭主程序和守护进程
-                    if ("课堂抽号程序" in proc_name or
-                            "daemon.exe" in proc_name or
-                            (proc_name == "python.exe" and any(
-                                "daemon.py" in arg for arg in cmdline
-                            ))):
-                        proc.terminate()
-                        closed = True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    sock.sendto(json.dumps({'token': entry['token'], 'action': 'shutdown'}).encode('utf-8'),
+                                ('127.0.0.1', entry['port']))
+                    sock.close()
+                except OSError:
                     pass
-            # 等待进程结束
-            if closed:
-                import time
-                time.sleep(1)
-        except ImportError:
-            # 如果没有安装psutil，则跳过关闭过程
-            pass
+            if not wait_until_stopped('daemon', DAEMON_STOP_TIMEOUT):
+                self.terminate_process(entry.get('pid'), include_children=True)
+
+        if is_running('main'):
+            closed = True
+            entry = registry.get('main', {})
+            if entry.get('control'):
+                request = urllib.request.Request(
+                    entry['control'],
+                    data=json.dumps({'action': 'shutdown'}).encode('utf-8'),
+                    headers={
+                        'Content-Type': 'application/json',
+                        'X-Control-Token': entry.get('control_token')
+                        or self.config.get('lottery', 'control_token', fallback=''),
+                    },
+                )
+                try:
+                    urllib.request.urlopen(request, timeout=2).close()
+                except (OSError, ValueError):
+                    pass
+            if not wait_until_stopped('main', MAIN_STOP_TIMEOUT):
+                self.terminate_process(entry.get('pid'))
         return closed
 
+    def terminate_process(self, pid, include_children=False):
+        """强制结束登记表中的进程（可连同其子进程，如守护进程的热备实例）"""
+        if not pid:
+            return
+        try:
+            import psutil
+        except ImportError:
+            return
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + (proc.children(recursive=True) if include_children else [])
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        for p in procs:
+            try:
+                p.terminate()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        _, alive = psutil.wait_procs(procs, timeout=3)
+        for p in alive:
+            try:
+                p.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+
     def import_student_list(self):
-        """导入学生名单文件(CSV或XLSX)"""
+        """导入学生名单文件(CSV或XLSX)，在后台线程中解析并显示进度"""
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             "选择学生名单文件",
@@ -310,83 +707,194 @@ class LauncherApp(QMainWindow):
         if not file_path:
             return
 
-        student_dict = {}
-        
-        try:
-            if file_path.endswith('.csv'):
-                # 读取CSV文件
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    import csv
-                    csv_reader = csv.reader(f)
-                    header = next(csv_reader, None)  # 跳过标题行
-                    for row in csv_reader:
-                        if len(row) >= 2:
-                            try:
-                                number = int(row[0])
-                                name = row[1].strip()
-                                if name:
-                                    student_dict[number] = name
-                            except (ValueError, IndexError):
-                                continue
-            else:  # Excel文件
-                import openpyxl
-                wb = openpyxl.load_workbook(file_path)
-                ws = wb.active
-                for row in ws.iter_rows(min_row=2, values_only=True):  # 跳过标题行
-                    if len(row) >= 2:
-                        try:
-                            number = int(row[0])
-                            name = str(row[1]).strip() if row[1] is not None else ""
-                            if name:
-                                student_dict[number] = name
-                        except (ValueError, TypeError):
-                            continue
-        
-            if not student_dict:
-                QMessageBox.critical(self, "错误", "未能从文件中提取有效的学生信息")
-                return
-        
-            # 保存到JSON文件
-            with open('students.json', 'w', encoding='utf-8') as f:
-                json.dump(student_dict, f, ensure_ascii=False, indent=2)
-        
-            QMessageBox.information(self, "成功", f"成功导入{len(student_dict)}名学生信息")
-            # 更新显示
-            self.student_info_label.setText(f"已成功加载{len(student_dict)}名学生的信息")
-        
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导入失败: {str(e)}")
+        default_name = os.path.splitext(os.path.basename(file_path))[0]
+        class_name, ok = QInputDialog.getText(self, "导入学生名单", "班级名称:", text=default_name)
+        class_name = class_name.strip()
+        if not ok or not class_name:
+            return
+        # 同名班级直接覆盖名单，保留其抽号记录
+        self.import_class_id = self.roster_store.find_by_name(class_name)
+        self.import_class_new = self.import_class_id is None
+        if self.import_class_new:
+            self.import_class_id = self.roster_store.new_class_id()
+        self.import_class_name = class_name
+
+        self.import_progress = QProgressDialog("正在导入学生名单...", "取消", 0, 100, self)
+        self.import_progress.setWindowTitle("导入学生名单")
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(300)
+        self.import_progress.setValue(0)
+
+        self.roster_importer = RosterImporter(file_path, self.roster_store.roster_path(self.import_class_id))
+        # 取消只通知工作线程停止，清理在工作线程结束（aborted/failed）后进行，避免与写入名单竞争
+        self.import_progress.canceled.connect(self.roster_importer.cancel)
+        self.roster_importer.progress.connect(self.on_import_progress)
+        self.roster_importer.finished.connect(self.on_import_finished)
+        self.roster_importer.failed.connect(self.on_import_failed)
+        self.roster_importer.aborted.connect(self.discard_import_class)
+        self.roster_importer.start()
+
+    def on_import_progress(self, done, total):
+        if self.import_progress.wasCanceled():
+            return
+        if total > 0:
+            self.import_progress.setValue(min(int(done * 100 / total), 100))
+        else:
+            # 总行数未知时显示忙碌状态
+            self.import_progress.setRange(0, 0)
+
+    def on_import_failed(self, message):
+        self.import_progress.reset()
+        self.discard_import_class()
+        # 用户已取消时不再提示取消之后发生的错误
+        if not self.roster_importer.cancelled:
+            QMessageBox.critical(self, "错误", message)
+
+    def discard_import_class(self):
+        """导入失败或取消后（工作线程已结束）清理为新班级创建的目录"""
+        if self.import_class_new and self.roster_store.get(self.import_class_id) is None:
+            try:
+                self.roster_store.delete_class(self.import_class_id)
+            except OSError:
+                pass
+
+    def on_import_finished(self, result):
+        # 取消在名单写入之后才到达时导入已经完成，仍按完成处理，使班级索引与写入的名单一致
+        self.import_progress.reset()
+        errors = result['errors']
+        duplicates = result['duplicates']
+        details = [f"第 {row} 行: {message}" for row, message in errors]
+        details += [f"第 {row} 行: 学号 {number} 重复（保留“{kept}”，忽略“{name}”）"
+                    for row, number, kept, name in duplicates]
+
+        if not result['students']:
+            self.discard_import_class()
+            message = "未能从文件中提取有效的学生信息"
+            icon = QMessageBox.Critical
+        else:
+            self.roster_store.register_class(self.import_class_id, self.import_class_name, result['students'],
+                                             result['min_number'], result['max_number'])
+            self.populate_class_list()
+            self.on_class_changed(self.class_combo.currentIndex())
+            message = f"成功导入{result['students']}名学生信息"
+            if errors or duplicates:
+                message += f"\n{len(errors)} 行有错误，{len(duplicates)} 个重复学号："
+                message += "\n" + "\n".join(details[:IMPORT_REPORT_PREVIEW])
+                if len(details) > IMPORT_REPORT_PREVIEW:
+                    message += f"\n……共 {len(details)} 条，详见详细信息"
+                icon = QMessageBox.Warning
+            else:
+                icon = QMessageBox.Information
+
+        box = QMessageBox(icon, "导入结果", message, QMessageBox.Ok, self)
+        if details:
+            box.setDetailedText("\n".join(details))
+        box.exec_()
 
     def populate_voice_list(self):
-        """填充语音列表"""
+        """
+        填充语音列表
+        有缓存时立即显示缓存内容，否则先显示占位项；随后在后台重新枚举并更新
+        """
+        self.voices_loaded = False
+        cached = load_voice_cache()
+        if cached is not None:
+            self.fill_voice_combo(cached)
+        else:
+            self.voice_combo.addItem('正在加载语音列表…', '')
+            self.voice_combo.setEnabled(False)
+        self.voice_loader = VoiceLoader()
+        self.voice_loader.finished.connect(self.on_voices_loaded)
+        self.voice_loader.failed.connect(self.on_voices_failed)
+        self.voice_loader.start()
+
+    def fill_voice_combo(self, voices):
+        """用 [(名称, ID), ...] 填充下拉框，保留当前选中的语音"""
+        current_voice_id = self.selected_voice_id()
+        self.voice_combo.clear()
+        if not voices:
+            self.voice_combo.addItem('无可用语音', '')
+        for name, voice_id in voices:
+            self.voice_combo.addItem(name, voice_id)
+        index = self.voice_combo.findData(current_voice_id)
+        if index >= 0:
+            self.voice_combo.setCurrentIndex(index)
+        self.voice_combo.setEnabled(True)
+        self.voices_loaded = True
+
+    def on_voices_loaded(self, voices):
+        if not self.voices_loaded or voices != self.voice_cache_items():
+            self.fill_voice_combo(voices)
+        save_voice_cache(voices)
+
+    def on_voices_failed(self, message):
+        # 已有缓存内容时保留缓存，不覆盖为错误提示
+        if self.voices_loaded:
+            return
+        self.voice_combo.clear()
+        self.voice_combo.addItem(message, '')
+        self.voice_combo.setEnabled(True)
+
+    def voice_cache_items(self):
+        return [(self.voice_combo.itemText(i), self.voice_combo.itemData(i))
+                for i in range(self.voice_combo.count())]
+
+    def selected_voice_id(self):
+        """当前选中的语音 ID；语音列表尚未加载完成时沿用配置中的值"""
+        if not getattr(self, 'voices_loaded', False):
+            return self.config.get('lottery', 'voice_id', fallback='')
+        return self.voice_combo.currentData() or ''
+
+    def show_update_notice(self):
+        """后台已下载好更新时在状态栏提示，可直接打开更新程序安装"""
         try:
-            import pyttsx3
-            engine = pyttsx3.init()
-            voices = engine.getProperty('voices')
-            
-            self.voice_combo.clear()
-            
-            if not voices:
-                self.voice_combo.addItem('无可用语音', '')
-            else:
-                for i, voice in enumerate(voices):
-                    # 显示语音名称，存储语音ID
-                    display_name = f"{voice.name}" if voice.name else f"Voice {i}"
-                    self.voice_combo.addItem(display_name, voice.id)
-                    
-        except ImportError:
-            self.voice_combo.addItem('pyttsx3未安装', '')
-        except Exception as e:
-            self.voice_combo.addItem('获取语音列表失败', '')
-            print(f"获取语音列表时出错: {e}")
+            with open(UPDATE_READY_FILE, 'r', encoding='utf-8') as f:
+                ready = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(ready, dict) or not os.path.exists(str(ready.get('filename', ''))):
+            return
+        self.statusBar().addWidget(QLabel(f"新版本 {ready.get('tag_name', '')} 已在后台下载完成"))
+        install_button = QPushButton("安装更新")
+        install_button.clicked.connect(self.open_updater)
+        self.statusBar().addPermanentWidget(install_button)
+
+    def find_update_exe(self):
+        """查找更新程序，返回命令列表"""
+        update_path = VersionStore().resolve('update.exe')
+        if os.path.exists(update_path):
+            return [update_path]
+        update_py = VersionStore().resolve('update.py')
+        if os.path.exists(update_py):
+            return ['python', update_py]
+        return None
+
+    def open_updater(self):
+        cmd = self.find_update_exe()
+        if not cmd:
+            QMessageBox.critical(self, "错误", "未找到更新程序(update.exe或update.py)")
+            return
+        Popen(cmd)
+
+    def start_update_agent(self):
+        """启动后台更新代理：抽号程序运行期间在空闲时检查并限速预下载更新，程序退出后代理随之退出"""
+        if is_running('update_agent'):
+            return
+        cmd = self.find_update_exe()
+        if not cmd:
+            return
+        try:
+            Popen(cmd + ['--agent'])
+        except OSError as e:
+            print(f"启动后台更新代理失败: {e}")
 
     def find_daemon_exe(self):
         """查找守护进程可执行文件"""
-        daemon_path = os.path.join('.', 'daemon.exe')
+        daemon_path = VersionStore().resolve('daemon.exe')
         if os.path.exists(daemon_path):
             return daemon_path
         # 如果没有exe文件，尝试使用Python脚本
-        daemon_py = os.path.join('.', 'daemon.py')
+        daemon_py = VersionStore().resolve('daemon.py')
         if os.path.exists(daemon_py):
             return ['python', daemon_py]
         return None
@@ -430,16 +938,22 @@ class LauncherApp(QMainWindow):
                 f"--voice-template={self.voice_template_edit.text()}",
                 f"--voice-rate={self.voice_rate_edit.text()}",
                 f"--voice-volume={self.voice_volume_edit.text()}",
-                f"--voice-id={self.voice_combo.currentData() or ''}"
+                f"--voice-id={self.selected_voice_id()}"
             ]
+            # 守护进程自身的参数
+            daemon_args = []
+            if self.config.get('lottery', 'warm_standby', fallback='0') == '1':
+                daemon_args.append("--warm-standby")
             # 构建守护进程命令
             # 统一使用 "--" 分隔符区分参数，无论使用exe还是py形式的守护进程
             if isinstance(daemon_exe, list):
-                cmd = daemon_exe + [exe_path, "--"] + program_args
+                cmd = daemon_exe + daemon_args + [exe_path, "--"] + program_args
             else:
-                cmd = [daemon_exe, exe_path, "--"] + program_args
+                cmd = [daemon_exe] + daemon_args + [exe_path, "--"] + program_args
             # 启动守护进程
             Popen(cmd, shell=True)
+            if self.config.get('lottery', 'auto_update', fallback='1') == '1':
+                self.start_update_agent()
             QMessageBox.information(self, "提示", f"正在启动 {exe_path} (守护进程)")
             # 启动成功后自动关闭启动器
             self.close()
@@ -447,7 +961,28 @@ class LauncherApp(QMainWindow):
             QMessageBox.critical(self, "错误", f"启动程序失败: {e}")
 
 
+def relaunch_current_version():
+    """
+    打包后的启动器从程序根目录运行、而 current 指针指向 versions/ 下的新版本时，
+    改为启动新版本中的同名启动器，返回是否已转交
+    """
+    if not (getattr(sys, 'frozen', False) or '__compiled__' in globals()):
+        return False
+    target = VersionStore().resolve(os.path.basename(sys.executable))
+    if (not os.path.exists(target)
+            or os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(sys.executable))):
+        return False
+    try:
+        Popen([target] + sys.argv[1:])
+    except OSError as e:
+        print(f"启动当前版本的启动器失败: {e}")
+        return False
+    return True
+
+
 if __name__ == "__main__":
+    if relaunch_current_version():
+        sys.exit(0)
     app = QApplication(sys.argv)
     launcher = LauncherApp()
     launcher.show()
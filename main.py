@@ -8,9 +8,15 @@ import json
 import pickle
 import os
 import logging
+import time
+import queue
+import socket
+import hmac
+import secrets
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from random import choice, randint
-from threading import Thread, Lock
+from threading import Thread, Lock, Event, get_ident as threading_get_ident
 from tempfile import NamedTemporaryFile
 from shutil import move
 import numpy as np
@@ -20,12 +26,15 @@ from PySide2.QtMultimedia import QSoundEffect
 from PySide2.QtCore import QUrl, QCoreApplication
 from pynput import keyboard
 from PySide2.QtWidgets import (QApplication, QDialog, QLabel, QVBoxLayout,
-                               QSystemTrayIcon, QMenu, QAction, QMessageBox)
-from PySide2.QtCore import Qt, QTimer, Signal, QObject
-from PySide2.QtGui import QIcon, QFont, QPalette, QColor, QPixmap, QImage
+                               QSystemTrayIcon, QMenu, QAction, QMessageBox,
+                               QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+from PySide2.QtCore import Qt, QTimer, Signal, QObject, QRect, QFileSystemWatcher
+from PySide2.QtGui import QIcon, QFont, QPalette, QColor, QPixmap, QImage, QPainter
 from PIL import Image, ImageDraw
 from configparser import ConfigParser
 from argparse import ArgumentParser
+from roster_store import RosterStore, SAMPLER_PARAM_KEYS
+from single_instance import InstanceLock, register as register_instance, unregister as unregister_instance
 
 # 修复PyInstaller打包后argparse报错的问题
 # 当stderr为None时，创建一个虚拟的stderr对象
@@ -39,6 +48,18 @@ if not sys.stderr:
 # ==================== 全局配置 ====================
 ICON_FILE = 'assets/icon.ico'
 SOUND_FILE = 'assets/rise_enable.wav'
+# 程序文件所在目录；并列安装时程序位于 versions/<版本号>/ 下，而工作目录（数据文件）仍是根目录
+APP_DIR = os.path.dirname(os.path.abspath(sys.argv[0]))
+
+
+def asset_path(relative):
+    """随程序发布的资源文件路径，优先取程序所在目录，找不到时使用工作目录"""
+    path = os.path.join(APP_DIR, relative)
+    if os.path.exists(path):
+        return path
+    return os.path.join(os.getcwd(), relative)
+
+
 classroom_adjectives = [
     "聪明的",
     "勤奋的",
@@ -76,14 +97,25 @@ parser.add_argument('--voice-rate', type=int, help='语音速率')
 parser.add_argument('--voice-volume', type=float, help='语音音量')
 parser.add_argument('--voice-id', type=str, help='语音ID')
 parser.add_argument('--dynamic-voice', type=int, help="是否开启灵活的形容词")
+parser.add_argument('--hotkey', type=str, help="抽号快捷键，多个按键用+连接，如 alt 或 ctrl+alt+l")
+parser.add_argument('--hotkey-debounce', type=int, help="快捷键防抖时间(毫秒)")
+parser.add_argument('--control-port', type=int, help="本地控制接口端口，0=关闭")
 args = parser.parse_args()
 
+# 当前班级：使用多班级名单时，名单、号码范围、抽样器参数和抽号状态都按班级区分
+roster_store = RosterStore()
+ACTIVE_CLASS_ID, ACTIVE_CLASS = roster_store.active_class()
+
 if args.min_number is not None:
     MIN_NUMBER = args.min_number
+elif ACTIVE_CLASS:
+    MIN_NUMBER = int(ACTIVE_CLASS['min_number'])
 else:
     MIN_NUMBER = config.getint('lottery', 'min_number', fallback=1)
 if args.max_number is not None:
     MAX_NUMBER = args.max_number
+elif ACTIVE_CLASS:
+    MAX_NUMBER = int(ACTIVE_CLASS['max_number'])
 else:
     MAX_NUMBER = config.getint('lottery', 'max_number', fallback=48)
 if args.delay is not None:
@@ -128,27 +160,67 @@ if args.dynamic_voice is not None:
 else:
     dynamic_voice_layout = config.get('lottery', 'dynamic_voice', fallback='')
 
+if args.hotkey is not None:
+    HOTKEY = args.hotkey
+else:
+    HOTKEY = config.get('lottery', 'hotkey', fallback='alt')
 
-# 学生名单
-STUDENTS = {}
-try:
-    if os.path.exists('students.json'):
-        with open('students.json', encoding='utf-8') as f:
-            STUDENTS = json.load(f)
-        STUDENTS = {int(k): v for k, v in STUDENTS.items()}
-except Exception as e:
-    pass
+if args.hotkey_debounce is not None:
+    HOTKEY_DEBOUNCE_MS = args.hotkey_debounce
+else:
+    HOTKEY_DEBOUNCE_MS = config.getint('lottery', 'hotkey_debounce', fallback=500)
+
+if args.control_port is not None:
+    CONTROL_PORT = args.control_port
+else:
+    CONTROL_PORT = config.getint('lottery', 'control_port', fallback=52480)
+# 未配置令牌时每次启动随机生成，只通过实例登记表（instances.json）告知启动器
+CONTROL_TOKEN = config.get('lottery', 'control_token', fallback='') or secrets.token_hex(16)
+
+
+# 学生名单与抽号状态文件
+if ACTIVE_CLASS_ID:
+    STUDENTS_FILE = roster_store.roster_path(ACTIVE_CLASS_ID)
+    DATA_FILE = roster_store.data_path(ACTIVE_CLASS_ID)
+    SAMPLER_STATE_FILE = roster_store.sampler_state_path(ACTIVE_CLASS_ID)
+    SAMPLER_PARAMS = {k: v for k, v in ACTIVE_CLASS.get('sampler', {}).items() if k in SAMPLER_PARAM_KEYS}
+else:
+    STUDENTS_FILE = 'students.json'
+    DATA_FILE = 'lottery_data.pkl'
+    SAMPLER_STATE_FILE = 'optimized_sampler_state.pkl'
+    SAMPLER_PARAMS = {}
+
+
+def load_students():
+    """读取学生名单，失败时返回空字典"""
+    try:
+        if os.path.exists(STUDENTS_FILE):
+            with open(STUDENTS_FILE, encoding='utf-8') as f:
+                students = json.load(f)
+            return {int(k): v for k, v in students.items()}
+    except Exception:
+        pass
+    return {}
+
+
+STUDENTS = load_students()
 
 WINDOW_WIDTH = 300
 WINDOW_HEIGHT = 150
 TRANSPARENCY = 0.8
-HOTKEY = 'alt'
-DATA_FILE = 'lottery_data.pkl'
+DRAW_QUEUE_SIZE = 4
+CONTROL_HOST = '127.0.0.1'
+CONTROL_TIMEOUT = 10
+HEARTBEAT_INTERVAL_MS = 1000
 LOG_DIR = 'logs'
 MODE_FLAG_FILE = '3sec_show.conf.start'
 
 # 全局状态
 SHOW_MODE_3SEC = os.path.exists(MODE_FLAG_FILE)
+# 由守护进程以热备模式启动：完成初始化后保持静默，等待接管
+STANDBY = os.environ.get('LOTTERY_STANDBY') == '1'
+# 单实例锁：热备实例在接管时才获取
+instance_lock = InstanceLock('main')
 logger = logging.getLogger(__name__)
 data_manager = None
 hotkey_listener = None
@@ -183,14 +255,17 @@ def init_logger():
         mode_text = "学生讲题模式(倒序)"
 
     logger.info(f'程序启动 - 显示模式：{"三秒变动模式" if SHOW_MODE_3SEC else "直接显示模式"} - 抽取模式：{mode_text}')
+    if ACTIVE_CLASS:
+        logger.info(f'当前班级: {ACTIVE_CLASS.get("name")} ({ACTIVE_CLASS_ID})，抽样器参数: {SAMPLER_PARAMS}')
     logger.info(f'配置参数: MIN_NUMBER={MIN_NUMBER}, MAX_NUMBER={MAX_NUMBER}, STUDENT_MODE={STUDENT_MODE}')
+    logger.info(f'快捷键配置: HOTKEY={HOTKEY}, HOTKEY_DEBOUNCE_MS={HOTKEY_DEBOUNCE_MS}')
     logger.info(f'语音叫号配置: ENABLE_VOICE={ENABLE_VOICE}, VOICE_TEMPLATE={VOICE_TEMPLATE}, VOICE_RATE={VOICE_RATE}, VOICE_VOLUME={VOICE_VOLUME}, VOICE_ID={VOICE_ID}')
     return logger
 
 
 # ==================== 启动音效播放 ====================
 def play_startup_sound():
-    sound_path = os.path.join(os.getcwd(), SOUND_FILE)
+    sound_path = asset_path(SOUND_FILE)
     if os.path.exists(sound_path):
         try:
             effect = QSoundEffect()
@@ -336,6 +411,7 @@ class OptimizedClassroomSampler:
         self.boost_factor = boost_factor
         self.window_size = window_size
         self.penalty_rounds = penalty_rounds
+        self.lock = Lock()
         self.reset()
         
     def reset(self):
@@ -350,12 +426,32 @@ class OptimizedClassroomSampler:
         self.current_round = 0
         # 统计信息
         self.last_selected = -1
-        
-    def select(self):
+        # 每名学生上次被选中的时间戳（秒），NaN 表示尚未被选中
+        self.last_selected_at = np.full(self.n, np.nan)
+        self.rebuild_statistics()
+
+    def rebuild_statistics(self):
+        """根据 selection_counts 重新计算增量统计量（加载状态后调用）"""
+        counts = np.asarray(self.selection_counts, dtype=np.int64)
+        self.count_sum = int(counts.sum())
+        self.count_sq_sum = int((counts * counts).sum())
+
+    @property
+    def count_mean(self):
+        """选中次数的均值，增量维护"""
+        return self.count_sum / self.n
+
+    @property
+    def count_variance(self):
+        """选中次数的总体方差，与 np.var(selection_counts) 等价"""
+        # 用整数运算 (n·Σc² - (Σc)²) / n² 避免浮点相减带来的误差累积
+        return (self.n * self.count_sq_sum - self.count_sum * self.count_sum) / (self.n * self.n)
+
+    def current_probabilities(self):
         """
-        执行一次随机选择
+        计算下一次抽取时每名学生的实际概率
         Returns:
-            int: 被选中的学生ID (索引从0开始)
+            np.ndarray: 概率数组
         """
         # --- 1. 计算动态调整后的权重 ---
         adjusted_weights = self.weights.copy()
@@ -368,40 +464,64 @@ class OptimizedClassroomSampler:
             elif rounds_gap > self.window_size:
                 adjusted_weights[i] *= self.boost_factor
 
-        # --- 2. 基于权重进行随机选择 ---
         total_weight = adjusted_weights.sum()
         if total_weight == 0:
             # 极端情况保护：均匀分布
-            probs = np.ones(self.n) / self.n
-        else:
-            probs = adjusted_weights / total_weight
+            return np.ones(self.n) / self.n
+        return adjusted_weights / total_weight
 
-        selected = np.random.choice(self.n, p=probs)
+    def select(self, exclude=()):
+        """
+        执行一次随机选择
+        Args:
+            exclude: 本次不参与抽取的学生ID（分组抽号时已抽中的学生），其余学生按原有概率的比例抽取
+        Returns:
+            int: 被选中的学生ID (索引从0开始)
+        """
+        with self.lock:
+            # --- 1/2. 基于动态调整后的权重进行随机选择 ---
+            probs = self.current_probabilities()
+            if len(exclude):
+                probs[list(exclude)] = 0
+                total = probs.sum()
+                if total > 0:
+                    probs = probs / total
+                else:
+                    # 剩余学生的权重都为 0 时在其中均匀抽取
+                    probs = np.ones(self.n)
+                    probs[list(exclude)] = 0
+                    probs = probs / probs.sum()
+            selected = np.random.choice(self.n, p=probs)
+
+            # --- 3. 更新状态 ---
+            # 所有人增加权重
+            self.weights[:] += self.increment
+            # 被选中的人重置权重
+            self.weights[selected] = self.base_weight
+            # 更新选中时间记录
+            self.last_selected_times[selected] = self.current_round
+            self.last_selected_at[selected] = time.time()
+            # 增量更新均值/方差所需的累计量：c -> c+1 时平方和增加 2c+1
+            self.count_sq_sum += 2 * int(self.selection_counts[selected]) + 1
+            self.count_sum += 1
+            # 记录历史
+            self.selection_history.append(selected)
+            self.selection_counts[selected] += 1
+            self.last_selected = selected
+            self.current_round += 1
 
-        # --- 3. 更新状态 ---
-        # 所有人增加权重
-        self.weights[:] += self.increment
-        # 被选中的人重置权重
-        self.weights[selected] = self.base_weight
-        # 更新选中时间记录
-        self.last_selected_times[selected] = self.current_round
-        # 记录历史
-        self.selection_history.append(selected)
-        self.selection_counts[selected] += 1
-        self.last_selected = selected
-        self.current_round += 1
-        
         # 保存状态到持久化文件
         self.save_state()
 
         return selected
 
-    def save_state(self, filepath='optimized_sampler_state.pkl'):
+    def save_state(self, filepath=None):
         """
         保存当前状态到持久化文件
         Args:
-            filepath: 状态文件路径
+            filepath: 状态文件路径，默认为当前班级的状态文件
         """
+        filepath = filepath or SAMPLER_STATE_FILE
         try:
             state_data = {
                 'weights': self.weights,
@@ -409,29 +529,34 @@ class OptimizedClassroomSampler:
                 'selection_counts': self.selection_counts,
                 'last_selected_times': self.last_selected_times,
                 'current_round': self.current_round,
-                'last_selected': self.last_selected
+                'last_selected': self.last_selected,
+                'last_selected_at': self.last_selected_at
             }
             with open(filepath, 'wb') as f:
                 pickle.dump(state_data, f)
         except Exception as e:
             logger.error(f'保存优化抽样器状态失败: {str(e)}')
 
-    def load_state(self, filepath='optimized_sampler_state.pkl'):
+    def load_state(self, filepath=None):
         """
         从持久化文件加载状态
         Args:
-            filepath: 状态文件路径
+            filepath: 状态文件路径，默认为当前班级的状态文件
         """
+        filepath = filepath or SAMPLER_STATE_FILE
         try:
             with open(filepath, 'rb') as f:
                 state_data = pickle.load(f)
+            with self.lock:
                 self.weights = state_data['weights']
                 self.selection_history = state_data['selection_history']
                 self.selection_counts = state_data['selection_counts']
                 self.last_selected_times = state_data['last_selected_times']
                 self.current_round = state_data['current_round']
                 self.last_selected = state_data['last_selected']
-                return True
+                self.last_selected_at = state_data.get('last_selected_at', np.full(self.n, np.nan))
+                self.rebuild_statistics()
+            return True
         except FileNotFoundError:
             return False
         except Exception as e:
@@ -440,24 +565,30 @@ class OptimizedClassroomSampler:
 
     def get_dashboard_data(self):
         """获取当前状态数据，用于界面展示"""
-        if self.current_round == 0:
-            return None
-        expected = self.current_round / self.n
-        variance = np.var(self.selection_counts)
-        return {
-            "current_round": self.current_round,
-            "weights": self.weights,
-            "selection_counts": self.selection_counts,
-            "expected_count": expected,
-            "fairness_index": 1.0 / (1.0 + variance) if expected > 0 else 0
-        }
+        with self.lock:
+            if self.current_round == 0:
+                return None
+            expected = self.current_round / self.n
+            variance = self.count_variance
+            return {
+                "current_round": self.current_round,
+                "weights": self.weights.copy(),
+                "selection_counts": self.selection_counts.copy(),
+                "probabilities": self.current_probabilities(),
+                "last_selected_at": self.last_selected_at.copy(),
+                "rounds_since": self.current_round - self.last_selected_times,
+                "expected_count": expected,
+                "mean_count": self.count_mean,
+                "variance": variance,
+                "fairness_index": 1.0 / (1.0 + variance) if expected > 0 else 0
+            }
 
 # 创建优化的抽样器实例
-optimized_sampler = OptimizedClassroomSampler(n_students=MAX_NUMBER - MIN_NUMBER + 1)
+optimized_sampler = OptimizedClassroomSampler(n_students=MAX_NUMBER - MIN_NUMBER + 1, **SAMPLER_PARAMS)
 
 # 尝试从持久化数据加载状态
 try:
-    with open('optimized_sampler_state.pkl', 'rb') as f:
+    with open(SAMPLER_STATE_FILE, 'rb') as f:
         state_data = pickle.load(f)
         optimized_sampler.weights = state_data['weights']
         optimized_sampler.selection_history = state_data['selection_history']
@@ -465,6 +596,9 @@ try:
         optimized_sampler.last_selected_times = state_data['last_selected_times']
         optimized_sampler.current_round = state_data['current_round']
         optimized_sampler.last_selected = state_data['last_selected']
+        optimized_sampler.last_selected_at = state_data.get(
+            'last_selected_at', np.full(optimized_sampler.n, np.nan))
+        optimized_sampler.rebuild_statistics()
         logger.info('成功从持久化文件加载优化抽样器状态')
 except FileNotFoundError:
     logger.info('未找到持久化状态文件，使用默认初始状态')
@@ -481,13 +615,28 @@ except Exception as e:
 def reset_optimized_sampler():
     """重置优化的抽样器，用于新学期或特殊情况"""
     global optimized_sampler
-    optimized_sampler = OptimizedClassroomSampler(n_students=MAX_NUMBER - MIN_NUMBER + 1)
+    optimized_sampler = OptimizedClassroomSampler(n_students=MAX_NUMBER - MIN_NUMBER + 1, **SAMPLER_PARAMS)
     # 运行预热，让权重分布进入稳定状态
     for _ in range(MAX_NUMBER - MIN_NUMBER + 1):
         optimized_sampler.select()
     logger.info('优化抽样器已重置并完成预热')
 
-def get_random_number():
+
+def reset_draw_state():
+    """重置优化抽样器和学生讲题模式的进度"""
+    global student_mode_current_min, student_mode_current_max
+    reset_optimized_sampler()
+    student_mode_used_numbers.clear()
+    student_mode_current_min = MIN_NUMBER
+    student_mode_current_max = MAX_NUMBER
+    logger.info('抽号状态已重置')
+
+def get_random_number(exclude=()):
+    """
+    抽取一个号码
+    exclude 中的号码不参与优化随机模式的抽取（分组抽号时传入已抽中的号码）；
+    讲题模式按已讲号码推进，不使用 exclude
+    """
     global data_manager, student_mode_used_numbers
 
     if STUDENT_MODE == 1:
@@ -496,7 +645,7 @@ def get_random_number():
         return get_student_mode_number_reverse()
 
     # 使用优化的随机点人算法
-    selected_index = optimized_sampler.select()
+    selected_index = optimized_sampler.select(exclude=[number - MIN_NUMBER for number in exclude])
     selected_number = selected_index + MIN_NUMBER  # 将索引转换为实际号码
     
     logger.info(f'优化随机模式抽中号数：{selected_number}（降级模式：{data_manager.degraded}）')
@@ -607,6 +756,122 @@ def get_student_mode_number_reverse():
     return selected_number
 
 
+# ==================== 预渲染位图缓存 ====================
+LABEL_WIDTH = WINDOW_WIDTH - 20
+LABEL_FONT_FAMILY = '黑体'
+LABEL_NORMAL_COLOR = '#333333'
+LABEL_HIGHLIGHT_COLOR = 'red'
+
+
+def label_spec(kind, has_students):
+    """返回标签的 (字号, 高度)，与 LotteryWindow 的布局保持一致"""
+    if kind == 'name':
+        return 20, 40
+    return (40, 60) if has_students else (60, 90)
+
+
+def label_style(highlighted):
+    color = LABEL_HIGHLIGHT_COLOR if highlighted else LABEL_NORMAL_COLOR
+    return f"color: {color}; background-color: white; border-radius: 10px;"
+
+
+class GlyphCache:
+    """
+    号码与姓名的预渲染位图缓存
+    在后台线程中把每个号码/姓名的普通样式和高亮样式绘制成 QImage，
+    GUI 线程首次使用时再转换为 QPixmap，之后直接贴图，避免反复排版大字号中文和解析样式表
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.images = {}
+        self.pixmaps = {}
+        self.generation = 0
+        self.ready = False
+
+    def rebuild(self, students, device_ratio=1.0):
+        """按当前名单在后台重建缓存，旧的构建任务会被放弃"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self.ready = False
+        thread = Thread(target=self._build, args=(generation, dict(students), device_ratio))
+        thread.daemon = True
+        thread.start()
+
+    def _entries(self, students):
+        has_students = bool(students)
+        for number in range(MIN_NUMBER, MAX_NUMBER + 1):
+            if has_students:
+                yield 'number', f"№{number}", has_students
+                yield 'name', students.get(number, ''), has_students
+            else:
+                yield 'number', str(number), has_students
+
+    def _build(self, generation, students, device_ratio):
+        start = datetime.now()
+        images = {}
+        try:
+            for kind, text, has_students in self._entries(students):
+                for highlighted in (False, True):
+                    if generation != self.generation:
+                        logger.debug('位图缓存构建已被新的任务取代')
+                        return
+                    key = (kind, has_students, text, highlighted)
+                    if key not in images:
+                        images[key] = self._render(kind, text, has_students, highlighted, device_ratio)
+        except Exception as e:
+            logger.error(f'位图缓存构建失败：{str(e)}')
+            return
+
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.images = images
+            self.pixmaps = {}
+            self.ready = True
+        elapsed = (datetime.now() - start).total_seconds() * 1000
+        logger.info(f'位图缓存构建完成：{len(images)} 项，耗时 {elapsed:.1f} ms')
+
+    @staticmethod
+    def _render(kind, text, has_students, highlighted, device_ratio):
+        point_size, height = label_spec(kind, has_students)
+        image = QImage(int(LABEL_WIDTH * device_ratio), int(height * device_ratio),
+                       QImage.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(device_ratio)
+        image.fill(Qt.transparent)
+
+        painter = QPainter(image)
+        try:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setRenderHint(QPainter.TextAntialiasing)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor('white'))
+            painter.drawRoundedRect(0, 0, LABEL_WIDTH, height, 10, 10)
+            if text:
+                painter.setFont(QFont(LABEL_FONT_FAMILY, point_size, QFont.Bold))
+                painter.setPen(QColor(LABEL_HIGHLIGHT_COLOR if highlighted else LABEL_NORMAL_COLOR))
+                painter.drawText(QRect(0, 0, LABEL_WIDTH, height), Qt.AlignCenter, text)
+        finally:
+            painter.end()
+        return image
+
+    def get(self, kind, text, has_students, highlighted):
+        """获取缓存位图（仅在 GUI 线程调用），未命中返回 None"""
+        key = (kind, has_students, text, highlighted)
+        with self.lock:
+            pixmap = self.pixmaps.get(key)
+            if pixmap is None:
+                image = self.images.get(key)
+                if image is None:
+                    return None
+                pixmap = QPixmap.fromImage(image)
+                self.pixmaps[key] = pixmap
+            return pixmap
+
+
+glyph_cache = GlyphCache()
+
+
 # ==================== 抽号窗口 ====================
 class LotteryWindow(QDialog):
     def __init__(self, number, parent=None):
@@ -614,7 +879,7 @@ class LotteryWindow(QDialog):
         self.number = number
         self.scroll_count = 0
         self.max_scroll_times = DELAY
-        self.display_text = STUDENTS.get(self.number, str(self.number))
+        self.has_students = bool(STUDENTS)
 
         self.initUI()
 
@@ -641,34 +906,46 @@ class LotteryWindow(QDialog):
         # 号码标签
         self.number_label = QLabel()
         self.number_label.setAlignment(Qt.AlignCenter)
-        self.number_label.setFont(QFont('黑体', 40 if STUDENTS else 60, QFont.Bold))
-        self.number_label.setStyleSheet("color: #333333; background-color: white; border-radius: 10px;")
-        self.number_label.setFixedHeight(60 if STUDENTS else 90)
+        self.number_label.setFont(QFont(LABEL_FONT_FAMILY, label_spec('number', self.has_students)[0], QFont.Bold))
+        self.number_label.setStyleSheet(label_style(False))
+        self.number_label.setFixedHeight(label_spec('number', self.has_students)[1])
         layout.addWidget(self.number_label)
 
         # 姓名标签
-        if STUDENTS:
+        if self.has_students:
             self.name_label = QLabel()
             self.name_label.setAlignment(Qt.AlignCenter)
-            self.name_label.setFont(QFont('黑体', 20, QFont.Bold))
-            self.name_label.setStyleSheet("color: #333333; background-color: white; border-radius: 10px;")
-            self.name_label.setFixedHeight(40)
+            self.name_label.setFont(QFont(LABEL_FONT_FAMILY, label_spec('name', True)[0], QFont.Bold))
+            self.name_label.setStyleSheet(label_style(False))
+            self.name_label.setFixedHeight(label_spec('name', True)[1])
             layout.addWidget(self.name_label)
         else:
             self.name_label = None
 
         self.setLayout(layout)
 
-    def start_scroll(self):
-        self.scroll_count += 1
-        random_num = randint(MIN_NUMBER, MAX_NUMBER)
-        random_display_text = STUDENTS.get(random_num, str(random_num))
-
+    def set_label(self, label, kind, text, highlighted=False):
+        """优先从位图缓存贴图，缓存未就绪时退回到文本渲染"""
+        pixmap = glyph_cache.get(kind, text, self.has_students, highlighted)
+        if pixmap is not None:
+            label.setPixmap(pixmap)
+            return
+        label.setText(text)
+        if highlighted:
+            label.setStyleSheet(label_style(True))
+
+    def display(self, number, highlighted=False):
+        display_text = STUDENTS.get(number, str(number))
         if self.name_label:
-            self.number_label.setText(f"№{random_num}")
-            self.name_label.setText(random_display_text if random_display_text != str(random_num) else "")
+            self.set_label(self.number_label, 'number', f"№{number}", highlighted)
+            self.set_label(self.name_label, 'name',
+                           display_text if display_text != str(number) else "", highlighted)
         else:
-            self.number_label.setText(random_display_text)
+            self.set_label(self.number_label, 'number', display_text, highlighted)
+
+    def start_scroll(self):
+        self.scroll_count += 1
+        self.display(randint(MIN_NUMBER, MAX_NUMBER))
 
         if self.scroll_count < self.max_scroll_times:
             interval = 50 + (self.scroll_count * 10)
@@ -677,27 +954,13 @@ class LotteryWindow(QDialog):
             self.stop_scroll()
 
     def stop_scroll(self):
-        if self.name_label:
-            self.number_label.setText(f"№{self.number}")
-            self.number_label.setStyleSheet("color: red; background-color: white; border-radius: 10px;")
-            self.name_label.setText(self.display_text if self.display_text != str(self.number) else "")
-            self.name_label.setStyleSheet("color: red; background-color: white; border-radius: 10px;")
-        else:
-            self.number_label.setText(self.display_text)
-            self.number_label.setStyleSheet("color: red; background-color: white; border-radius: 10px;")
+        self.display(self.number, highlighted=True)
 
         logger.info('三秒变动模式：已定格最终结果')
         QTimer.singleShot(KEEP * 1000, self.close)
 
     def show_result(self):
-        if self.name_label:
-            self.number_label.setText(f"№{self.number}")
-            self.number_label.setStyleSheet("color: red; background-color: white; border-radius: 10px;")
-            self.name_label.setText(self.display_text if self.display_text != str(self.number) else "")
-            self.name_label.setStyleSheet("color: red; background-color: white; border-radius: 10px;")
-        else:
-            self.number_label.setText(self.display_text)
-            self.number_label.setStyleSheet("color: red; background-color: white; border-radius: 10px;")
+        self.display(self.number, highlighted=True)
 
         logger.info('直接显示模式：已显示结果')
         QTimer.singleShot(KEEP * 1000, self.close)
@@ -707,19 +970,489 @@ class LotteryWindow(QDialog):
         pass
 
 
+# ==================== 公平性面板 ====================
+DASHBOARD_REFRESH_MS = 1000
+
+
+def format_elapsed(seconds):
+    """把秒数格式化为便于阅读的时间间隔"""
+    if seconds != seconds:  # NaN
+        return '从未'
+    seconds = int(seconds)
+    if seconds < 60:
+        return f'{seconds}秒前'
+    if seconds < 3600:
+        return f'{seconds // 60}分钟前'
+    if seconds < 86400:
+        return f'{seconds // 3600}小时前'
+    return f'{seconds // 86400}天前'
+
+
+class FairnessDashboard(QDialog):
+    """
+    优化随机模式的实时公平性面板
+    抽号只把面板标记为脏，由定时器按固定频率合并刷新，避免频繁重绘
+    """
+    COLUMNS = ['号码', '姓名', '抽中次数', '当前概率', '上次抽中']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.dirty = True
+        self.initUI()
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(DASHBOARD_REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.on_refresh_timer)
+
+    def initUI(self):
+        self.setWindowTitle('抽号公平性面板')
+        self.resize(460, 560)
+
+        layout = QVBoxLayout()
+        self.summary_label = QLabel()
+        self.summary_label.setFont(QFont('微软雅黑', 10))
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        self.setLayout(layout)
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def showEvent(self, event):
+        self.dirty = True
+        self.refresh()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def on_refresh_timer(self):
+        if self.dirty:
+            self.refresh()
+        else:
+            # 没有新抽号时只刷新随时间变化的 "上次抽中" 一列
+            self.refresh_elapsed()
+
+    def refresh_elapsed(self):
+        # select()/load_state 会在抽号线程中修改或替换该数组，与 get_dashboard_data 一样在锁内复制
+        sampler = optimized_sampler
+        with sampler.lock:
+            last_at = sampler.last_selected_at.copy()
+        if self.table.rowCount() != len(last_at):
+            return
+        now = time.time()
+        for i in range(len(last_at)):
+            item = self.table.item(i, 4)
+            value = format_elapsed(now - last_at[i])
+            if item is not None and item.text() != value:
+                item.setText(value)
+
+    def refresh(self):
+        data = optimized_sampler.get_dashboard_data()
+        if data is None:
+            self.summary_label.setText('暂无抽号记录')
+            self.table.setRowCount(0)
+            return
+
+        now = time.time()
+        counts = data['selection_counts']
+        probs = data['probabilities']
+        last_at = data['last_selected_at']
+
+        self.summary_label.setText(
+            f"总轮次：{data['current_round']}    期望次数：{data['expected_count']:.2f}    "
+            f"方差：{data['variance']:.2f}    公平指数：{data['fairness_index']:.4f}"
+        )
+
+        self.table.setUpdatesEnabled(False)
+        try:
+            if self.table.rowCount() != len(counts):
+                self.table.setRowCount(len(counts))
+            for i in range(len(counts)):
+                number = i + MIN_NUMBER
+                values = [
+                    str(number),
+                    STUDENTS.get(number, ''),
+                    str(int(counts[i])),
+                    f'{probs[i] * 100:.2f}%',
+                    format_elapsed(now - last_at[i]),
+                ]
+                for column, value in enumerate(values):
+                    item = self.table.item(i, column)
+                    if item is None:
+                        self.table.setItem(i, column, QTableWidgetItem(value))
+                    elif item.text() != value:
+                        item.setText(value)
+        finally:
+            self.table.setUpdatesEnabled(True)
+        self.dirty = False
+
+
 # ==================== 通信对象 ====================
 class Communicator(QObject):
     show_window_signal = Signal(int)
+    draw_failed_signal = Signal(str)
+    promote_signal = Signal()
+    shutdown_signal = Signal()
 
     def __init__(self):
         super().__init__()
 
 
+# ==================== 抽号工作线程 ====================
+class DrawWorker:
+    """
+    单线程抽号工作者
+    快捷键回调只负责把请求放入有界队列，抽号、统计写入和语音线程的启动都在工作线程中完成，
+    结果通过 Communicator 信号交回 GUI 线程，避免阻塞 pynput 的系统按键分发
+    """
+    def __init__(self, communicator, maxsize=DRAW_QUEUE_SIZE):
+        self.communicator = communicator
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+        self.stats_lock = Lock()
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_process = 0.0
+        self.max_process = 0.0
+        self.current_started = None
+
+    def start(self):
+        self.thread = Thread(target=self._run, name='DrawWorker')
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f'抽号工作线程已启动（队列容量 {self.queue.maxsize}）')
+
+    def stop(self, timeout=2.0):
+        if self.thread is None:
+            return
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.thread.join(timeout=timeout)
+        logger.info(f'抽号工作线程已停止：{self.stats_text()}')
+
+    def submit(self, source='hotkey', action='draw', params=None, callback=None):
+        """
+        提交一个请求（任意线程可调用，不阻塞），队列已满时丢弃并返回 False
+        Args:
+            source: 请求来源，用于日志
+            action: draw / group_draw / reset
+            params: 请求参数
+            callback: 处理完成后在工作线程中调用 callback(ok, result)
+        """
+        try:
+            self.queue.put_nowait((source, action, params or {}, callback, time.perf_counter()))
+            return True
+        except queue.Full:
+            with self.stats_lock:
+                self.dropped += 1
+            logger.warning(f'抽号队列已满，丢弃来自 {source} 的请求（累计丢弃 {self.dropped} 次）')
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            source, action, params, callback, enqueued_at = item
+            started_at = time.perf_counter()
+            self.current_started = started_at
+            try:
+                ok, result = self.process(source, action, params)
+            finally:
+                self.current_started = None
+            finished_at = time.perf_counter()
+            self._record(started_at - enqueued_at, finished_at - started_at, ok)
+            if callback:
+                try:
+                    callback(ok, result)
+                except Exception as e:
+                    logger.error(f'抽号请求回调异常：{str(e)}')
+
+    def process(self, source, action='draw', params=None):
+        """执行请求，返回 (是否成功, 结果或错误信息)"""
+        params = params or {}
+        try:
+            if action == 'draw':
+                return True, self.draw(show=params.get('show', True))
+            elif action == 'group_draw':
+                return True, self.draw_group(int(params.get('count', 2)))
+            elif action == 'reset':
+                reset_draw_state()
+                return True, None
+            raise ValueError(f'未知的请求类型: {action}')
+        except Exception as e:
+            logger.error(f'抽号失败（来源：{source}，类型：{action}）：{str(e)}')
+            if source == 'hotkey':
+                self.communicator.draw_failed_signal.emit('抽号失败，请重试！')
+            return False, str(e)
+
+    def draw(self, show=True):
+        number = get_random_number()
+        data_manager.update_stat(number)
+
+        if show:
+            # 通过信号触发主线程中的窗口显示
+            self.communicator.show_window_signal.emit(number)
+
+            # 语音播放
+            if ENABLE_VOICE:
+                speak_thread = Thread(target=speak_number, args=(number,))
+                speak_thread.daemon = True
+                speak_thread.start()
+        return number
+
+    def draw_group(self, count):
+        """一次抽取 count 个不重复的号码（不弹窗、不叫号）"""
+        total = MAX_NUMBER - MIN_NUMBER + 1
+        if not 1 <= count <= total:
+            raise ValueError(f'分组人数必须在 1 到 {total} 之间')
+        numbers = []
+        while len(numbers) < count:
+            # 已抽中的号码不参与后续抽取，抽样器对每个抽中的号码只记录一次
+            number = get_random_number(exclude=numbers)
+            if number in numbers:
+                # 只有讲题模式在一轮讲完重置时会给出本组已有的号码，它随即重新记为已讲，继续抽取即可
+                continue
+            numbers.append(number)
+            data_manager.update_stat(number)
+        logger.info(f'分组抽号结果：{numbers}')
+        return numbers
+
+    def _record(self, wait, elapsed, ok):
+        with self.stats_lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_process += elapsed
+            self.max_process = max(self.max_process, elapsed)
+        logger.debug(f'抽号请求处理完成：排队 {wait * 1000:.2f} ms，处理 {elapsed * 1000:.2f} ms')
+
+    def busy_seconds(self):
+        """当前请求已处理的秒数，空闲时为 0"""
+        started = self.current_started
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def get_stats(self):
+        """返回排队与处理耗时统计（毫秒）"""
+        with self.stats_lock:
+            count = self.processed + self.failed
+            return {
+                'processed': self.processed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'pending': self.queue.qsize(),
+                'avg_wait_ms': self.total_wait / count * 1000 if count else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+                'avg_process_ms': self.total_process / count * 1000 if count else 0.0,
+                'max_process_ms': self.max_process * 1000,
+            }
+
+    def stats_text(self):
+        stats = self.get_stats()
+        return (f"完成 {stats['processed']} 次，失败 {stats['failed']} 次，丢弃 {stats['dropped']} 次，"
+                f"平均排队 {stats['avg_wait_ms']:.2f} ms（最大 {stats['max_wait_ms']:.2f} ms），"
+                f"平均处理 {stats['avg_process_ms']:.2f} ms（最大 {stats['max_process_ms']:.2f} ms）")
+
+
+# ==================== 本地控制接口 ====================
+def to_jsonable(value):
+    """把 numpy 类型转换为可 JSON 序列化的 Python 类型"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [to_jsonable(v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    """
+    本地控制接口的请求处理
+    POST /  请求体: {"id": "请求ID", "action": "draw|group_draw|reset|stats", ...}
+    GET /stats  直接读取统计信息
+    返回: {"id": "请求ID", "ok": true/false, "result": ..., "error": ...}
+    所有请求都必须携带 X-Control-Token；带 Origin 头的请求（来自浏览器网页）一律拒绝，
+    POST 还必须是 application/json，网页无法不经预检就发出这样的跨域请求
+    """
+    server_version = 'ClassroomLottery'
+
+    def log_message(self, format, *args):
+        logger.debug(f'控制接口：{self.address_string()} {format % args}')
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip('/') == '/stats':
+            self._respond(200, {'id': None, 'ok': True, 'result': self.server.control.collect_stats()})
+        else:
+            self._respond(404, {'id': None, 'ok': False, 'error': 'not found'})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self._respond(415, {'id': None, 'ok': False, 'error': 'content type must be application/json'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            if not isinstance(request, dict):
+                raise ValueError('请求体必须是 JSON 对象')
+        except Exception as e:
+            self._respond(400, {'id': None, 'ok': False, 'error': f'invalid request: {e}'})
+            return
+        status, response = self.server.control.handle(request)
+        self._respond(status, response)
+
+    def _authorized(self):
+        if self.headers.get('Origin') is not None:
+            self._respond(403, {'id': None, 'ok': False, 'error': 'cross-origin requests are not allowed'})
+            return False
+        token = self.server.control.token
+        # 按字节比较：compare_digest 比较含非 ASCII 字符的字符串时会抛出 TypeError
+        received = self.headers.get('X-Control-Token', '').encode('utf-8', 'surrogateescape')
+        if not token or not hmac.compare_digest(received, token.encode('utf-8')):
+            self._respond(403, {'id': None, 'ok': False, 'error': 'forbidden'})
+            return False
+        return True
+
+    def _respond(self, status, payload):
+        body = json.dumps(to_jsonable(payload), ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ControlServer:
+    """
+    仅监听本机回环地址的 HTTP 控制接口，供电子白板或自动化脚本触发抽号、读取统计
+    抽号类请求会进入 DrawWorker 的队列，与快捷键共用同一条处理流水线
+    """
+    ACTIONS = ('draw', 'group_draw', 'reset', 'stats', 'shutdown')
+
+    def __init__(self, draw_worker, port=CONTROL_PORT, host=CONTROL_HOST, token=CONTROL_TOKEN):
+        self.draw_worker = draw_worker
+        self.host = host
+        self.port = port
+        self.token = token
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def address(self):
+        if self.httpd is None:
+            return None
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), ControlRequestHandler)
+        except OSError as e:
+            logger.error(f'本地控制接口启动失败（端口 {self.port}）：{str(e)}')
+            self.httpd = None
+            return False
+        self.httpd.daemon_threads = True
+        self.httpd.control = self
+        self.thread = Thread(target=self.httpd.serve_forever, name='ControlServer')
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f'本地控制接口已启动：{self.address}')
+        return True
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+            logger.info('本地控制接口已停止')
+
+    def handle(self, request):
+        """处理一个请求，返回 (HTTP 状态码, 响应字典)"""
+        request_id = request.get('id')
+        action = request.get('action')
+        if action not in self.ACTIONS:
+            return 400, {'id': request_id, 'ok': False, 'error': f'unknown action: {action}'}
+        logger.info(f'控制接口请求：id={request_id}, action={action}')
+
+        if action == 'stats':
+            return 200, {'id': request_id, 'ok': True, 'result': self.collect_stats()}
+        if action == 'shutdown':
+            # 由 GUI 线程执行退出流程，先返回响应
+            self.draw_worker.communicator.shutdown_signal.emit()
+            return 200, {'id': request_id, 'ok': True, 'result': None}
+
+        params = {key: value for key, value in request.items() if key not in ('id', 'action')}
+        done = Event()
+        outcome = {}
+
+        def on_done(ok, result):
+            outcome['ok'] = ok
+            outcome['result'] = result
+            done.set()
+
+        if not self.draw_worker.submit('control', action, params, on_done):
+            return 503, {'id': request_id, 'ok': False, 'error': 'draw queue is full'}
+        if not done.wait(CONTROL_TIMEOUT):
+            return 504, {'id': request_id, 'ok': False, 'error': 'timeout'}
+        if not outcome['ok']:
+            return 500, {'id': request_id, 'ok': False, 'error': outcome['result']}
+        return 200, {'id': request_id, 'ok': True, 'result': outcome['result']}
+
+    def collect_stats(self):
+        dashboard = optimized_sampler.get_dashboard_data() or {}
+        dashboard.pop('weights', None)
+        with data_manager.lock:
+            counts = dict(data_manager.data['numbers'])
+        return {
+            'mode': STUDENT_MODE,
+            'min_number': MIN_NUMBER,
+            'max_number': MAX_NUMBER,
+            'counts': counts,
+            'sampler': dashboard,
+            'worker': self.draw_worker.get_stats(),
+        }
+
+
 # ==================== 语音叫号功能 ====================
+# 正在进行的语音播报：线程ID -> 开始时间，用于向守护进程报告 TTS 卡死
+active_speeches = {}
+active_speeches_lock = Lock()
+
+
 def speak_number(number):
     if not ENABLE_VOICE:
         return
 
+    thread_id = threading_get_ident()
+    with active_speeches_lock:
+        active_speeches[thread_id] = time.monotonic()
     try:
         student_name = STUDENTS.get(number)
         after_handle = (random.choice(classroom_adjectives)
@@ -737,6 +1470,310 @@ def speak_number(number):
         logger.info(f'语音叫号成功: {speak_text}')
     except Exception as e:
         logger.error(f'语音叫号功能异常: {str(e)}')
+    finally:
+        with active_speeches_lock:
+            active_speeches.pop(thread_id, None)
+
+
+def longest_speech_seconds():
+    """返回当前持续时间最长的语音播报已进行的秒数"""
+    with active_speeches_lock:
+        if not active_speeches:
+            return 0.0
+        return time.monotonic() - min(active_speeches.values())
+
+
+# ==================== 守护进程心跳 ====================
+class HeartbeatSender:
+    """
+    向守护进程发送心跳
+    守护进程通过环境变量 LOTTERY_HEARTBEAT_PORT / LOTTERY_HEARTBEAT_TOKEN 告知本机 UDP 端口，
+    心跳由 GUI 线程的 QTimer 发出，事件循环卡死时心跳随之停止；
+    同时上报定时器的触发延迟、抽号线程和语音播报的执行时长，供守护进程判断是否需要重启
+    """
+    def __init__(self, app, interval_ms=HEARTBEAT_INTERVAL_MS):
+        self.app = app
+        self.interval = interval_ms / 1000.0
+        self.port = int(os.environ.get('LOTTERY_HEARTBEAT_PORT', '0') or 0)
+        self.token = os.environ.get('LOTTERY_HEARTBEAT_TOKEN', '')
+        self.sock = None
+        self.seq = 0
+        self.expected_at = None
+        # 心跳时曾观察到在运行的快捷键监听线程
+        self.running_listener = None
+        self.timer = QTimer()
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.beat)
+
+    @property
+    def enabled(self):
+        return self.port > 0
+
+    def start(self):
+        if not self.enabled:
+            return False
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        except OSError as e:
+            logger.error(f'心跳通道创建失败：{str(e)}')
+            return False
+        # 非阻塞：每次心跳后顺带读取守护进程发来的指令
+        self.sock.setblocking(False)
+        self.expected_at = time.monotonic() + self.interval
+        self.timer.start()
+        self.beat()
+        logger.info(f'已启动守护进程心跳（端口 {self.port}，间隔 {self.interval:.1f} 秒）')
+        return True
+
+    def stop(self):
+        self.timer.stop()
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def beat(self):
+        if self.sock is None:
+            return
+        now = time.monotonic()
+        # 定时器实际触发时间与预期时间之差即事件循环延迟
+        latency = max(now - self.expected_at, 0.0) if self.expected_at else 0.0
+        self.expected_at = now + self.interval
+        self.seq += 1
+        listener = self.app.hotkey_listener
+        payload = {
+            'token': self.token,
+            'pid': os.getpid(),
+            'seq': self.seq,
+            'loop_latency_ms': round(latency * 1000, 1),
+            'worker_busy_ms': round(self.app.draw_worker.busy_seconds() * 1000, 1),
+            'tts_busy_ms': round(longest_speech_seconds() * 1000, 1),
+            'standby': self.app.standby,
+        }
+        if self.app.standby:
+            payload['control_port'] = self.app.standby_controller.port
+        else:
+            payload['listener_alive'] = self.listener_alive(listener)
+        try:
+            self.sock.sendto(json.dumps(payload).encode('utf-8'), ('127.0.0.1', self.port))
+        except OSError as e:
+            logger.warning(f'心跳发送失败：{str(e)}')
+        self.poll_commands()
+
+    def poll_commands(self):
+        """读取守护进程回送到心跳端口的指令，目前只有资源超限时的 shutdown"""
+        while self.sock is not None:
+            try:
+                data, _ = self.sock.recvfrom(4096)
+                message = json.loads(data.decode('utf-8'))
+            except (BlockingIOError, socket.timeout):
+                return
+            except OSError:
+                # Windows 上守护进程端口不可达时 recvfrom 会报连接重置，忽略即可
+                return
+            except ValueError:
+                continue
+            if message.get('token') != self.token:
+                continue
+            if message.get('action') == 'shutdown':
+                logger.warning(f"守护进程请求退出：{message.get('reason', '')}")
+                self.app.shutdown()
+
+    def listener_alive(self, listener):
+        """
+        快捷键监听线程确实运行过之后才可能报告 False；
+        从未启动（如 macOS 未授权辅助功能、启动失败）时返回 None，守护进程不据此重启
+        """
+        if listener is None:
+            return None
+        if listener.is_alive():
+            self.running_listener = listener
+            return True
+        return False if listener is self.running_listener else None
+
+
+class StandbyController:
+    """
+    热备实例的接管通道
+    绑定本机 UDP 端口并通过心跳告知守护进程，收到携带本实例令牌的 promote 指令后
+    通过信号通知 GUI 线程接管快捷键和托盘
+    """
+    def __init__(self, communicator):
+        self.communicator = communicator
+        self.token = os.environ.get('LOTTERY_HEARTBEAT_TOKEN', '')
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.thread = Thread(target=self._wait_for_promotion, name='StandbyController')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        logger.info(f'热备模式：初始化完成，等待接管（端口 {self.port}）')
+
+    def _wait_for_promotion(self):
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(4096)
+                message = json.loads(data.decode('utf-8'))
+            except OSError:
+                return
+            except ValueError:
+                continue
+            if message.get('token') == self.token and message.get('action') == 'promote':
+                self.sock.close()
+                self.communicator.promote_signal.emit()
+                return
+
+
+def reload_persistent_state():
+    """热备实例接管前重新读取磁盘上的最新状态（由上一个实例持续写入）"""
+    global STUDENTS
+    STUDENTS = load_students()
+    if not optimized_sampler.load_state():
+        logger.warning('接管时未能读取优化抽样器状态，沿用启动时的状态')
+    with data_manager.lock:
+        data_manager.data = data_manager._init_data()
+
+
+# ==================== 快捷键过滤 ====================
+MODIFIER_KEYS = {'alt', 'ctrl', 'shift', 'cmd'}
+KEY_ALIASES = {
+    'control': 'ctrl',
+    'option': 'alt',
+    'win': 'cmd',
+    'windows': 'cmd',
+    'super': 'cmd',
+    'command': 'cmd',
+    'return': 'enter',
+    'escape': 'esc',
+}
+
+
+def normalize_key_name(name):
+    """统一按键名称：去掉左右区分并处理别名，如 alt_l -> alt"""
+    name = name.strip().lower()
+    for suffix in ('_l', '_r', '_gr'):
+        if name.endswith(suffix) and name[:-len(suffix)] in MODIFIER_KEYS:
+            name = name[:-len(suffix)]
+            break
+    return KEY_ALIASES.get(name, name)
+
+
+def key_name(key):
+    """把 pynput 的按键对象转换为统一的按键名称，无法识别时返回 None"""
+    if isinstance(key, keyboard.Key):
+        return normalize_key_name(key.name)
+    vk = getattr(key, 'vk', None)
+    # 按住 Ctrl 时 char 可能是控制字符，字母和数字优先使用虚拟键码
+    if vk is not None and (0x30 <= vk <= 0x39 or 0x41 <= vk <= 0x5A):
+        return chr(vk).lower()
+    char = getattr(key, 'char', None)
+    if char:
+        return char.lower()
+    if vk is not None:
+        return f'vk{vk}'
+    return None
+
+
+def parse_hotkey(text):
+    """解析 'ctrl+alt+l' 形式的快捷键配置，返回按键名称集合"""
+    keys = {normalize_key_name(part) for part in text.split('+') if part.strip()}
+    if not keys:
+        raise ValueError(f'无效的快捷键配置: {text!r}')
+    return frozenset(keys)
+
+
+class HotkeyFilter:
+    """
+    全局快捷键过滤器
+    跟踪按键的按下/抬起状态，过滤系统自动重复和防抖时间内的重复触发：
+    1. 纯修饰键快捷键（如 alt）在抬起时触发，期间按下过其他键（如 Alt+Tab）则不触发
+    2. 含普通键的组合键（如 ctrl+alt+l）在按下最后一个键、且恰好按下这些键时触发
+    """
+    # 系统自动重复的间隔不会超过此值，超过则认为抬起事件丢失（如锁屏时），按新的按下处理
+    STALE_PRESS_SECONDS = 1.5
+
+    def __init__(self, hotkey, debounce_ms, callback):
+        try:
+            self.chord = parse_hotkey(hotkey)
+        except ValueError as e:
+            logger.warning(f'{str(e)}，使用默认快捷键 alt')
+            self.chord = frozenset({'alt'})
+        self.modifier_only = self.chord <= MODIFIER_KEYS
+        self.debounce = max(debounce_ms, 0) / 1000.0
+        self.callback = callback
+        self.lock = Lock()
+
+        self.pressed = {}  # 按键名称 -> 最近一次按下事件的时间
+        self.armed = False
+        self.last_fire = 0.0
+        self.fired_count = 0
+        self.suppressed = {'repeat': 0, 'combo': 0, 'debounce': 0}
+
+    def describe(self):
+        return '+'.join(sorted(self.chord, key=lambda k: (k not in MODIFIER_KEYS, k)))
+
+    def stats_text(self):
+        return (f"触发 {self.fired_count} 次，已抑制 自动重复 {self.suppressed['repeat']} 次、"
+                f"组合键 {self.suppressed['combo']} 次、防抖 {self.suppressed['debounce']} 次")
+
+    def on_press(self, key):
+        name = key_name(key)
+        if name is None:
+            return
+        fire = False
+        now = time.monotonic()
+        with self.lock:
+            last_seen = self.pressed.get(name)
+            self.pressed[name] = now
+            if last_seen is not None and now - last_seen < self.STALE_PRESS_SECONDS:
+                # 按住不放时系统产生的自动重复
+                self.suppressed['repeat'] += 1
+                return
+            if last_seen is not None:
+                # 抬起事件丢失，丢弃可能同样残留的其他按键状态
+                self.pressed = {name: now}
+
+            if self.modifier_only:
+                if self.pressed.keys() == self.chord:
+                    self.armed = True
+                elif self.armed:
+                    # 快捷键被用作其他组合键的一部分
+                    self.armed = False
+                    self.suppressed['combo'] += 1
+            elif name in self.chord and self.pressed.keys() == self.chord:
+                fire = self._check_debounce()
+        if fire:
+            self._fire()
+
+    def on_release(self, key):
+        name = key_name(key)
+        if name is None:
+            return
+        fire = False
+        with self.lock:
+            if self.modifier_only and self.armed and name in self.chord:
+                self.armed = False
+                fire = self._check_debounce()
+            self.pressed.pop(name, None)
+        if fire:
+            self._fire()
+
+    def _check_debounce(self):
+        now = time.monotonic()
+        if now - self.last_fire < self.debounce:
+            self.suppressed['debounce'] += 1
+            return False
+        self.last_fire = now
+        self.fired_count += 1
+        return True
+
+    def _fire(self):
+        logger.debug(f'快捷键触发，{self.stats_text()}')
+        try:
+            self.callback()
+        except Exception as e:
+            logger.error(f'快捷键回调异常：{str(e)}')
 
 
 # ==================== 主应用 ====================
@@ -745,10 +1782,52 @@ class LotteryApp:
         self.app = QApplication(sys.argv)
         self.app.setQuitOnLastWindowClosed(False)
         self.current_window = None  # 添加窗口引用
+        self.dashboard = None
 
         # 初始化通信对象
         self.communicator = Communicator()
         self.communicator.show_window_signal.connect(self.show_lottery_window)
+        self.communicator.draw_failed_signal.connect(self.show_draw_error)
+        self.communicator.shutdown_signal.connect(self.shutdown)
+
+        # 抽号工作线程，需在快捷键监听之前启动
+        self.draw_worker = DrawWorker(self.communicator)
+        self.draw_worker.start()
+
+        self.control_server = None
+        self.hotkey_listener = None
+        self.hotkey_filter = None
+        self.standby = STANDBY
+        self.standby_controller = None
+
+        if self.standby:
+            # 热备模式：只完成初始化，不占用快捷键、托盘和控制端口
+            self.standby_controller = StandbyController(self.communicator)
+            self.communicator.promote_signal.connect(self.promote)
+            self.standby_controller.start()
+        else:
+            self.activate()
+
+        # 守护进程心跳（仅在由守护进程启动时生效）
+        self.heartbeat = HeartbeatSender(self)
+        self.heartbeat.start()
+
+        # 启动后在后台构建位图缓存，并在名单变化时重建
+        self.roster_mtime = self.get_roster_mtime()
+        self.roster_watcher = QFileSystemWatcher()
+        self.roster_watcher.addPath(os.path.dirname(os.path.abspath(STUDENTS_FILE)))
+        if os.path.exists(STUDENTS_FILE):
+            self.roster_watcher.addPath(os.path.abspath(STUDENTS_FILE))
+        self.roster_watcher.fileChanged.connect(self.on_roster_changed)
+        self.roster_watcher.directoryChanged.connect(self.on_roster_changed)
+        QTimer.singleShot(0, self.rebuild_glyph_cache)
+
+    def activate(self):
+        """启用托盘、快捷键和控制接口，使本实例开始响应抽号；调用方应已持有单实例锁"""
+        # 本地控制接口
+        if CONTROL_PORT:
+            self.control_server = ControlServer(self.draw_worker)
+            self.control_server.start()
 
         # 创建托盘
         self.create_tray_icon()
@@ -756,9 +1835,36 @@ class LotteryApp:
         # 启动快捷键监听
         self.start_hotkey_listener()
 
+        # 登记 PID 和控制端点，供启动器检测和关闭
+        try:
+            register_instance('main', {
+                'control': self.control_server.address if self.control_server else None,
+                'control_token': self.control_server.token if self.control_server else None,
+            })
+        except OSError as e:
+            logger.warning(f'写入实例登记表失败：{str(e)}')
+
         # 播放启动音效
         play_startup_sound()
-        self.hotkey_listener = None
+
+    def promote(self):
+        """热备实例接管：读取最新状态后启用各项功能"""
+        start = time.perf_counter()
+        if not instance_lock.acquire():
+            # 另一个实例仍在运行，接管会出现两个实例同时响应快捷键；
+            # 以非零退出码退出，由守护进程改为冷启动
+            logger.error('未能获取单实例锁，可能有其他抽号程序仍在运行，放弃接管')
+            self.heartbeat.stop()
+            self.draw_worker.stop()
+            self.app.exit(1)
+            return
+        reload_persistent_state()
+        self.activate()
+        self.standby = False
+        # 立即发送一次心跳，让守护进程尽快确认接管完成
+        self.heartbeat.beat()
+        QTimer.singleShot(0, self.rebuild_glyph_cache)
+        logger.info(f'热备实例已接管，耗时 {(time.perf_counter() - start) * 1000:.1f} ms')
 
     def create_tray_icon(self):
         global tray_icon
@@ -767,13 +1873,13 @@ class LotteryApp:
         icon_path = ''
         if sys.platform == 'win32':
             # Windows 使用 .ico
-            icon_path = os.path.join(os.getcwd(), 'assets/icon.ico')
+            icon_path = asset_path('assets/icon.ico')
         elif sys.platform == 'darwin':
             # macOS 使用 .icns
-            icon_path = os.path.join(os.getcwd(), 'assets/icon.icns')
+            icon_path = asset_path('assets/icon.icns')
         else:
             # Linux 或其他平台备选（例如 .png）
-            icon_path = os.path.join(os.getcwd(), 'assets/icon.png')
+            icon_path = asset_path('assets/icon.png')
 
         # ==================== 加载图标 ====================
         icon = QIcon()
@@ -798,10 +1904,13 @@ class LotteryApp:
 
         # ==================== 创建托盘对象 ====================
         tray_icon = QSystemTrayIcon(icon, self.app)
-        tray_icon.setToolTip('课堂抽号（快捷键：按alt）')
+        tray_icon.setToolTip(f'课堂抽号（快捷键：按{HOTKEY}）')
 
         # 创建托盘菜单
         tray_menu = QMenu()
+        dashboard_action = QAction("公平性面板", self.app)
+        dashboard_action.triggered.connect(self.show_dashboard)
+        tray_menu.addAction(dashboard_action)
         exit_action = QAction("退出程序", self.app)
         exit_action.triggered.connect(self.exit_app)
         tray_menu.addAction(exit_action)
@@ -821,22 +1930,16 @@ class LotteryApp:
         注意：在 macOS 系统设置 -> 隐私与安全性 -> 辅助功能 中，必须添加 Python 或终端/IDE 并授权
         """
         try:
-            # 定义按键按下时的处理函数
-            def on_press(key):
-                try:
-                    # 检测是否按下了 Alt 键 (兼容左 Alt 和右 Alt)
-                    # 注意：如果配置文件中有其他快捷键配置，这里需要解析配置
-                    # 目前根据原代码，HOTKEY 默认为 'alt'
-                    if key == keyboard.Key.alt or key == keyboard.Key.alt_l or key == keyboard.Key.alt_r:
-                        self.on_hotkey()
-                except AttributeError:
-                    pass
+            # 按键事件先经过过滤器：去除自动重复、组合键误触和防抖
+            self.hotkey_filter = HotkeyFilter(HOTKEY, HOTKEY_DEBOUNCE_MS, self.on_hotkey)
 
             # 创建监听器，非阻塞模式
-            self.hotkey_listener = keyboard.Listener(on_press=on_press)
+            self.hotkey_listener = keyboard.Listener(on_press=self.hotkey_filter.on_press,
+                                                     on_release=self.hotkey_filter.on_release)
             self.hotkey_listener.start()
 
-            logger.info(f'全局快捷键监听已启动 ({HOTKEY})')
+            logger.info(f'全局快捷键监听已启动 ({self.hotkey_filter.describe()}，'
+                        f'防抖 {HOTKEY_DEBOUNCE_MS} ms)')
             return True
         except Exception as e:
             logger.error(f'全局快捷键监听启动失败：{str(e)}')
@@ -847,23 +1950,50 @@ class LotteryApp:
             return False
 
     def on_hotkey(self):
-        try:
-            number = get_random_number()
-            data_manager.update_stat(number)
+        # 运行在 pynput 监听线程中，只做入队
+        self.draw_worker.submit('hotkey')
 
-            # 通过信号触发主线程中的窗口显示
-            self.communicator.show_window_signal.emit(number)
+    def show_draw_error(self, message):
+        QMessageBox.warning(None, '警告', message)
 
-            # 语音播放
-            if ENABLE_VOICE:
-                speak_thread = Thread(target=speak_number, args=(number,))
-                speak_thread.daemon = True
-                speak_thread.start()
-        except Exception as e:
-            logger.error(f'快捷键触发失败：{str(e)}')
-            QMessageBox.warning(None, '警告', '抽号失败，请重试！')
+    def rebuild_glyph_cache(self):
+        screen = QApplication.primaryScreen()
+        device_ratio = screen.devicePixelRatio() if screen else 1.0
+        glyph_cache.rebuild(STUDENTS, device_ratio)
+
+    @staticmethod
+    def get_roster_mtime():
+        try:
+            return os.path.getmtime(STUDENTS_FILE)
+        except OSError:
+            return None
+
+    def on_roster_changed(self, path=None):
+        global STUDENTS
+        # 原子替换文件后监视会失效，需要重新添加
+        roster_path = os.path.abspath(STUDENTS_FILE)
+        if os.path.exists(roster_path) and roster_path not in self.roster_watcher.files():
+            self.roster_watcher.addPath(roster_path)
+
+        mtime = self.get_roster_mtime()
+        if mtime == self.roster_mtime:
+            return
+        self.roster_mtime = mtime
+        STUDENTS = load_students()
+        logger.info(f'学生名单已变化，重新加载 {len(STUDENTS)} 名学生并重建位图缓存')
+        self.rebuild_glyph_cache()
+
+    def show_dashboard(self):
+        if self.dashboard is None:
+            self.dashboard = FairnessDashboard()
+        self.dashboard.show()
+        self.dashboard.raise_()
+        self.dashboard.activateWindow()
 
     def show_lottery_window(self, number):
+        if self.dashboard is not None:
+            self.dashboard.mark_dirty()
+
         # 关闭已存在的窗口（如果有）
         if self.current_window is not None:
             self.current_window.close()
@@ -873,16 +2003,31 @@ class LotteryApp:
         self.current_window.show()
 
     def exit_app(self):
-        global tray_icon
         logger.info('用户通过托盘退出程序')
+        self.shutdown()
 
+    def shutdown(self):
+        """保存状态并退出，托盘退出和守护进程请求重启时共用"""
+        global tray_icon
         # 停止 pynput 监听
         if self.hotkey_listener:
             self.hotkey_listener.stop()
+        if self.hotkey_filter:
+            logger.info(f'快捷键事件统计：{self.hotkey_filter.stats_text()}')
+        if self.control_server:
+            self.control_server.stop()
+        self.heartbeat.stop()
+        self.draw_worker.stop()
 
         if tray_icon:
             tray_icon.hide()
 
+        try:
+            unregister_instance('main')
+        except OSError:
+            pass
+        instance_lock.release()
+
         self.app.quit()
         sys.exit(0)
 
@@ -894,6 +2039,9 @@ class LotteryApp:
 def main():
     global data_manager, app
     init_logger()
+    if not STANDBY and not instance_lock.acquire():
+        logger.warning('已有抽号程序在运行，本次启动退出')
+        sys.exit(0)
     data_manager = DataManager()
 
     app = LotteryApp()
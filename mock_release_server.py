@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟更新源
+在本机提供与 Gitee/GitHub 格式相同的发布列表接口和安装包下载，可按源注入延迟、带宽上限和失败，
+用于离线测试 update.py，也供 benchmark_update.py 使用
+
+地址布局（BASE 为 http://127.0.0.1:<端口>）：
+    BASE/gitee/releases、BASE/github/releases                 发布列表（支持 ETag 条件请求）
+    BASE/<gitee|github|mirror>/download/<版本号>/<文件名>      安装包、.sha256 校验文件和 .manifest.json 文件清单（支持 Range）
+把 endpoints() 的结果写入 update_config.json 即可让更新程序使用本地源
+"""
+
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import zipfile
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+SOURCES = ('gitee', 'github', 'mirror')
+SEND_CHUNK_SIZE = 16 * 1024
+
+
+# ==================== 测试用安装包 ====================
+
+def random_bytes(rng, size):
+    """不可压缩的随机内容，接近 exe/dll 的压缩率"""
+    return rng.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+
+
+def make_bundle(file_count=40, total_size=8 * 1024 * 1024, seed=0):
+    """生成模拟的程序目录 {相对路径: 内容}，文件大小随机分布"""
+    rng = random.Random(seed)
+    weights = [rng.random() + 0.05 for _ in range(file_count)]
+    scale = total_size / sum(weights)
+    files = {'课堂抽号程序.exe': random_bytes(rng, int(weights[0] * scale))}
+    for index, weight in enumerate(weights[1:], 1):
+        folder = '_internal/lib' if index % 3 else '_internal'
+        files[f'{folder}/module{index}.pyd'] = random_bytes(rng, int(weight * scale))
+    return files
+
+
+def change_bundle(files, fraction=0.1, seed=1):
+    """按比例修改部分文件，模拟新版本"""
+    rng = random.Random(seed)
+    changed = dict(files)
+    for path in rng.sample(sorted(files), max(1, int(len(files) * fraction))):
+        changed[path] = random_bytes(rng, len(files[path]))
+    return changed
+
+
+def read_bundle(dist_dir):
+    """读取已构建的程序目录"""
+    files = {}
+    for root, _, names in os.walk(dist_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, dist_dir).replace(os.sep, '/')] = f.read()
+    return files
+
+
+def write_bundle(files, target_dir):
+    for path, data in files.items():
+        target = os.path.join(target_dir, *path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+
+def package_assets(files, tag, version_type='pyinstaller', manifest=True):
+    """按 release.yml 的方式打包：安装包、.sha256 校验文件，以及可选的文件清单"""
+    name = f'classroom_lottery_{version_type}_{tag}.zip'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path in sorted(files):
+            archive.writestr(path, files[path])
+    archive_data = buffer.getvalue()
+    assets = {
+        name: archive_data,
+        name + '.sha256': f'{hashlib.sha256(archive_data).hexdigest()}  {name}\n'.encode('utf-8'),
+    }
+    if manifest:
+        assets[name + '.manifest.json'] = json.dumps({'files': {
+            path: {'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+            for path, data in files.items()
+        }}, ensure_ascii=False).encode('utf-8')
+    return assets
+
+
+# ==================== 模拟服务器 ====================
+
+class MockReleaseServer:
+    """
+    本地模拟更新源
+    每个源（gitee、github、mirror）可单独设置：
+        latency    每个请求返回前的延迟（秒）
+        bandwidth  每个连接的带宽上限（KB/s），0 表示不限
+        fail_rate  直接返回 503 的概率
+        drop_rate  下载中途断开连接的概率
+        ranges     是否支持 Range 请求
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.releases = []
+        self.assets = {}
+        self.profiles = {source: {'latency': 0.0, 'bandwidth': 0, 'fail_rate': 0.0,
+                                  'drop_rate': 0.0, 'ranges': True} for source in SOURCES}
+        self.stats = {source: {'requests': 0, 'bytes': 0, 'failures': 0} for source in SOURCES}
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def endpoints(self):
+        """update_config.json 中的更新源配置"""
+        return {
+            'gitee_api_url': f'{self.base_url}/gitee/releases',
+            'github_api_url': f'{self.base_url}/github/releases',
+            'github_download_base': f'{self.base_url}/github',
+            'github_mirror_base': f'{self.base_url}/mirror',
+        }
+
+    def configure(self, source=None, **profile):
+        """修改一个源（source 为 None 时修改全部源）的注入参数"""
+        for name in ([source] if source else SOURCES):
+            unknown = set(profile) - set(self.profiles[name])
+            if unknown:
+                raise KeyError(f'未知的参数: {", ".join(sorted(unknown))}')
+            self.profiles[name].update(profile)
+
+    def add_release(self, tag, assets, prerelease=False, body=''):
+        """发布一个版本，assets 为 {文件名: 内容}；最后发布的版本排在列表最前"""
+        with self.lock:
+            self.assets.update({(tag, name): data for name, data in assets.items()})
+            self.releases.insert(0, {'tag_name': tag, 'name': tag, 'prerelease': prerelease,
+                                     'body': body, 'assets': sorted(assets)})
+
+    def reset_stats(self):
+        with self.lock:
+            for counters in self.stats.values():
+                for key in counters:
+                    counters[key] = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ---------- 请求处理 ----------
+    def release_list(self, source):
+        with self.lock:
+            releases = [dict(release) for release in self.releases]
+        for release in releases:
+            release['assets'] = [{
+                'name': name,
+                'size': len(self.assets[(release['tag_name'], name)]),
+                'browser_download_url': f"{self.base_url}/{source}/download/{release['tag_name']}/{name}",
+            } for name in release['assets']]
+        return json.dumps(releases, ensure_ascii=False).encode('utf-8')
+
+    def _record(self, source, key, amount=1):
+        with self.lock:
+            self.stats[source][key] += amount
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = urlparse(self.path).path.strip('/').split('/')
+                source = parts[0] if parts and parts[0] in SOURCES else None
+                if source is None:
+                    return self.send_error(404)
+                profile = dict(server.profiles[source])
+                server._record(source, 'requests')
+                if profile['latency']:
+                    time.sleep(profile['latency'])
+                if server.random.random() < profile['fail_rate']:
+                    server._record(source, 'failures')
+                    return self.send_error(503)
+
+                if parts[1:] == ['releases'] and source != 'mirror':
+                    return self.send_releases(source)
+                if len(parts) == 4 and parts[1] == 'download':
+                    data = server.assets.get((parts[2], parts[3]))
+                    if data is not None:
+                        return self.send_data(source, data, profile)
+                self.send_error(404)
+
+            def send_releases(self, source):
+                body = server.release_list(source)
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_data(self, source, data, profile):
+                start, end = 0, len(data) - 1
+                match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+                if match and profile['ranges']:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                    if start > end:
+                        return self.send_error(416)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+                else:
+                    self.send_response(200)
+                if profile['ranges']:
+                    self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+
+                drop_at = None
+                if server.random.random() < profile['drop_rate']:
+                    drop_at = server.random.randint(start, end)
+                bandwidth = profile['bandwidth'] * 1024
+                began = time.monotonic()
+                position = start
+                try:
+                    while position <= end:
+                        chunk_end = min(position + SEND_CHUNK_SIZE, end + 1)
+                        if drop_at is not None and chunk_end > drop_at:
+                            self.wfile.write(data[position:drop_at])
+                            server._record(source, 'bytes', drop_at - position)
+                            server._record(source, 'failures')
+                            self.close_connection = True
+                            return
+                        self.wfile.write(data[position:chunk_end])
+                        server._record(source, 'bytes', chunk_end - position)
+                        position = chunk_end
+                        if bandwidth:
+                            ahead = (position - start) / bandwidth - (time.monotonic() - began)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟更新源，用于离线测试更新程序")
+    parser.add_argument('--port', type=int, default=8000, help="监听端口，默认 8000")
+    parser.add_argument('--dist', help="要发布的程序目录；未指定时生成模拟的程序文件")
+    parser.add_argument('--tag', default='v99.0', help="发布的版本号，默认 v99.0")
+    parser.add_argument('--version-type', choices=['pyinstaller', 'nuitka'], default='pyinstaller')
+    parser.add_argument('--no-manifest', action='store_true', help="不发布文件清单（禁用增量更新）")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的延迟(秒)")
+    parser.add_argument('--bandwidth', type=int, default=0, help="每个连接的带宽上限(KB/s)，0 表示不限")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="请求直接失败(503)的概率")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="下载中途断开连接的概率")
+    parser.add_argument('--no-range', action='store_true', help="不支持 Range 请求")
+    args = parser.parse_args()
+
+    files = read_bundle(args.dist) if args.dist else make_bundle()
+    server = MockReleaseServer(port=args.port)
+    server.configure(latency=args.latency, bandwidth=args.bandwidth, fail_rate=args.fail_rate,
+                     drop_rate=args.drop_rate, ranges=not args.no_range)
+    server.add_release(args.tag, package_assets(files, args.tag, args.version_type, not args.no_manifest),
+                       body='本地模拟发布')
+    server.start()
+    print(f"模拟更新源已启动: {server.base_url}，发布 {args.tag}（{len(files)} 个文件）")
+    print("将以下内容写入 update_config.json 即可使用本地源：")
+    print(json.dumps(server.endpoints(), ensure_ascii=False, indent=2))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+多班级名单存储
+classes/index.json 记录所有班级的名称、号码范围、抽样器参数以及当前班级；
+每个班级的名单和抽号状态放在 classes/<班级ID>/ 目录下。
+列出班级只需读取索引，加载某个班级只读取该班级的文件，切换班级只修改索引中的 active 指针
+"""
+
+import os
+import json
+import time
+import uuid
+
+ROSTER_DIR = 'classes'
+INDEX_NAME = 'index.json'
+LEGACY_STUDENTS_FILE = 'students.json'
+# 允许按班级覆盖的 OptimizedClassroomSampler 参数
+SAMPLER_PARAM_KEYS = ('base_weight', 'increment', 'penalty_factor', 'boost_factor',
+                      'window_size', 'penalty_rounds')
+# 以轮数计的参数必须是整数
+SAMPLER_INT_PARAMS = ('window_size', 'penalty_rounds')
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class RosterStore:
+    """班级名单存储"""
+    def __init__(self, root=ROSTER_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_NAME)
+
+    @property
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def load_index(self):
+        """读取索引，不存在或损坏时返回空索引"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        if not isinstance(index, dict):
+            index = {}
+        index.setdefault('active', None)
+        index.setdefault('classes', {})
+        return index
+
+    def save_index(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        _write_json_atomic(self.index_path, index)
+
+    # ---------- 查询 ----------
+    def list_classes(self):
+        """返回 [(班级ID, 索引条目), ...]，按名称排序"""
+        classes = self.load_index()['classes']
+        return sorted(classes.items(), key=lambda item: item[1].get('name', ''))
+
+    def get(self, class_id):
+        return self.load_index()['classes'].get(class_id)
+
+    def active_class(self):
+        """返回当前班级 (班级ID, 索引条目)，未设置时返回 (None, None)"""
+        index = self.load_index()
+        class_id = index['active']
+        entry = index['classes'].get(class_id)
+        if entry is None:
+            return None, None
+        return class_id, entry
+
+    # ---------- 班级文件路径 ----------
+    def class_dir(self, class_id):
+        return os.path.join(self.root, class_id)
+
+    def roster_path(self, class_id):
+        return os.path.join(self.class_dir(class_id), 'students.json')
+
+    def data_path(self, class_id):
+        return os.path.join(self.class_dir(class_id), 'lottery_data.pkl')
+
+    def sampler_state_path(self, class_id):
+        return os.path.join(self.class_dir(class_id), 'optimized_sampler_state.pkl')
+
+    def load_roster(self, class_id):
+        """读取一个班级的名单 {学号: 姓名}"""
+        with open(self.roster_path(class_id), 'r', encoding='utf-8') as f:
+            return {int(k): v for k, v in json.load(f).items()}
+
+    # ---------- 修改 ----------
+    def new_class_id(self):
+        os.makedirs(self.root, exist_ok=True)
+        while True:
+            class_id = uuid.uuid4().hex[:8]
+            if not os.path.exists(self.class_dir(class_id)):
+                os.makedirs(self.class_dir(class_id))
+                return class_id
+
+    def register_class(self, class_id, name, count, min_number, max_number, sampler=None, activate=True):
+        """在索引中登记班级（名单文件应已写入 roster_path）"""
+        index = self.load_index()
+        entry = index['classes'].get(class_id, {})
+        entry.update({
+            'name': name,
+            'count': count,
+            'min_number': min_number,
+            'max_number': max_number,
+            'updated_at': time.time(),
+        })
+        if sampler is not None:
+            entry['sampler'] = {k: v for k, v in sampler.items() if k in SAMPLER_PARAM_KEYS}
+        index['classes'][class_id] = entry
+        if activate or index['active'] is None:
+            index['active'] = class_id
+        self.save_index(index)
+        return entry
+
+    def save_class(self, name, students, class_id=None, min_number=None, max_number=None, **kwargs):
+        """写入名单并登记班级，号码范围缺省时取名单中的最小、最大学号，返回班级ID"""
+        if class_id is None:
+            class_id = self.new_class_id()
+        os.makedirs(self.class_dir(class_id), exist_ok=True)
+        _write_json_atomic(self.roster_path(class_id), {str(k): v for k, v in students.items()})
+        numbers = [int(number) for number in students]
+        self.register_class(class_id, name, len(numbers),
+                            min_number if min_number is not None else min(numbers, default=1),
+                            max_number if max_number is not None else max(numbers, default=1),
+                            **kwargs)
+        return class_id
+
+    def find_by_name(self, name):
+        """按名称查找班级ID，不存在时返回 None"""
+        for class_id, entry in self.load_index()['classes'].items():
+            if entry.get('name') == name:
+                return class_id
+        return None
+
+    def set_active(self, class_id):
+        index = self.load_index()
+        if class_id not in index['classes']:
+            raise KeyError(class_id)
+        index['active'] = class_id
+        self.save_index(index)
+
+    def update_range(self, class_id, min_number, max_number):
+        index = self.load_index()
+        entry = index['classes'].get(class_id)
+        if entry is None:
+            raise KeyError(class_id)
+        entry['min_number'] = min_number
+        entry['max_number'] = max_number
+        self.save_index(index)
+
+    def set_sampler_params(self, class_id, params):
+        """
+        设置班级的抽样器参数覆盖值，params 中未给出的参数使用默认值，传入空字典即恢复全部默认值
+        参数名未知或取值无效时抛出 ValueError
+        """
+        sampler = {}
+        for key, value in params.items():
+            if key not in SAMPLER_PARAM_KEYS:
+                raise ValueError(f'未知的抽样器参数: {key}')
+            value = int(value) if key in SAMPLER_INT_PARAMS else float(value)
+            if not value >= 0:
+                raise ValueError(f'抽样器参数 {key} 必须是非负数')
+            sampler[key] = value
+        index = self.load_index()
+        entry = index['classes'].get(class_id)
+        if entry is None:
+            raise KeyError(class_id)
+        if sampler:
+            entry['sampler'] = sampler
+        else:
+            entry.pop('sampler', None)
+        self.save_index(index)
+        return sampler
+
+    def delete_class(self, class_id):
+        """从索引中移除班级并删除其文件，删除当前班级时切换到剩余的第一个班级"""
+        index = self.load_index()
+        if index['classes'].pop(class_id, None) is not None:
+            if index['active'] == class_id:
+                index['active'] = next(iter(sorted(index['classes'])), None)
+            self.save_index(index)
+        class_dir = self.class_dir(class_id)
+        for name in os.listdir(class_dir) if os.path.isdir(class_dir) else []:
+            os.remove(os.path.join(class_dir, name))
+        if os.path.isdir(class_dir):
+            os.rmdir(class_dir)
+
+    def migrate_legacy(self, name, min_number=None, max_number=None):
+        """
+        首次使用时把旧版单一的 students.json 导入为一个班级，并沿用已有的抽号状态
+        已存在索引或没有旧名单时不做任何事，返回新班级ID或 None
+        """
+        if self.exists or not os.path.exists(LEGACY_STUDENTS_FILE):
+            return None
+        with open(LEGACY_STUDENTS_FILE, 'r', encoding='utf-8') as f:
+            students = {int(k): v for k, v in json.load(f).items()}
+        class_id = self.save_class(name, students, min_number=min_number, max_number=max_number)
+        for legacy, target in (('lottery_data.pkl', self.data_path(class_id)),
+                               ('optimized_sampler_state.pkl', self.sampler_state_path(class_id))):
+            if os.path.exists(legacy):
+                with open(legacy, 'rb') as src, open(target, 'wb') as dst:
+                    dst.write(src.read())
+        return class_id
@@ -0,0 +1,139 @@
+"""
+单实例锁与实例登记表
+主程序和守护进程各自持有一个系统级文件锁，进程退出（包括崩溃、被强制结束）时锁由系统自动释放；
+同时把 PID 和控制端点写入登记表，启动器据此直接判断、关闭运行中的实例，无需遍历系统进程
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+REGISTRY_FILE = 'instances.json'
+
+
+class InstanceLock:
+    """基于文件锁的单实例锁"""
+    def __init__(self, name):
+        self.name = name
+        self.path = f'{name}.lock'
+        self.file = None
+
+    @property
+    def held(self):
+        return self.file is not None
+
+    def acquire(self):
+        """尝试获取锁，已被其他进程持有时立即返回 False"""
+        if self.file is not None:
+            return True
+        f = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self.file = f
+        return True
+
+    def release(self):
+        if self.file is None:
+            return
+        try:
+            if os.name == 'nt':
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        self.file.close()
+        self.file = None
+
+
+def is_running(name):
+    """检查是否有进程持有指定名称的单实例锁"""
+    lock = InstanceLock(name)
+    if lock.acquire():
+        lock.release()
+        return False
+    return True
+
+
+def wait_until_stopped(name, timeout, interval=0.1):
+    """等待锁被释放，超时返回 False"""
+    deadline = time.monotonic() + timeout
+    while is_running(name):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def read_registry(path=REGISTRY_FILE):
+    """读取登记表，文件不存在或损坏时返回空字典"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return registry if isinstance(registry, dict) else {}
+
+
+@contextmanager
+def _registry_locked(path=REGISTRY_FILE):
+    """持有登记表旁的锁文件，串行化各进程对登记表的读-改-写"""
+    f = open(f'{path}.lock', 'a+')
+    try:
+        if os.name == 'nt':
+            # LK_LOCK 最多重试约 10 秒，仍失败时抛出 OSError
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    finally:
+        f.close()
+
+
+def _write_registry(registry, path=REGISTRY_FILE):
+    # 先写临时文件再替换，读取方不会看到写了一半的内容
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def register(name, info, path=REGISTRY_FILE):
+    """登记本进程的信息，调用方应已持有对应的单实例锁"""
+    with _registry_locked(path):
+        registry = read_registry(path)
+        registry[name] = dict(info, pid=os.getpid(), started_at=time.time())
+        _write_registry(registry, path)
+
+
+def unregister(name, path=REGISTRY_FILE):
+    """移除本进程的登记，只删除自己写入的记录"""
+    with _registry_locked(path):
+        registry = read_registry(path)
+        entry = registry.get(name)
+        if entry is None or entry.get('pid') != os.getpid():
+            return
+        del registry[name]
+        _write_registry(registry, path)
@@ -7,18 +7,30 @@
 
 import sys
 import os
+import json
+import random
 import pickle
+import argparse
+import tempfile
+import numpy as np
 import scipy.stats as stats
 
 # 添加主程序目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入必要的函数和类
+# main 在导入时会解析命令行参数，导入前先去掉本脚本的参数
+_script_argv = sys.argv
+sys.argv = sys.argv[:1]
 import main
 from main import DataManager, init_logger, OptimizedClassroomSampler
+sys.argv = _script_argv
 import threading
 import time
 
+SAMPLERS = ('optimized', 'legacy')
+SAMPLER_NAMES = {'optimized': '优化算法', 'legacy': '传统算法'}
+
 def run_single_test(data_manager):
     """执行一次抽号测试"""
     # 设置全局data_manager变量
@@ -138,13 +150,14 @@ def run_legacy_fairness_test(iterations=10000):
     
     return results
 
-def chi_square_test(results, iterations):
+def chi_square_test(results, iterations, total_numbers=None):
     """
     执行卡方检验以评估公平性
     
     Args:
         results (dict): 测试结果字典
         iterations (int): 总测试次数
+        total_numbers (int): 号码总数，默认取结果中的最大号码
         
     Returns:
         tuple: (chi2_statistic, p_value)
@@ -154,7 +167,8 @@ def chi_square_test(results, iterations):
     expected_freq = []
     
     # 获取最大号码数
-    total_numbers = max(results.keys()) if results else 48  # 默认48个号码
+    if total_numbers is None:
+        total_numbers = max(results.keys()) if results else 48  # 默认48个号码
     expected_count = iterations / total_numbers  # 每个号码的期望出现次数
     
     for i in range(1, total_numbers + 1):
@@ -371,6 +385,203 @@ def run_main():
         save_results_to_file(results, "optimized_fairness_test_results.txt", "优化算法")
         return results
 
+def prepare_legacy_sampler(n_students, mode):
+    """让 main.get_random_number 使用 1~n_students 的号码范围和指定的抽取模式，并重置抽号状态"""
+    main.MIN_NUMBER = 1
+    main.MAX_NUMBER = n_students
+    main.STUDENT_MODE = mode
+    main.data_manager = DataManager()
+    main.reset_draw_state()
+
+
+def run_replica(sampler_name, iterations, n_students, mode=0, seed=None, persist=True):
+    """
+    运行一组抽号并逐次计时
+    
+    Args:
+        sampler_name (str): optimized 直接测试 OptimizedClassroomSampler；legacy 测试主程序的 get_random_number
+        iterations (int): 抽号次数
+        n_students (int): 学生总数
+        mode (int): 抽取模式（仅 legacy）：0=全随机, 1=正序, 2=倒序
+        seed (int): 随机种子，None 表示不固定
+        persist (bool): 是否像主程序一样每次抽号后保存抽样器状态
+        
+    Returns:
+        tuple: (号码数组, 每次抽号耗时数组(秒), 总耗时(秒))
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    if sampler_name == 'optimized':
+        sampler = OptimizedClassroomSampler(n_students=n_students)
+        if not persist:
+            sampler.save_state = lambda filepath=None: None
+        # 预热抽样器，让权重分布进入稳定状态
+        for _ in range(n_students):
+            sampler.select()
+        draw = lambda: sampler.select() + 1
+    else:
+        prepare_legacy_sampler(n_students, mode)
+        if not persist:
+            main.optimized_sampler.save_state = lambda filepath=None: None
+        draw = main.get_random_number
+
+    numbers = np.empty(iterations, dtype=np.int64)
+    latencies = np.empty(iterations)
+    clock = time.perf_counter
+    start_time = clock()
+    for i in range(iterations):
+        draw_start = clock()
+        numbers[i] = draw()
+        latencies[i] = clock() - draw_start
+    return numbers, latencies, clock() - start_time
+
+
+def performance_summary(latencies, elapsed):
+    """抽号速度和单次耗时分位数"""
+    latencies_ms = latencies * 1000
+    return {
+        'draws_per_second': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            'mean': round(float(latencies_ms.mean()), 4),
+            'p50': round(float(np.percentile(latencies_ms, 50)), 4),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 4),
+            'max': round(float(latencies_ms.max()), 4),
+        },
+    }
+
+
+def fairness_summary(results, iterations, n_students):
+    """卡方检验和出现次数的偏差"""
+    chi2_stat, p_value = chi_square_test(results, iterations, n_students)
+    counts = [results.get(number, 0) for number in range(1, n_students + 1)]
+    expected_count = iterations / n_students
+    max_deviation = max(abs(count - expected_count) for count in counts)
+    return {
+        'chi2': round(float(chi2_stat), 4),
+        'p_value': float(p_value),
+        'fair': bool(p_value > 0.05),
+        'distinct_numbers': sum(1 for count in counts if count),
+        'min_count': min(counts),
+        'max_count': max(counts),
+        'max_deviation_percent': round(max_deviation / expected_count * 100, 2),
+    }
+
+
+def run_cli_test(sampler_name, args):
+    """按命令行参数运行若干组测试，汇总所有组的结果"""
+    all_numbers = []
+    all_latencies = []
+    total_elapsed = 0.0
+    replicas = []
+    for replica in range(args.replicas):
+        seed = None if args.seed is None else args.seed + replica
+        numbers, latencies, elapsed = run_replica(sampler_name, args.iterations, args.students,
+                                                  args.mode, seed, not args.no_persist)
+        results = {int(number): int(count) for number, count in zip(*np.unique(numbers, return_counts=True))}
+        replica_result = {'seed': seed, 'elapsed_seconds': round(elapsed, 4)}
+        replica_result.update(performance_summary(latencies, elapsed))
+        replica_result['fairness'] = fairness_summary(results, args.iterations, args.students)
+        replicas.append(replica_result)
+        all_numbers.append(numbers)
+        all_latencies.append(latencies)
+        total_elapsed += elapsed
+
+    numbers = np.concatenate(all_numbers)
+    results = {int(number): int(count) for number, count in zip(*np.unique(numbers, return_counts=True))}
+    summary = {
+        'sampler': sampler_name,
+        'mode': args.mode if sampler_name == 'legacy' else None,
+        'draws': len(numbers),
+        'elapsed_seconds': round(total_elapsed, 4),
+    }
+    summary.update(performance_summary(np.concatenate(all_latencies), total_elapsed))
+    summary['fairness'] = fairness_summary(results, len(numbers), args.students)
+    summary['counts'] = {str(number): results.get(number, 0) for number in range(1, args.students + 1)}
+    summary['replicas'] = replicas
+    return summary, results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="课堂抽号程序公平性与性能测试")
+    parser.add_argument('--sampler', choices=SAMPLERS + ('both',), default='optimized',
+                        help="optimized=优化抽样器，legacy=主程序抽号流程，both=两者对比；默认 optimized")
+    parser.add_argument('--mode', type=int, choices=(0, 1, 2), default=0,
+                        help="legacy 的抽取模式：0=全随机, 1=正序, 2=倒序；默认 0")
+    parser.add_argument('-n', '--iterations', type=int, default=10000, help="每组的抽号次数，默认 10000")
+    parser.add_argument('-s', '--students', type=int, default=48, help="学生总数，默认 48")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子，第 i 组使用 seed+i；默认不固定")
+    parser.add_argument('-r', '--replicas', type=int, default=1, help="重复的组数，默认 1")
+    parser.add_argument('--no-persist', action='store_true',
+                        help="不在每次抽号后保存抽样器状态（只测算法本身的耗时）")
+    parser.add_argument('--format', choices=('text', 'json'), default='text', help="输出格式，默认 text")
+    parser.add_argument('-o', '--output', help="输出到文件而不是标准输出")
+    parser.add_argument('--interactive', action='store_true', help="使用交互式菜单")
+    args = parser.parse_args(argv)
+    if args.iterations <= 0 or args.students <= 0 or args.replicas <= 0:
+        parser.error("测试次数、学生总数和组数必须大于0")
+    return args
+
+
+def format_text_report(summaries):
+    lines = []
+    for summary in summaries:
+        name = SAMPLER_NAMES[summary['sampler']]
+        fairness = summary['fairness']
+        latency = summary['latency_ms']
+        lines.append(f"==================== {name} ====================")
+        if summary['mode'] is not None:
+            lines.append(f"抽取模式: {summary['mode']}")
+        lines.append(f"抽号次数: {summary['draws']} （{len(summary['replicas'])} 组）")
+        lines.append(f"抽号速度: {summary['draws_per_second']} 次/秒")
+        lines.append(f"单次耗时: 平均 {latency['mean']:.4f} ms, p50 {latency['p50']:.4f} ms, "
+                     f"p99 {latency['p99']:.4f} ms, 最大 {latency['max']:.4f} ms")
+        lines.append(f"出现次数: 最少 {fairness['min_count']}, 最多 {fairness['max_count']}, "
+                     f"最大偏差 {fairness['max_deviation_percent']:.2f}%")
+        lines.append(f"卡方统计量: {fairness['chi2']:.4f}, P值: {fairness['p_value']:.4f}, "
+                     f"{'与均匀分布无显著差异' if fairness['fair'] else '与均匀分布存在显著差异'}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run_cli(args):
+    """非交互运行：测试期间的状态文件写入临时目录，不影响实际的抽号数据"""
+    samplers = SAMPLERS if args.sampler == 'both' else (args.sampler,)
+    with tempfile.TemporaryDirectory(prefix='fairness_') as temp_dir:
+        main.SAMPLER_STATE_FILE = os.path.join(temp_dir, 'optimized_sampler_state.pkl')
+        main.DATA_FILE = os.path.join(temp_dir, 'lottery_data.pkl')
+        if 'legacy' in samplers:
+            # DataManager 需要 logger
+            init_logger()
+        summaries = [run_cli_test(sampler_name, args)[0] for sampler_name in samplers]
+
+    if args.format == 'json':
+        report = json.dumps({
+            'config': {
+                'iterations': args.iterations,
+                'students': args.students,
+                'replicas': args.replicas,
+                'seed': args.seed,
+                'persist': not args.no_persist,
+            },
+            'results': summaries,
+        }, ensure_ascii=False, indent=2)
+    else:
+        report = format_text_report(summaries)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    return summaries
+
+
 if __name__ == "__main__":
-    # 运行测试并返回结果字典
-    test_results = run_main()
\ No newline at end of file
+    cli_args = parse_args()
+    if cli_args.interactive:
+        # 运行测试并返回结果字典
+        test_results = run_main()
+    else:
+        test_results = run_cli(cli_args)
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+测试公共设置：把程序目录加入导入路径，Qt 使用无界面平台，
+提供一个本地替身 HTTP 服务器代替 Gitee、GitHub 和镜像站，以及导入主程序模块的 fixture
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StandInServer:
+    """
+    本地替身 HTTP 服务器，按路径返回预设内容
+    每个路径可设置：
+        latency     返回前的延迟（秒）
+        fail_times  前几次请求直接返回 503
+        drop_after  前几次请求只发送这么多字节就断开（与 drop_times 配合）
+        drop_times  断开的次数
+        ranges      是否支持 Range 请求
+        bandwidth   发送速度上限（KB/s），0 表示不限
+        etag        是否返回 ETag 并支持 If-None-Match
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = {}
+        self.bytes_sent = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, path):
+        return self.base_url + path
+
+    def add(self, path, body, content_type='application/octet-stream', **options):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        route = {'body': body, 'content_type': content_type, 'latency': 0.0, 'fail_times': 0,
+                 'drop_after': None, 'drop_times': 0, 'ranges': True, 'bandwidth': 0, 'etag': False}
+        unknown = set(options) - set(route)
+        if unknown:
+            raise KeyError(f'未知的参数: {", ".join(sorted(unknown))}')
+        route.update(options)
+        with self.lock:
+            self.routes[path] = route
+            self.requests[path] = 0
+            self.bytes_sent[path] = 0
+        return self.url(path)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                with server.lock:
+                    route = server.routes.get(path)
+                    if route is not None:
+                        server.requests[path] += 1
+                        failing = route['fail_times'] > 0
+                        dropping = route['drop_times'] > 0 and not failing
+                        if failing:
+                            route['fail_times'] -= 1
+                        elif dropping:
+                            route['drop_times'] -= 1
+                if route is None:
+                    return self.send_error(404)
+                if route['latency']:
+                    time.sleep(route['latency'])
+                if failing:
+                    return self.send_error(503)
+
+                body = route['body']
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if route['etag'] and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                start, end = 0, len(body) - 1
+                range_header = self.headers.get('Range', '')
+                if route['ranges'] and range_header.startswith('bytes='):
+                    first, _, last = range_header[6:].partition('-')
+                    start = int(first)
+                    end = min(int(last), end) if last else end
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+                else:
+                    self.send_response(200)
+                if route['ranges']:
+                    self.send_header('Accept-Ranges', 'bytes')
+                if route['etag']:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', route['content_type'])
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+
+                data = body[start:end + 1]
+                if dropping and route['drop_after'] is not None:
+                    data = data[:route['drop_after']]
+                    self.close_connection = True
+                chunk_size = route['bandwidth'] * 1024 // 10 or len(data) or 1
+                try:
+                    for offset in range(0, len(data), chunk_size):
+                        self.wfile.write(data[offset:offset + chunk_size])
+                        with server.lock:
+                            server.bytes_sent[path] += len(data[offset:offset + chunk_size])
+                        if route['bandwidth']:
+                            time.sleep(0.1)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    server = StandInServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope='session')
+def main_module(tmp_path_factory):
+    """
+    导入主程序模块。main 在导入时读取配置并在当前目录保存抽样器状态，因此在临时目录中导入；
+    缺少图形、音频或键盘监听环境而无法导入时跳过
+    """
+    previous_dir, previous_argv = os.getcwd(), sys.argv
+    os.chdir(str(tmp_path_factory.mktemp('main')))
+    # main 在导入时会解析命令行参数
+    sys.argv = sys.argv[:1]
+    try:
+        import main
+    except Exception as e:
+        pytest.skip(f'无法导入 main: {e}')
+    finally:
+        sys.argv = previous_argv
+        os.chdir(previous_dir)
+    return main
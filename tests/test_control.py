@@ -0,0 +1,52 @@
+"""
+本地控制接口的鉴权测试
+"""
+
+import json
+import http.client
+
+import pytest
+
+
+@pytest.fixture
+def control(main_module):
+    server = main_module.ControlServer(draw_worker=None, port=0, token='secret-token')
+    assert server.start()
+    yield server
+    server.stop()
+
+
+def get_stats(control, headers):
+    host, port = control.httpd.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.request('GET', '/stats', headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+    finally:
+        connection.close()
+
+
+def test_missing_token_rejected(control):
+    status, body = get_stats(control, {})
+
+    assert status == 403
+    assert body['error'] == 'forbidden'
+
+
+def test_wrong_token_rejected(control):
+    assert get_stats(control, {'X-Control-Token': 'secret-tokem'})[0] == 403
+
+
+def test_non_ascii_token_rejected(control):
+    # 请求头按 latin-1 解码，非 ASCII 的令牌也必须得到 403 而不是让处理线程出错断开连接
+    status, body = get_stats(control, {'X-Control-Token': 'sécret-token'.encode('utf-8')})
+
+    assert status == 403
+    assert body['error'] == 'forbidden'
+
+
+def test_cross_origin_request_rejected(control):
+    headers = {'X-Control-Token': 'secret-token', 'Origin': 'http://example.com'}
+
+    assert get_stats(control, headers)[0] == 403
@@ -0,0 +1,56 @@
+"""
+启动器后台导入学生名单的测试
+"""
+
+import json
+
+import pytest
+
+import launcher
+from launcher import RosterImporter
+
+
+@pytest.fixture
+def roster_csv(tmp_path):
+    path = tmp_path / 'roster.csv'
+    path.write_text('学号,姓名\n1,张三\n2,李四\nx,王五\n2,赵六\n', encoding='utf-8')
+    return str(path)
+
+
+def run_importer(importer):
+    """在当前线程中执行导入，返回发出的信号"""
+    emitted = []
+    importer.finished.connect(lambda result: emitted.append(('finished', result)))
+    importer.failed.connect(lambda message: emitted.append(('failed', message)))
+    importer.aborted.connect(lambda: emitted.append(('aborted', None)))
+    importer._run()
+    return emitted
+
+
+def test_import_writes_roster_and_reports_errors(roster_csv, tmp_path):
+    output = tmp_path / 'students.json'
+
+    emitted = run_importer(RosterImporter(roster_csv, str(output)))
+
+    assert [name for name, _ in emitted] == ['finished']
+    result = emitted[0][1]
+    assert (result['students'], result['min_number'], result['max_number']) == (2, 1, 2)
+    assert len(result['errors']) == 1 and len(result['duplicates']) == 1
+    assert json.loads(output.read_text(encoding='utf-8')) == {'1': '张三', '2': '李四'}
+
+
+def test_cancel_after_last_row_keeps_existing_roster(roster_csv, tmp_path, monkeypatch):
+    output = tmp_path / 'students.json'
+    output.write_text('{"1": "原有名单"}', encoding='utf-8')
+    importer = RosterImporter(roster_csv, str(output))
+    read_rows = launcher.iter_csv_rows
+
+    def rows_then_cancel(path):
+        yield from read_rows(path)
+        # 取消在读完最后一行、写入名单之前到达
+        importer.cancel()
+
+    monkeypatch.setattr(launcher, 'iter_csv_rows', rows_then_cancel)
+
+    assert run_importer(importer) == [('aborted', None)]
+    assert output.read_text(encoding='utf-8') == '{"1": "原有名单"}'
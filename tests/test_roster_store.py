@@ -0,0 +1,40 @@
+"""
+多班级名单存储的测试
+"""
+
+import pytest
+
+from roster_store import RosterStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RosterStore(str(tmp_path / 'classes'))
+
+
+def test_sampler_params_saved_and_kept_on_reimport(store):
+    class_id = store.save_class('一班', {1: '张三', 2: '李四'})
+
+    store.set_sampler_params(class_id, {'penalty_rounds': '5', 'boost_factor': '1.6'})
+    store.save_class('一班', {1: '张三', 2: '李四', 3: '王五'}, class_id=class_id)
+
+    assert store.get(class_id)['sampler'] == {'penalty_rounds': 5, 'boost_factor': 1.6}
+    assert store.get(class_id)['count'] == 3
+
+
+def test_empty_sampler_params_restore_defaults(store):
+    class_id = store.save_class('一班', {1: '张三'}, sampler={'window_size': 10})
+
+    store.set_sampler_params(class_id, {})
+
+    assert 'sampler' not in store.get(class_id)
+
+
+@pytest.mark.parametrize('params', [{'unknown': 1}, {'penalty_rounds': '1.5'}, {'increment': '-1'},
+                                    {'base_weight': 'nan'}])
+def test_invalid_sampler_params_rejected(store, params):
+    class_id = store.save_class('一班', {1: '张三'}, sampler={'window_size': 10})
+
+    with pytest.raises(ValueError):
+        store.set_sampler_params(class_id, params)
+    assert store.get(class_id)['sampler'] == {'window_size': 10}
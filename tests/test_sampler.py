@@ -0,0 +1,56 @@
+"""
+抽样器与分组抽号测试
+"""
+
+import numpy as np
+import pytest
+
+
+class StatRecorder:
+    """代替 DataManager，只记录 update_stat 的调用"""
+    def __init__(self):
+        self.numbers = []
+        self.degraded = False
+
+    def update_stat(self, number):
+        self.numbers.append(number)
+
+
+@pytest.fixture
+def sampler(main_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(main_module, 'SAMPLER_STATE_FILE', str(tmp_path / 'sampler_state.pkl'))
+    sampler = main_module.OptimizedClassroomSampler(
+        n_students=main_module.MAX_NUMBER - main_module.MIN_NUMBER + 1)
+    monkeypatch.setattr(main_module, 'optimized_sampler', sampler)
+    return sampler
+
+
+def test_select_never_returns_excluded(sampler):
+    np.random.seed(0)
+    exclude = list(range(sampler.n - 1))
+
+    for _ in range(20):
+        assert sampler.select(exclude=exclude) == sampler.n - 1
+
+
+def test_select_excluding_all_positive_weights_falls_back_to_uniform(sampler):
+    sampler.weights[:] = 0
+    sampler.weights[0] = 1
+
+    assert sampler.select(exclude=[0]) != 0
+
+
+def test_group_draw_records_each_number_once(main_module, sampler, monkeypatch):
+    np.random.seed(1)
+    monkeypatch.setattr(main_module, 'STUDENT_MODE', 0)
+    stats = StatRecorder()
+    monkeypatch.setattr(main_module, 'data_manager', stats)
+    total = main_module.MAX_NUMBER - main_module.MIN_NUMBER + 1
+
+    numbers = main_module.DrawWorker(communicator=None).draw_group(total)
+
+    assert sorted(numbers) == list(range(main_module.MIN_NUMBER, main_module.MAX_NUMBER + 1))
+    assert stats.numbers == numbers
+    # 抽样器状态只随实际抽中的号码推进，没有被丢弃的重复抽取
+    assert sampler.current_round == total
+    assert sampler.selection_counts.tolist() == [1] * total
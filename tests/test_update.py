@@ -0,0 +1,542 @@
+"""
+更新程序的查询、下载、校验与安装测试
+使用本地替身 HTTP 服务器代替 Gitee、GitHub 和镜像站，不访问外网
+"""
+
+import os
+import json
+import time
+import types
+import random
+import hashlib
+import zipfile
+
+import pytest
+
+import update
+import versions
+from update import UpdateChecker, AtomicInstaller, VersionType
+
+TAG = 'v99.0'
+
+
+@pytest.fixture
+def logs():
+    return []
+
+
+@pytest.fixture
+def make_checker(tmp_path, monkeypatch, stand_in, logs):
+    """在临时目录中创建使用替身服务器的 UpdateChecker"""
+    monkeypatch.chdir(tmp_path)
+
+    def factory(**kwargs):
+        kwargs.setdefault('cache_ttl', 0)
+        checker = UpdateChecker(log_callback=logs.append, progress_callback=None, **kwargs)
+        checker.gitee_api_url = stand_in.url('/gitee/releases')
+        checker.github_api_url = stand_in.url('/github/releases')
+        return checker
+    return factory
+
+
+def release_list(tag=TAG, assets=()):
+    return [{'tag_name': tag, 'name': tag, 'prerelease': False, 'body': '', 'assets': list(assets)}]
+
+
+def publish(stand_in, data, name='package.zip', checksum=None):
+    """发布一个文件及其 .sha256 校验文件，返回发布信息"""
+    checksum = checksum or hashlib.sha256(data).hexdigest()
+    assets = [
+        {'name': name, 'browser_download_url': stand_in.add('/' + name, data)},
+        {'name': name + '.sha256',
+         'browser_download_url': stand_in.add('/' + name + '.sha256', f'{checksum}  {name}\n'.encode('utf-8'))},
+    ]
+    return release_list(assets=assets)[0]
+
+
+# ==================== 发布信息 ====================
+
+def test_source_race_returns_without_waiting_for_slow_source(stand_in, make_checker):
+    stand_in.add('/gitee/releases', release_list(), latency=1.5)
+    stand_in.add('/github/releases', release_list())
+    checker = make_checker()
+
+    start = time.monotonic()
+    gitee, github = checker.get_all_releases(grace=0.2)
+
+    assert time.monotonic() - start < 1
+    assert gitee is None
+    assert github[0]['tag_name'] == TAG
+    # 等落后的查询在后台写完缓存，避免写到切换回来的工作目录中
+    deadline = time.monotonic() + 5
+    while len(checker.release_cache) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_source_race_collects_both_sources(stand_in, make_checker):
+    stand_in.add('/gitee/releases', release_list(), latency=0.2)
+    stand_in.add('/github/releases', release_list())
+    checker = make_checker()
+
+    gitee, github = checker.get_all_releases()
+
+    assert gitee[0]['tag_name'] == github[0]['tag_name'] == TAG
+
+
+def test_source_race_keeps_waiting_while_no_source_has_answered(stand_in, make_checker):
+    stand_in.add('/gitee/releases', release_list(), latency=0.5)
+    stand_in.add('/github/releases', b'', fail_times=10)
+    checker = make_checker()
+
+    gitee, github = checker.get_all_releases(grace=0.1)
+
+    assert gitee[0]['tag_name'] == TAG
+    assert github is None
+
+
+def test_session_retries_server_errors(stand_in, make_checker):
+    stand_in.add('/github/releases', release_list(), fail_times=2)
+    checker = make_checker()
+
+    assert checker.get_github_releases()[0]['tag_name'] == TAG
+    assert stand_in.requests['/github/releases'] == 3
+
+
+def test_session_reuses_connection(stand_in, make_checker):
+    stand_in.add('/github/releases', release_list())
+    checker = make_checker()
+
+    for _ in range(3):
+        assert checker.get_github_releases()[0]['tag_name'] == TAG
+    assert stand_in.connections == 1
+
+
+def test_release_cache_revalidates_with_etag(stand_in, make_checker, logs):
+    stand_in.add('/github/releases', release_list(), etag=True)
+    checker = make_checker()
+    first = checker.get_github_releases()
+
+    # 新建实例，确认缓存（含 ETag）已写入磁盘
+    checker = make_checker()
+    second = checker.get_github_releases()
+
+    assert second == first
+    assert any('(304)' in line for line in logs)
+    assert stand_in.requests['/github/releases'] == 2
+
+
+def test_release_cache_within_ttl_skips_request(stand_in, make_checker):
+    stand_in.add('/github/releases', release_list())
+    checker = make_checker(cache_ttl=600)
+    checker.get_github_releases()
+
+    assert checker.get_github_releases()[0]['tag_name'] == TAG
+    assert stand_in.requests['/github/releases'] == 1
+    assert checker.get_github_releases(force=True)[0]['tag_name'] == TAG
+    assert stand_in.requests['/github/releases'] == 2
+
+
+# ==================== 下载 ====================
+
+def test_range_download_resumes_after_interruption(stand_in, make_checker, monkeypatch, tmp_path):
+    data = os.urandom(3 * 1024 * 1024)
+    # 第一个请求是 1 字节的探测，第二个请求在三分之一处断开
+    url = stand_in.add('/package.zip', data, drop_after=len(data) // 3, drop_times=2)
+    # 不在同一次下载中重试，模拟程序在断线后退出
+    monkeypatch.setattr(update, 'SEGMENT_RETRIES', 0)
+    checker = make_checker()
+
+    assert not checker._perform_download(url, str(tmp_path / 'package.zip'), 'package.zip')
+    with open(tmp_path / 'package.zip.part.json', encoding='utf-8') as f:
+        resumed_at = json.load(f)['segments'][0][2]
+    assert resumed_at == len(data) // 3
+
+    stand_in.bytes_sent['/package.zip'] = 0
+    assert checker._perform_download(url, str(tmp_path / 'package.zip'), 'package.zip')
+    assert (tmp_path / 'package.zip').read_bytes() == data
+    assert not (tmp_path / 'package.zip.part').exists()
+    assert not (tmp_path / 'package.zip.part.json').exists()
+    # 只从中断处继续下载剩余部分（另有 1 字节的探测请求）
+    assert stand_in.bytes_sent['/package.zip'] == len(data) - resumed_at + 1
+
+
+def test_segmented_download_merges_and_verifies(stand_in, make_checker, tmp_path, logs):
+    data = os.urandom(6 * 1024 * 1024 + 123)
+    release = publish(stand_in, data)
+    checker = make_checker(download_segments=4)
+
+    assert checker.download_with_progress(stand_in.url('/package.zip'), 'package.zip', release)
+    assert (tmp_path / 'package.zip').read_bytes() == data
+    assert any('分 4 段并行下载' in line for line in logs)
+    assert any('SHA-256 校验通过' in line for line in logs)
+    assert stand_in.requests['/package.zip'] == 5
+
+
+def test_checksum_mismatch_rejects_download(stand_in, make_checker, tmp_path, logs):
+    data = os.urandom(2 * 1024 * 1024)
+    release = publish(stand_in, data, checksum='0' * 64)
+    checker = make_checker(download_segments=2)
+
+    assert not checker.download_with_progress(stand_in.url('/package.zip'), 'package.zip', release)
+    assert not (tmp_path / 'package.zip').exists()
+    # 进度一并删除，下次不会在损坏的数据上续传
+    assert not (tmp_path / 'package.zip.part').exists()
+    assert not (tmp_path / 'package.zip.part.json').exists()
+    assert any('SHA-256 校验失败' in line for line in logs)
+
+
+def test_missing_checksum_entry_stops_download(stand_in, make_checker, tmp_path, logs):
+    data = os.urandom(1024)
+    release = publish(stand_in, data)
+    stand_in.add('/package.zip.sha256', f'{"0" * 64}  other.zip\n'.encode('utf-8'))
+    checker = make_checker()
+
+    assert not checker.download_with_progress(stand_in.url('/package.zip'), 'package.zip', release)
+    assert stand_in.requests['/package.zip'] == 0
+    assert any('没有 package.zip 的记录' in line for line in logs)
+
+
+def test_probe_stops_early_when_range_ignored(stand_in, make_checker):
+    data = os.urandom(4 * 1024 * 1024)
+    url = stand_in.add('/package.zip', data, ranges=False, bandwidth=256)
+    checker = make_checker()
+
+    seconds, total = checker._probe_latency(url)
+
+    assert total == len(data)
+    assert seconds < update.PROBE_TIMEOUT
+
+
+def test_download_sources_ordered_by_probe_time(stand_in, make_checker):
+    data = os.urandom(256 * 1024)
+    slow = stand_in.add('/gitee/package.zip', data, latency=0.5)
+    fast = stand_in.add('/github/package.zip', data)
+    stale = stand_in.add('/mirror/package.zip', data[:-1])
+    checker = make_checker()
+    checker.releases = {
+        'gitee': release_list(assets=[{'name': 'package.zip', 'browser_download_url': slow}]),
+        'github': release_list(assets=[{'name': 'package.zip', 'browser_download_url': stale}]),
+    }
+    release = release_list(assets=[{'name': 'package.zip', 'browser_download_url': fast}])[0]
+
+    ordered = checker.select_download_urls(fast, release)
+
+    # 大小与多数地址不一致的镜像排在探测失败的位置
+    assert ordered == [fast, slow, stale]
+
+
+def test_download_fails_over_to_next_source(stand_in, make_checker, tmp_path):
+    data = os.urandom(256 * 1024)
+    url = stand_in.add('/github/package.zip', data)
+    broken = stand_in.add('/gitee/package.zip', b'', fail_times=100)
+    checker = make_checker()
+
+    assert checker.download_with_progress(broken, 'package.zip', urls=[broken, url])
+    assert (tmp_path / 'package.zip').read_bytes() == data
+
+
+def test_bandwidth_limit_throttles_download(stand_in, make_checker, tmp_path):
+    data = os.urandom(512 * 1024)
+    url = stand_in.add('/package.zip', data)
+    checker = make_checker(bandwidth_limit=512)
+
+    start = time.monotonic()
+    assert checker.download_with_progress(url, 'package.zip', urls=[url])
+
+    assert time.monotonic() - start >= 0.8
+    assert (tmp_path / 'package.zip').read_bytes() == data
+
+
+
+def test_fetch_retries_body_cut_off(stand_in, make_checker):
+    digest = hashlib.sha256(b'data').hexdigest()
+    url = stand_in.add('/package.zip.sha256', f'{digest}  package.zip\n'.encode('utf-8'),
+                       drop_after=10, drop_times=1)
+    checker = make_checker()
+
+    content = checker._fetch(url)
+
+    assert content.split()[0].decode('ascii') == digest
+    assert stand_in.requests['/package.zip.sha256'] == 2
+
+# ==================== 增量更新 ====================
+
+def make_zip(path, files):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def write_files(root, files):
+    for name, data in files.items():
+        path = os.path.join(str(root), *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+@pytest.fixture
+def delta_release(stand_in, tmp_path, tmp_path_factory):
+    """本地安装旧版本，发布修改了 app.exe 并新增一个文件的新版本及其文件清单"""
+    old = {f'lib/mod{i}.pyd': os.urandom(256 * 1024) for i in range(10)}
+    old['app.exe'] = os.urandom(512 * 1024)
+    new = dict(old, **{'app.exe': os.urandom(512 * 1024), 'lib/added.pyd': os.urandom(64 * 1024)})
+    write_files(tmp_path, old)
+    with open(make_zip(tmp_path_factory.mktemp('release') / 'full.zip', new), 'rb') as f:
+        archive = f.read()
+    manifest = {'files': {name: {'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+                          for name, data in new.items()}}
+    release = release_list(assets=[
+        {'name': 'package.zip', 'browser_download_url': stand_in.add('/package.zip', archive)},
+        {'name': 'package.zip.manifest.json',
+         'browser_download_url': stand_in.add('/package.zip.manifest.json', manifest)},
+    ])[0]
+    return release, new, archive
+
+
+def test_delta_download_fetches_only_changed_files(stand_in, make_checker, tmp_path, delta_release):
+    release, new, archive = delta_release
+    checker = make_checker(download_segments=2)
+
+    delta = checker.download_delta(stand_in.url('/package.zip'), 'package.zip', release)
+
+    assert delta == 'package.delta.zip'
+    with zipfile.ZipFile(tmp_path / delta) as zf:
+        manifest = json.loads(zf.read(update.DELTA_MANIFEST_MEMBER).decode('utf-8'))
+        assert {name: zf.read(name) for name in zf.namelist() if name != update.DELTA_MANIFEST_MEMBER} == {
+            'app.exe': new['app.exe'], 'lib/added.pyd': new['lib/added.pyd']}
+    # 增量包记录完整清单和基于的版本，其余文件安装时从该版本沿用
+    assert manifest['base'] is None
+    assert set(manifest['files']) == set(new)
+    assert stand_in.bytes_sent['/package.zip'] < len(archive) / 2
+    assert not (tmp_path / 'package.zip.delta.part').exists()
+
+
+def test_delta_download_skipped_without_manifest(stand_in, make_checker):
+    release = publish(stand_in, b'data')
+    checker = make_checker()
+
+    assert checker.download_delta(stand_in.url('/package.zip'), 'package.zip', release) is None
+    assert stand_in.requests['/package.zip'] == 0
+
+
+def test_delta_download_honours_bandwidth_limit(stand_in, make_checker, delta_release):
+    release, _, _ = delta_release
+    checker = make_checker(download_segments=2, bandwidth_limit=1024)
+
+    start = time.monotonic()
+    assert checker.download_delta(stand_in.url('/package.zip'), 'package.zip', release)
+
+    # 两个分段合计不超过 1 MB/s
+    assert time.monotonic() - start >= stand_in.bytes_sent['/package.zip'] / (1024 * 1024) * 0.8
+
+
+# ==================== 安装 ====================
+
+def read_tree(root):
+    files = {}
+    for base, _, names in os.walk(str(root)):
+        for name in names:
+            path = os.path.join(base, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, str(root)).replace(os.sep, '/')] = f.read()
+    return files
+
+
+@pytest.fixture
+def installed(tmp_path):
+    target = tmp_path / 'app'
+    old = {'app.exe': b'old exe', 'lib/core.dll': b'old dll', 'keep.txt': b'same'}
+    write_files(target, old)
+    archive = make_zip(tmp_path / 'new.zip', {
+        'app.exe': b'new exe', 'lib/core.dll': b'new dll', 'lib/extra.dll': b'added', 'keep.txt': b'same'})
+    return str(target), archive, old
+
+
+def test_atomic_install_replaces_changed_files(installed):
+    target, archive, _ = installed
+
+    assert AtomicInstaller(archive, target, log_callback=lambda msg: None).install()
+
+    assert read_tree(target) == {'app.exe': b'new exe', 'lib/core.dll': b'new dll',
+                                 'lib/extra.dll': b'added', 'keep.txt': b'same'}
+
+
+def test_atomic_install_rejects_path_outside_target(installed, tmp_path):
+    target, _, old = installed
+    archive = make_zip(tmp_path / 'evil.zip', {'../outside.txt': b'x'})
+
+    with pytest.raises(ValueError):
+        AtomicInstaller(archive, target, log_callback=lambda msg: None).install()
+    assert not (tmp_path / 'outside.txt').exists()
+    assert read_tree(target) == old
+
+
+def test_atomic_install_rolls_back_failed_commit(installed, monkeypatch):
+    target, archive, old = installed
+    real_replace = os.replace
+    calls = []
+
+    def flaky_replace(src, dst):
+        # 第 1 次是写入回滚清单，之后依次为备份、替换；第二个文件备份时失败
+        calls.append(dst)
+        if len(calls) == 4:
+            raise PermissionError('文件被占用')
+        real_replace(src, dst)
+
+    monkeypatch.setattr(update.os, 'replace', flaky_replace)
+    installer = AtomicInstaller(archive, target, log_callback=lambda msg: None)
+    assert not installer.install()
+    monkeypatch.setattr(update.os, 'replace', real_replace)
+
+    assert read_tree(target) == old
+
+
+def test_interrupted_install_recovered_from_journal(installed):
+    target, archive, old = installed
+    installer = AtomicInstaller(archive, target, log_callback=lambda msg: None)
+    with zipfile.ZipFile(archive) as zf:
+        plan = installer.plan(zf)
+        assert installer.stage(zf, plan)
+    installer._write_journal(plan)
+    # 只替换了第一个文件时进程退出
+    installer.commit(plan[:1])
+    assert os.path.exists(installer.journal_path)
+
+    AtomicInstaller(archive, target, log_callback=lambda msg: None).recover()
+
+    assert read_tree(target) == old
+
+
+def test_next_install_recovers_before_installing(installed):
+    target, archive, _ = installed
+    installer = AtomicInstaller(archive, target, log_callback=lambda msg: None)
+    with zipfile.ZipFile(archive) as zf:
+        plan = installer.plan(zf)
+        installer.stage(zf, plan)
+    installer._write_journal(plan)
+    installer.commit(plan[:2])
+
+    assert AtomicInstaller(archive, target, log_callback=lambda msg: None).install()
+    assert read_tree(target)['app.exe'] == b'new exe'
+    assert not any(name.endswith(AtomicInstaller.BACKUP_SUFFIX) for name in read_tree(target))
+
+
+# ==================== 并列安装 ====================
+
+def test_side_by_side_install_switches_and_rolls_back(tmp_path, make_checker):
+    checker = make_checker()
+    make_zip(tmp_path / 'v1.zip', {'app.exe': b'one'})
+    make_zip(tmp_path / 'v2.zip', {'app.exe': b'two'})
+
+    assert checker.extract_and_install('v1.zip', 'v1')
+    assert checker.extract_and_install('v2.zip', 'v2')
+    assert checker.versions.current() == 'v2'
+    assert read_tree(checker.versions.current_dir()) == {'app.exe': b'two'}
+
+    assert checker.versions.rollback() == 'v1'
+    assert read_tree(checker.versions.current_dir()) == {'app.exe': b'one'}
+
+
+def test_delta_install_rejects_modified_base_file(tmp_path, make_checker):
+    checker = make_checker()
+    base = {'app.exe': b'A' * 100, 'lib/core.dll': b'B' * 100}
+    make_zip(tmp_path / 'full.zip', base)
+    assert checker.extract_and_install('full.zip', 'v1')
+
+    new = dict(base, **{'app.exe': b'C' * 100})
+    manifest = {'base': 'v1', 'files': {path: {'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+                                        for path, data in new.items()}}
+    with zipfile.ZipFile(tmp_path / 'delta.zip', 'w') as archive:
+        archive.writestr(update.DELTA_MANIFEST_MEMBER, json.dumps(manifest))
+        archive.writestr('app.exe', new['app.exe'])
+
+    # 大小不变但内容被改动的文件不能沿用
+    write_files(tmp_path / 'versions' / 'v1', {'lib/core.dll': b'X' * 100})
+    assert not checker.extract_and_install('delta.zip', 'v2')
+    assert checker.versions.current() == 'v1'
+
+    write_files(tmp_path / 'versions' / 'v1', {'lib/core.dll': base['lib/core.dll']})
+    assert checker.extract_and_install('delta.zip', 'v2')
+    assert read_tree(tmp_path / 'versions' / 'v2') == new
+
+
+def test_garbage_collection_keeps_recent_staging_directories(tmp_path):
+    store = versions.VersionStore(str(tmp_path))
+    fresh = tmp_path / 'versions' / ('v3' + versions.STAGING_SUFFIX)
+    stale = tmp_path / 'versions' / ('v2' + versions.STAGING_SUFFIX)
+    write_files(fresh, {'app.exe': b'x'})
+    write_files(stale, {'app.exe': b'x'})
+    old = time.time() - versions.STAGING_MAX_AGE - 60
+    os.utime(str(stale), (old, old))
+
+    store.collect_garbage(0)
+
+    # 另一个进程可能正在解压到较新的临时目录
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+def test_garbage_collection_keeps_current_and_previous(tmp_path):
+    store = versions.VersionStore(str(tmp_path))
+    for index, version in enumerate(['v1', 'v2', 'v3', 'v4']):
+        write_files(tmp_path / 'versions' / version, {'app.exe': b'x' * 1024})
+        os.utime(store.version_dir(version), (1000 + index, 1000 + index))
+    store.switch('v2')
+    store.switch('v3')
+
+    assert sorted(store.collect_garbage(0)) == ['v1', 'v4']
+    assert store.list_versions() == ['v3', 'v2']
+
+
+
+@pytest.mark.parametrize('tag', ['release/v2', '..', 'v2.staging', '.hidden', 'v2\\..\\x'])
+def test_unsafe_tag_not_used_as_version_directory(tmp_path, make_checker, tag):
+    checker = make_checker()
+    make_zip(tmp_path / 'v1.zip', {'app.exe': b'one'})
+    make_zip(tmp_path / 'bad.zip', {'app.exe': b'bad'})
+    assert checker.extract_and_install('v1.zip', 'v1')
+
+    assert not checker.extract_and_install('bad.zip', tag)
+
+    assert checker.versions.current() == 'v1'
+    assert os.listdir(str(tmp_path / 'versions')) == ['v1']
+    assert checker._find_latest_release(release_list(tag=tag)) is None
+
+# ==================== 完整流程 ====================
+
+def test_endpoints_override_defaults(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    checker = UpdateChecker(log_callback=None, progress_callback=None,
+                            endpoints={'github_mirror_base': 'http://127.0.0.1:1/mirror/'})
+
+    assert checker.github_mirror_base == 'http://127.0.0.1:1/mirror'
+    assert checker.github_api_url == update.DEFAULT_ENDPOINTS['github_api_url']
+
+
+@pytest.fixture
+def qt_app():
+    from PySide2.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.mark.parametrize('manifest', [True, False], ids=['delta', 'full'])
+def test_pipeline_survives_dropped_connections(qt_app, manifest):
+    import benchmark_update
+    from mock_release_server import MockReleaseServer, make_bundle, change_bundle, package_assets
+
+    old_files = make_bundle(20, 2 * 1024 * 1024)
+    new_files = change_bundle(old_files, 0.2)
+    args = types.SimpleNamespace(version_type=VersionType.PYINSTALLER.value, segments=2, min_speed=0,
+                                 in_place=False, timeout=120, verbose=False)
+    with MockReleaseServer() as server:
+        server.random = random.Random(3)
+        server.configure(drop_rate=0.3)
+        server.add_release(TAG, package_assets(new_files, TAG, args.version_type, manifest))
+
+        result = benchmark_update.run_round(server, old_files, args)
+
+    assert result['ok'], result['error']
+    assert result['delta'] == manifest
+    assert sum(server.stats[source]['failures'] for source in server.stats) > 0
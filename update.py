@@ -1,16 +1,28 @@
 import sys
 import requests
+import hashlib
 import json
 from typing import List, Dict, Optional
 import re
 import os
 import logging
 import zipfile
+import struct
+import zlib
+import bisect
+from urllib.parse import urlparse
 import shutil
 import argparse
 import time
+import threading
+import random
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from enum import Enum  # 确保导入 Enum
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as Urllib3Error
+from versions import VersionStore, STAGING_SUFFIX, is_valid_version_name
 
 # PySide2 Imports
 from PySide2.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
@@ -21,6 +33,66 @@ from PySide2.QtCore import Qt, Signal, QThread, QObject
 from PySide2.QtGui import QTextCursor, QFont
 
 THIS_VERSION = "v3.7"
+# 更新源地址，可在 update_config.json 中覆盖（例如指向 mock_release_server.py 在本地离线测试）
+DEFAULT_ENDPOINTS = {
+    'gitee_api_url': "https://gitee.com/api/v5/repos/Bilibili-Supercmd/classroom_lottery/releases",
+    'github_api_url': "https://api.github.com/repos/trustedinster/classroom_lottery/releases",
+    # GitHub 安装包下载地址的前缀，以该前缀开头的地址可替换为镜像站地址
+    'github_download_base': "https://github.com",
+    'github_mirror_base': "https://gh.gh.supercmd.xin",
+}
+# 并发查询更新源时，第一个有效结果到达后再等待其他源的最长时间（秒）
+SOURCE_RACE_GRACE = 1.5
+# 发布信息缓存：TTL 内直接使用缓存，过期后带 ETag/Last-Modified 发起条件请求
+RELEASE_CACHE_FILE = "release_cache.json"
+DEFAULT_RELEASE_CACHE_TTL = 600
+# 下载参数：分段数为 1 时只做断点续传，大于 1 时并行下载各分段
+DEFAULT_DOWNLOAD_SEGMENTS = 1
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 进度回调最多每 PROGRESS_INTERVAL 秒一次；速度取指数加权平均；
+# 每次读取约 CHUNK_TARGET_SECONDS 秒的数据，慢速网络下进度仍然流畅，快速网络下减少循环次数
+PROGRESS_INTERVAL = 0.2
+SPEED_SMOOTHING = 0.3
+CHUNK_TARGET_SECONDS = 0.25
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+# 下载源选择：并发请求各下载地址的前 PROBE_BYTES 字节，按耗时排序，排名保存在 MIRROR_RANKING_FILE；
+# 下载中某个连接在 SLOW_CHECK_WINDOW 秒内的平均速度低于下限时切换到下一个下载源继续
+PROBE_BYTES = 64 * 1024
+PROBE_TIMEOUT = 5
+MIRROR_RANKING_FILE = "mirror_ranking.json"
+DEFAULT_MIN_DOWNLOAD_SPEED = 16
+SLOW_CHECK_WINDOW = 8.0
+# 后台更新代理（--agent）：抽号程序运行期间按带抖动的间隔在机器空闲时检查更新，
+# 限速预下载，下载完成后写入 UPDATE_READY_FILE，由启动器和更新窗口提示安装
+UPDATE_READY_FILE = "update_ready.json"
+DEFAULT_AUTO_CHECK_INTERVAL = 6
+DEFAULT_BACKGROUND_BANDWIDTH = 256
+AGENT_START_DELAY = (120, 600)
+AGENT_JITTER = 0.2
+AGENT_POLL_INTERVAL = 30
+AGENT_IDLE_RETRY = 300
+AGENT_IDLE_INPUT_SECONDS = 120
+AGENT_IDLE_CPU_PERCENT = 30
+MIN_SEGMENT_SIZE = 1024 * 1024
+SEGMENT_RETRIES = 5
+# 发布中的校验文件：优先使用与安装包同名的 <文件名>.sha256，其次是汇总的校验清单
+CHECKSUM_SUFFIX = ".sha256"
+CHECKSUM_MANIFEST_NAMES = ("SHA256SUMS", "SHA256SUMS.txt", "checksums.txt")
+# 校验文件、文件清单等小文件读取中途断开时的重试次数（会话的 Retry 只覆盖建立连接和错误状态码）
+FETCH_RETRIES = 3
+# 增量更新：发布中的 <安装包名>.manifest.json 记录每个文件的大小和 SHA-256，
+# 只从完整安装包中按 Range 取回有变化的文件；需下载的数据超过安装包的一定比例时改为完整下载
+MANIFEST_SUFFIX = ".manifest.json"
+DELTA_MAX_RATIO = 0.5
+# 相邻两段待下载数据间隔小于该值时合并为一个请求
+DELTA_RANGE_GAP = 64 * 1024
+# zip 末尾目录结束记录最多带 64KB 注释
+ZIP_TAIL_SIZE = 64 * 1024 + 22
+# 增量包内记录完整文件清单和基准版本的成员，并列安装时据此从当前版本硬链接未变化的文件
+DELTA_MANIFEST_MEMBER = ".update_manifest.json"
+# 并列安装：每个版本解压到 versions/<版本号>/，旧版本总大小超过预算（MB）时删除最旧的
+DEFAULT_VERSIONS_DISK_BUDGET = 1024
 if not sys.stderr:
     class DummyWriter:
         def write(self, data):
@@ -42,7 +114,15 @@ class UpdateConfig:
     def load() -> dict:
         """加载配置文件"""
         default_config = {
-            'version_type': VersionType.PYINSTALLER.value
+            'version_type': VersionType.PYINSTALLER.value,
+            'release_cache_ttl': DEFAULT_RELEASE_CACHE_TTL,
+            'download_segments': DEFAULT_DOWNLOAD_SEGMENTS,
+            'min_download_speed': DEFAULT_MIN_DOWNLOAD_SPEED,
+            'auto_check_interval': DEFAULT_AUTO_CHECK_INTERVAL,
+            'background_bandwidth': DEFAULT_BACKGROUND_BANDWIDTH,
+            'side_by_side_install': True,
+            'versions_disk_budget': DEFAULT_VERSIONS_DISK_BUDGET,
+            **DEFAULT_ENDPOINTS,
         }
 
         if not os.path.exists(UpdateConfig.CONFIG_FILE):
@@ -51,8 +131,8 @@ class UpdateConfig:
         try:
             with open(UpdateConfig.CONFIG_FILE, 'r', encoding='utf-8') as f:
                 config = json.load(f)
-                if 'version_type' not in config:
-                    config['version_type'] = VersionType.PYINSTALLER.value
+                for key, value in default_config.items():
+                    config.setdefault(key, value)
                 return config
         except Exception:
             return default_config
@@ -69,14 +149,439 @@ class UpdateConfig:
 
 # ==================== 核心逻辑类 ====================
 
+class SlowTransferError(IOError):
+    """下载速度持续低于下限，应切换下载源而不是在同一地址重试"""
+
+
+class TransferMeter:
+    """
+    下载进度节流与速度估计
+    各下载线程每写入一块数据调用 update()，最多每 PROGRESS_INTERVAL 秒（以及完成时）
+    调用一次 callback(已下载, 总大小, 速度 字节/秒, 剩余秒数)，剩余时间未知时为 -1；
+    同时按当前每个连接的速度给出下一次读取的块大小
+    """
+
+    def __init__(self, callback=None, total: Optional[int] = None):
+        self.callback = callback
+        self.total = total
+        self.connections = 1
+        self.speed = 0.0
+        self.chunk_size = DOWNLOAD_CHUNK_SIZE
+        self.lock = threading.Lock()
+        self.last_time = None
+        self.last_bytes = 0
+
+    def update(self, current: int, total: int):
+        total = self.total or total
+        now = time.monotonic()
+        with self.lock:
+            if self.last_time is None:
+                # 第一次调用只记录起点，续传时已有的数据不计入速度
+                self.last_time, self.last_bytes = now, current
+            elif now - self.last_time >= PROGRESS_INTERVAL:
+                sample = (current - self.last_bytes) / (now - self.last_time)
+                self.speed = sample if self.speed == 0 else (
+                    SPEED_SMOOTHING * sample + (1 - SPEED_SMOOTHING) * self.speed)
+                self.last_time, self.last_bytes = now, current
+                per_connection = self.speed / max(1, self.connections)
+                self.chunk_size = int(min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, per_connection * CHUNK_TARGET_SECONDS)))
+            elif current < total or total <= 0:
+                return
+            speed = self.speed
+        if self.callback:
+            eta = (total - current) / speed if speed > 0 and total > 0 else -1.0
+            self.callback(current, total, speed, eta)
+
+
+class PartialDownload:
+    """
+    断点续传的下载状态
+    数据写入 <文件名>.part，各分段的进度保存在 <文件名>.part.json；
+    连接中断或程序退出后再次下载同一文件（大小一致）时，从各分段已完成的位置继续，
+    因此 GitHub、镜像站和 Gitee 之间切换时也能沿用已下载的部分
+    """
+
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, filepath: str, total: int, meter: Optional[TransferMeter] = None, verify=True):
+        self.filepath = filepath
+        self.verify = verify
+        self.meter = meter
+        self.part_path = filepath + '.part'
+        self.meta_path = filepath + '.part.json'
+        self.total = total
+        # 每个分段为 [起始位置, 结束位置(含), 下一个待写入位置]
+        self.segments = []
+        self.lock = threading.Lock()
+        self.last_saved = 0.0
+        # 对文件开头连续写完的部分增量计算 SHA-256，hashed 为已计算到的位置
+        self.hasher = hashlib.sha256()
+        self.hashed = 0
+        # 单个连接的最低速度（字节/秒，0 表示不检测）；任一分段因速度过低中止时其余分段也停止
+        self.min_speed = 0
+        # 单个连接的限速（字节/秒，0 表示不限速）
+        self.rate_limit = 0
+        self.cancelled = False
+
+    def plan(self, segment_count: int) -> bool:
+        """恢复已有进度，无法恢复时按 segment_count 重新划分分段；返回是否为续传"""
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (meta.get('total') == self.total and os.path.exists(self.part_path)
+                    and os.path.getsize(self.part_path) == self.total):
+                self.segments = [list(segment) for segment in meta['segments']]
+                return True
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        segment_count = max(1, min(segment_count, self.total // MIN_SEGMENT_SIZE or 1))
+        size = self.total // segment_count
+        self.segments = []
+        for i in range(segment_count):
+            start = i * size
+            end = self.total - 1 if i == segment_count - 1 else start + size - 1
+            self.segments.append([start, end, start])
+        # 预先分配文件大小，各分段直接写入自己的位置
+        with open(self.part_path, 'wb') as f:
+            f.truncate(self.total)
+        self.save(force=True)
+        return False
+
+    @property
+    def downloaded(self) -> int:
+        return sum(pos - start for start, _, pos in self.segments)
+
+    @property
+    def complete(self) -> bool:
+        return all(pos > end for _, end, pos in self.segments)
+
+    @property
+    def contiguous(self) -> int:
+        """文件开头已连续写完的字节数"""
+        for start, end, pos in self.segments:
+            if pos <= end:
+                return pos
+        return self.total
+
+    def advance(self, segment: list, chunk: bytes):
+        """记录分段写入了 chunk，并在数据紧接已校验位置时直接计入哈希"""
+        with self.lock:
+            if self.verify and segment[2] == self.hashed:
+                self.hasher.update(chunk)
+                self.hashed += len(chunk)
+            segment[2] += len(chunk)
+            # 前一个分段完成后，从磁盘补算后续分段已写入的部分
+            if self.verify and self.contiguous > self.hashed:
+                self._hash_from_disk(self.contiguous)
+            downloaded = self.downloaded
+            self.save()
+        if self.meter:
+            self.meter.update(downloaded, self.total)
+
+    def _hash_from_disk(self, end: int):
+        with open(self.part_path, 'rb') as f:
+            f.seek(self.hashed)
+            while self.hashed < end:
+                data = f.read(min(DOWNLOAD_CHUNK_SIZE, end - self.hashed))
+                if not data:
+                    raise IOError("下载文件长度不足")
+                self.hasher.update(data)
+                self.hashed += len(data)
+
+    def hexdigest(self) -> str:
+        """全部分段完成后返回文件的 SHA-256（续传时之前下载的部分从磁盘读取）"""
+        with self.lock:
+            self._hash_from_disk(self.total)
+            return self.hasher.hexdigest()
+
+    def save(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_saved < self.SAVE_INTERVAL:
+            return
+        self.last_saved = now
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'total': self.total, 'segments': self.segments}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def discard(self):
+        """删除下载进度，下次重新下载"""
+        for path in (self.part_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def finish(self):
+        """校验通过后把 .part 文件改为正式文件名"""
+        os.replace(self.part_path, self.filepath)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+
+
+def archive_member_parts(name: str) -> List[str]:
+    """把更新包中的成员名拆成路径片段，拒绝绝对路径和指向目标目录之外的路径"""
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or '..' in parts or os.path.isabs(name) or ':' in parts[0]:
+        raise ValueError(f"更新包中的文件路径无效: {name}")
+    return parts
+
+
+class AtomicInstaller:
+    """
+    在进程内安装更新包
+    需要更新的文件先解压到目标文件旁的临时文件（与目标在同一目录，改名是原子操作），
+    全部写好后逐个把旧文件改名为备份、把新文件改名为正式文件名，任何一步失败都按回滚清单恢复。
+    Windows 上正在运行的 exe/dll 不能覆盖但可以改名，因此更新程序自身也能直接替换。
+    回滚清单在替换前写入 update_journal.json，替换中途程序退出时下次安装会先恢复
+    """
+
+    STAGE_SUFFIX = '.update_new'
+    BACKUP_SUFFIX = '.update_old'
+    JOURNAL_FILE = 'update_journal.json'
+
+    def __init__(self, zip_path: str, target_dir: str, log_callback=print):
+        self.zip_path = zip_path
+        self.target_dir = target_dir
+        self.journal_path = os.path.join(target_dir, self.JOURNAL_FILE)
+        self._log = log_callback
+
+    def install(self) -> bool:
+        self.recover()
+        self.remove_leftovers()
+        with zipfile.ZipFile(self.zip_path) as archive:
+            plan = self.plan(archive)
+            if not plan:
+                return True
+            if not self.stage(archive, plan):
+                self.revert(plan)
+                return False
+
+        self._write_journal(plan)
+        try:
+            self.commit(plan)
+        except OSError as e:
+            self._log(f"替换文件失败，正在回滚: {e}")
+            # 回滚也未完成时保留清单，下次安装前再次恢复
+            if self.revert(plan):
+                os.remove(self.journal_path)
+            return False
+        os.remove(self.journal_path)
+        self.remove_leftovers()
+        return True
+
+    def plan(self, archive: zipfile.ZipFile) -> List[Dict]:
+        """
+        列出需要更新的文件，大小和 CRC32 与包内记录一致的文件跳过
+        （CRC32 记录在 zip 中央目录里，比对时无需解压）
+        """
+        plan = []
+        skipped = 0
+        for info in archive.infolist():
+            if info.is_dir() or info.filename == DELTA_MANIFEST_MEMBER:
+                continue
+            target = os.path.join(self.target_dir, *archive_member_parts(info.filename))
+            exists = os.path.isfile(target)
+            if exists and os.path.getsize(target) == info.file_size and self._file_crc32(target) == info.CRC:
+                skipped += 1
+                continue
+            plan.append({
+                'name': info.filename,
+                'target': target,
+                'staged': target + self.STAGE_SUFFIX,
+                'backup': f'{target}.{os.getpid()}{self.BACKUP_SUFFIX}' if exists else None,
+            })
+        self._log(f"更新包共 {len(plan) + skipped} 个文件，需要更新 {len(plan)} 个，{skipped} 个未变化")
+        return plan
+
+    def stage(self, archive: zipfile.ZipFile, plan: List[Dict]) -> bool:
+        """把新文件写入各自目标旁的临时文件，逐个记录失败的文件"""
+        failed = 0
+        for entry in plan:
+            try:
+                os.makedirs(os.path.dirname(entry['target']), exist_ok=True)
+                with archive.open(entry['name']) as src, open(entry['staged'], 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            except (OSError, zipfile.BadZipFile) as e:
+                failed += 1
+                self._log(f"写入失败: {entry['name']}: {e}")
+        if failed:
+            self._log(f"{failed} 个文件写入失败，未修改任何已安装的文件")
+        return failed == 0
+
+    def commit(self, plan: List[Dict]):
+        for entry in plan:
+            if entry['backup']:
+                os.replace(entry['target'], entry['backup'])
+            os.replace(entry['staged'], entry['target'])
+
+    def revert(self, plan: List[Dict]) -> bool:
+        """
+        按回滚清单恢复：临时文件仍在说明该文件尚未替换，直接删除；
+        否则把新文件删除并把备份改回原名。全部恢复成功时返回 True
+        """
+        ok = True
+        for entry in reversed(plan):
+            try:
+                if os.path.exists(entry['staged']):
+                    os.remove(entry['staged'])
+                    if entry['backup'] and os.path.exists(entry['backup']):
+                        os.replace(entry['backup'], entry['target'])
+                elif entry['backup']:
+                    if os.path.exists(entry['backup']):
+                        os.replace(entry['backup'], entry['target'])
+                elif os.path.exists(entry['target']):
+                    os.remove(entry['target'])
+            except OSError as e:
+                ok = False
+                self._log(f"回滚失败: {entry['name']}: {e}")
+        return ok
+
+    def recover(self):
+        """上次安装在替换过程中中断时，按回滚清单恢复到安装前的状态"""
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                plan = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._log("检测到上次未完成的安装，正在恢复...")
+        if not self.revert(plan):
+            raise OSError("无法恢复上次未完成的安装")
+        os.remove(self.journal_path)
+
+    def remove_leftovers(self):
+        """删除备份和残留的临时文件，仍被占用的备份（如正在运行的程序）留待下次删除"""
+        for root, _, files in os.walk(self.target_dir):
+            for name in files:
+                if name.endswith(self.BACKUP_SUFFIX) or name.endswith(self.STAGE_SUFFIX):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+
+    def _write_journal(self, plan: List[Dict]):
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.journal_path)
+
+    @staticmethod
+    def _file_crc32(path: str) -> int:
+        crc = 0
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                crc = zlib.crc32(block, crc)
+        return crc
+
+
+class VersionedInstaller:
+    """
+    并列安装：把更新包解压到 versions/<版本号>/，完成后原子地切换 current 指针
+    已安装的文件不做任何修改，回滚只需把指针改回上一个版本。
+    增量包只含有变化的文件，其余文件从当前版本硬链接（不支持硬链接时复制），无需重新下载或复制整个程序
+    """
+
+    def __init__(self, zip_path: str, store: VersionStore, version: str,
+                 disk_budget: int = DEFAULT_VERSIONS_DISK_BUDGET * 1024 * 1024, log_callback=print):
+        self.zip_path = zip_path
+        self.store = store
+        self.version = version
+        self.disk_budget = disk_budget
+        self._log = log_callback
+
+    def install(self) -> str:
+        """安装并切换到新版本，返回版本目录名（同一版本重复安装时带序号后缀）"""
+        name = self.version
+        index = 1
+        while os.path.exists(self.store.version_dir(name)):
+            index += 1
+            name = f"{self.version}-{index}"
+        target = self.store.version_dir(name)
+        staging = target + STAGING_SUFFIX
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+        try:
+            with zipfile.ZipFile(self.zip_path) as archive:
+                extracted, manifest = self.extract(archive, staging)
+            linked = self.link_unchanged(manifest, extracted, staging) if manifest else 0
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        os.replace(staging, target)
+        # 目录修改时间作为安装时间，清理旧版本时按它排序
+        os.utime(target)
+        self._log(f"已解压到 {target}：{len(extracted)} 个文件来自更新包，{linked} 个沿用当前版本")
+
+        self.store.switch(name)
+        self._log(f"已切换到版本 {name}")
+        for removed in self.store.collect_garbage(self.disk_budget):
+            self._log(f"已删除旧版本: {removed}")
+        return name
+
+    def extract(self, archive: zipfile.ZipFile, staging: str) -> tuple:
+        """解压包内文件，返回 (已解压的相对路径集合, 增量包的文件清单或 None)"""
+        extracted = set()
+        manifest = None
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.filename == DELTA_MANIFEST_MEMBER:
+                manifest = json.loads(archive.read(info).decode('utf-8'))
+                continue
+            parts = archive_member_parts(info.filename)
+            path = os.path.join(staging, *parts)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with archive.open(info) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            extracted.add('/'.join(parts))
+        return extracted, manifest
+
+    def link_unchanged(self, manifest: Dict, extracted: set, staging: str) -> int:
+        """从增量包基于的版本中取回清单里其余的文件"""
+        base = manifest.get('base')
+        if base != self.store.current():
+            raise ValueError(f"增量包基于版本 {base or '根目录'}，与当前版本不同，请重新下载")
+        base_dir = self.store.current_dir()
+        linked = 0
+        for path, info in manifest['files'].items():
+            parts = archive_member_parts(path)
+            if '/'.join(parts) in extracted:
+                continue
+            source = os.path.join(base_dir, *parts)
+            # 大小相同的文件也可能已被修改（如被杀毒软件修复或手动替换），按清单中的 SHA-256 确认
+            if (os.path.getsize(source) != info['size']
+                    or ('sha256' in info and UpdateChecker._file_sha256(source) != info['sha256'])):
+                raise ValueError(f"当前版本中的 {path} 已被修改，请下载完整安装包")
+            target = os.path.join(staging, *parts)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+            linked += 1
+        return linked
+
+
 class UpdateChecker:
     """
     检查项目更新的类，逻辑与原版保持一致，但将I/O操作改为回调
     """
 
     def __init__(self, log_callback, progress_callback, debug_mode=False, mirror_only=False,
-                 version_type=VersionType.PYINSTALLER):
+                 version_type=VersionType.PYINSTALLER, cache_ttl=DEFAULT_RELEASE_CACHE_TTL,
+                 download_segments=DEFAULT_DOWNLOAD_SEGMENTS, min_download_speed=DEFAULT_MIN_DOWNLOAD_SPEED,
+                 bandwidth_limit=0, side_by_side=True, versions_disk_budget=DEFAULT_VERSIONS_DISK_BUDGET,
+                 endpoints: Optional[Dict[str, str]] = None):
         self.debug_mode = debug_mode
+        # 并列安装到 versions/ 下并切换 current 指针，关闭时直接覆盖程序目录中的文件
+        self.side_by_side = side_by_side
+        self.versions_disk_budget = max(0, versions_disk_budget) * 1024 * 1024
+        # 下载限速（KB/s），0 表示不限速
+        self.bandwidth_limit = max(0, bandwidth_limit) * 1024
+        # 低于该速度（KB/s）时切换下载源，0 表示不检测
+        self.min_download_speed = max(0, min_download_speed) * 1024
+        self.cache_ttl = cache_ttl
+        self.download_segments = max(1, int(download_segments))
         self.mirror_only = mirror_only
         self.version_type = version_type
         self.log_callback = log_callback
@@ -89,16 +594,48 @@ class UpdateChecker:
         else:
             self.work_dir = "."
 
-        self.gitee_api_url = "https://gitee.com/api/v5/repos/Bilibili-Supercmd/classroom_lottery/releases"
-        self.github_api_url = "https://api.github.com/repos/trustedinster/classroom_lottery/releases"
-        self.github_mirror_base = "https://gh.gh.supercmd.xin"
+        endpoints = {key: (endpoints or {}).get(key) or default for key, default in DEFAULT_ENDPOINTS.items()}
+        self.gitee_api_url = endpoints['gitee_api_url']
+        self.github_api_url = endpoints['github_api_url']
+        self.github_download_base = endpoints['github_download_base'].rstrip('/')
+        self.github_mirror_base = endpoints['github_mirror_base'].rstrip('/')
 
         self.headers = {
             'User-Agent': 'ClassroomLottery Update Checker'
         }
+        self.session = self._create_session()
+        self.cache_path = os.path.join(self.work_dir, RELEASE_CACHE_FILE)
+        self.cache_lock = threading.Lock()
+        self.release_cache = self._load_release_cache()
+        self.ranking_path = os.path.join(self.work_dir, MIRROR_RANKING_FILE)
+        self.ranking_lock = threading.Lock()
+        # 最近一次检查得到的各源发布列表，用于查找同一安装包在其他源的下载地址
+        self.releases = {'gitee': [], 'github': []}
+        self.versions = VersionStore(self.work_dir)
 
         self.setup_logging()
 
+    def _create_session(self) -> requests.Session:
+        """
+        创建共享的 HTTP 会话：复用 TCP/TLS 连接（keep-alive），
+        对连接错误和 429/5xx 响应按指数退避自动重试
+        """
+        session = requests.Session()
+        session.headers.update(self.headers)
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=2,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=8)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
     def setup_logging(self):
         """设置日志记录"""
         log_dir = os.path.join(self.work_dir, 'logs')
@@ -136,33 +673,120 @@ class UpdateChecker:
                 return -1
         return 0
 
-    def get_gitee_releases(self) -> Optional[List[Dict]]:
+    # ---------- 发布信息缓存 ----------
+    def _load_release_cache(self) -> dict:
         try:
-            params = {'page': 1, 'per_page': 20, 'direction': 'asc'}
-            response = requests.get(self.gitee_api_url, params=params, timeout=10)
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_release_cache(self):
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.release_cache, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.logger.warning(f"保存发布信息缓存失败: {e}")
+
+    def _get_json_cached(self, source: str, url: str, params: dict, force: bool = False):
+        """
+        带缓存的 GET 请求
+        1. 缓存未过期（TTL 内）且非强制刷新时直接返回缓存，不发请求
+        2. 否则携带 If-None-Match / If-Modified-Since 发起条件请求，304 时沿用缓存并刷新时间
+        3. 200 时更新缓存
+        """
+        key = url + '?' + '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+        with self.cache_lock:
+            entry = self.release_cache.get(key)
+        now = time.time()
+        if entry and not force and now - entry.get('fetched_at', 0) < self.cache_ttl:
+            self._log(f"{source} 使用缓存的发布信息（{now - entry['fetched_at']:.0f} 秒前获取）")
+            return entry['body']
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self.session.get(url, params=params, headers=headers, timeout=10)
+        if response.status_code == 304 and entry:
+            self._log(f"{source} 发布信息未变化 (304)")
+            entry['fetched_at'] = now
+        else:
             response.raise_for_status()
-            return response.json()
+            entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': now,
+                'body': response.json(),
+            }
+        with self.cache_lock:
+            self.release_cache[key] = entry
+            self._save_release_cache()
+        return entry['body']
+
+    def get_gitee_releases(self, force: bool = False) -> Optional[List[Dict]]:
+        try:
+            params = {'page': 1, 'per_page': 20, 'direction': 'asc'}
+            return self._get_json_cached('gitee', self.gitee_api_url, params, force)
         except Exception as e:
             self._log(f"从Gitee获取更新信息失败: {e}")
             return None
 
-    def get_github_releases(self) -> Optional[List[Dict]]:
+    def get_github_releases(self, force: bool = False) -> Optional[List[Dict]]:
         try:
             params = {'page': 1, 'per_page': 20, 'direction': 'desc'}
-            response = requests.get(self.github_api_url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json_cached('github', self.github_api_url, params, force)
         except Exception as e:
             self._log(f"从GitHub获取更新信息失败: {e}")
             return None
 
-    def get_all_releases(self) -> tuple:
-        gitee_releases = self.get_gitee_releases()
-        github_releases = self.get_github_releases()
-        return gitee_releases, github_releases
-
-    def get_best_update_source(self) -> Optional[Dict]:
-        gitee_releases, github_releases = self.get_all_releases()
+    def _timed_fetch(self, source: str, force: bool = False) -> Optional[List[Dict]]:
+        """查询单个源并记录耗时"""
+        fetch = self.get_gitee_releases if source == 'gitee' else self.get_github_releases
+        start = time.perf_counter()
+        releases = fetch(force)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        status = "成功" if releases is not None else "失败"
+        self._log(f"{source} 更新源查询{status}，耗时 {elapsed_ms:.0f} ms")
+        return releases
+
+    def get_all_releases(self, grace: float = SOURCE_RACE_GRACE, force: bool = False) -> tuple:
+        """
+        并发查询 Gitee 和 GitHub
+        第一个有效结果到达后最多再等待 grace 秒，慢的源不再拖住整个检查流程，
+        超时未返回的源视为无结果
+        """
+        sources = ('gitee', 'github')
+        results = {source: None for source in sources}
+        executor = ThreadPoolExecutor(max_workers=len(sources))
+        futures = {executor.submit(self._timed_fetch, source, force): source for source in sources}
+        pending = set(futures)
+        deadline = None
+        try:
+            while pending:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    for future in pending:
+                        self._log(f"{futures[future]} 更新源响应过慢，先使用已获取的结果")
+                    break
+                for future in done:
+                    releases = future.result()
+                    results[futures[future]] = releases
+                    if releases and deadline is None:
+                        deadline = time.monotonic() + grace
+        finally:
+            executor.shutdown(wait=False)
+        return results['gitee'], results['github']
+
+    def get_best_update_source(self, force: bool = False) -> Optional[Dict]:
+        gitee_releases, github_releases = self.get_all_releases(force=force)
+        self.releases = {'gitee': gitee_releases or [], 'github': github_releases or []}
         best_source = None
 
         if gitee_releases:
@@ -187,7 +811,12 @@ class UpdateChecker:
         stable_releases = [release for release in releases if not release.get('prerelease', False)]
         if not stable_releases:
             return None
-        return stable_releases[0]
+        latest = stable_releases[0]
+        # 标签名会用作安装包文件名和版本目录名
+        if 'tag_name' in latest and not is_valid_version_name(latest['tag_name']):
+            self._log(f"忽略版本号无效的发布: {latest['tag_name']!r}")
+            return None
+        return latest
 
     def is_newer_version(self, latest_version: str) -> bool:
         return self._compare_versions(latest_version, THIS_VERSION) > 0
@@ -228,50 +857,623 @@ class UpdateChecker:
 
         return None
 
+    def package_filename(self, tag_name: str) -> str:
+        """本地保存安装包使用的文件名"""
+        version_suffix = "nuitka" if self.version_type == VersionType.NUITKA else "pyinstaller"
+        return f"classroom_lottery_{version_suffix}_{tag_name}.zip"
+
+    def load_ready_update(self) -> Optional[Dict]:
+        """
+        读取后台已下载好的更新；文件已不存在或版本不比当前新时清除记录并返回 None
+        """
+        path = os.path.join(self.work_dir, UPDATE_READY_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                ready = json.load(f)
+            if (os.path.exists(os.path.join(self.work_dir, ready['filename']))
+                    and self.is_newer_version(ready['tag_name'])):
+                return ready
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self.clear_ready_update()
+        return None
+
+    def mark_update_ready(self, release: Dict, filename: str):
+        ready = {
+            'tag_name': release['tag_name'],
+            'filename': filename,
+            'version_type': self.version_type.value,
+            'downloaded_at': time.time(),
+        }
+        path = os.path.join(self.work_dir, UPDATE_READY_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(ready, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def clear_ready_update(self):
+        path = os.path.join(self.work_dir, UPDATE_READY_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def is_github_url(self, url: str) -> bool:
+        return url.startswith(self.github_download_base + '/')
+
     def convert_to_mirror_url(self, url: str) -> str:
-        if "github.com" in url:
-            return url.replace("https://github.com", self.github_mirror_base)
+        if self.is_github_url(url):
+            return self.github_mirror_base + url[len(self.github_download_base):]
         return url
 
-    def download_with_progress(self, url: str, filename: str) -> bool:
-        filepath = os.path.join(self.work_dir, filename)
-
-        if self.mirror_only and "github.com" in url:
-            self._log("使用镜像站下载...")
-            url = self.convert_to_mirror_url(url)
-            return self._perform_download(url, filepath, filename)
+    def fetch_expected_sha256(self, release: Dict, download_url: str) -> Optional[str]:
+        """
+        从发布的校验文件中读取安装包的 SHA-256
+        Returns:
+            小写十六进制哈希值；该版本未发布校验文件时返回 None
+        Raises:
+            校验文件存在但无法下载或没有该安装包的记录时抛出异常
+        """
+        asset_name = download_url.rsplit('/', 1)[-1]
+        assets = self._release_assets(release)
+        for name in (asset_name + CHECKSUM_SUFFIX,) + CHECKSUM_MANIFEST_NAMES:
+            if name not in assets:
+                continue
+            expected = self._parse_checksum(self._fetch(assets[name]).decode('utf-8-sig'), asset_name)
+            if expected is None:
+                raise ValueError(f"校验文件 {name} 中没有 {asset_name} 的记录")
+            self._log(f"已获取校验文件: {name}")
+            return expected
+        self._log("该版本未发布校验文件，跳过完整性校验")
+        return None
 
-        self._log(f"开始下载: {filename}")
-        success = self._perform_download(url, filepath, filename)
+    @staticmethod
+    def _parse_checksum(text: str, asset_name: str) -> Optional[str]:
+        """解析 sha256sum 格式（"哈希  文件名"，文件名前可带 *），单独一个哈希值时视为该安装包的哈希"""
+        lines = [line.split() for line in text.splitlines() if line.strip()]
+        for parts in lines:
+            if not re.fullmatch(r'[0-9a-fA-F]{64}', parts[0]):
+                continue
+            if len(parts) == 1 and len(lines) == 1:
+                return parts[0].lower()
+            if len(parts) >= 2 and parts[-1].lstrip('*') == asset_name:
+                return parts[0].lower()
+        return None
 
-        if not success and "github.com" in url:
-            self._log("尝试使用镜像站下载...")
+    @staticmethod
+    def _release_assets(release: Dict) -> Dict[str, str]:
+        """{文件名: 下载地址}"""
+        return {asset['name']: asset['browser_download_url'] for asset in release.get('assets') or []
+                if 'name' in asset and 'browser_download_url' in asset}
+
+    def _fetch(self, url: str) -> bytes:
+        """下载发布中的小文件（校验文件、文件清单），GitHub 地址失败时改用镜像站"""
+        urls = [url]
+        if self.is_github_url(url):
             mirror_url = self.convert_to_mirror_url(url)
-            success = self._perform_download(mirror_url, filepath, filename)
+            urls = [mirror_url] if self.mirror_only else [url, mirror_url]
+        last_error = None
+        for candidate in urls:
+            for attempt in range(FETCH_RETRIES):
+                try:
+                    response = self.session.get(candidate, timeout=(10, 30))
+                    response.raise_for_status()
+                    return response.content
+                except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+                    last_error = e
+                    if attempt + 1 < FETCH_RETRIES:
+                        time.sleep(0.5 * (attempt + 1))
+                except requests.RequestException as e:
+                    last_error = e
+                    break
+        raise last_error
+
+    def download_update(self, url: str, filename: str, release: Optional[Dict] = None) -> Optional[str]:
+        """
+        下载更新：发布了文件清单时优先增量更新，否则（或增量失败时）下载完整安装包
+        Returns:
+            待安装的压缩包文件名，失败返回 None
+        """
+        urls = self.select_download_urls(url, release)
+        if release is not None:
+            delta_filename = self.download_delta(urls[0], filename, release)
+            if delta_filename:
+                return delta_filename
+        return filename if self.download_with_progress(url, filename, release, urls=urls) else None
+
+    def download_with_progress(self, url: str, filename: str, release: Optional[Dict] = None,
+                               urls: Optional[List[str]] = None) -> bool:
+        """
+        下载安装包：依次尝试按速度排好序的下载地址，失败或速度过低时换下一个地址，
+        已下载的部分在各地址之间续传；传入 release 时按发布的校验文件校验，不一致的文件不会保存为正式文件名
+        """
+        filepath = os.path.join(self.work_dir, filename)
 
-        return success
+        expected_sha256 = None
+        if release is not None:
+            try:
+                expected_sha256 = self.fetch_expected_sha256(release, url)
+            except Exception as e:
+                self._log(f"获取校验文件失败: {e}")
+                return False
 
-    def _perform_download(self, url: str, filepath: str, filename: str) -> bool:
-        try:
-            response = requests.get(url, stream=True)
+        if urls is None:
+            urls = self.select_download_urls(url, release)
+        for index, candidate in enumerate(urls):
+            self._log(f"开始下载: {filename} ({urlparse(candidate).netloc})")
+            # 最后一个地址不再因速度慢而放弃
+            min_speed = self.min_download_speed if index < len(urls) - 1 else 0
+            if self._perform_download(candidate, filepath, filename, expected_sha256, min_speed):
+                return True
+            if index < len(urls) - 1:
+                self._log("切换到下一个下载源...")
+        return False
+
+    def candidate_download_urls(self, url: str, release: Optional[Dict] = None) -> List[str]:
+        """
+        同一安装包的所有下载地址：原地址、其他源中同一版本的同名文件，以及 GitHub 地址对应的镜像站地址；
+        mirror_only 时不直接访问 GitHub
+        """
+        asset_name = url.rsplit('/', 1)[-1]
+        sources = [url]
+        if release is not None:
+            for releases in self.releases.values():
+                for other in releases:
+                    if other.get('tag_name') == release.get('tag_name'):
+                        other_url = self._release_assets(other).get(asset_name)
+                        if other_url:
+                            sources.append(other_url)
+        urls = []
+        for source in sources:
+            if self.is_github_url(source):
+                candidates = [self.convert_to_mirror_url(source)]
+                if not self.mirror_only:
+                    candidates.insert(0, source)
+            else:
+                candidates = [source]
+            urls.extend(candidate for candidate in candidates if candidate not in urls)
+        return urls
+
+    def select_download_urls(self, url: str, release: Optional[Dict] = None) -> List[str]:
+        """
+        并发探测所有下载地址，按耗时从快到慢排序；探测失败的地址排在最后，按磁盘上保存的历史排名排序
+        """
+        urls = self.candidate_download_urls(url, release)
+        if len(urls) == 1:
+            return urls
+
+        results = {}
+        executor = ThreadPoolExecutor(max_workers=len(urls))
+        futures = {executor.submit(self._probe_latency, candidate): candidate for candidate in urls}
+        done, _ = wait(futures, timeout=PROBE_TIMEOUT + 1)
+        executor.shutdown(wait=False)
+        for future, candidate in futures.items():
+            try:
+                results[candidate] = future.result(timeout=0) if future in done else None
+            except Exception:
+                results[candidate] = None
+
+        # 文件大小与多数地址不一致的视为不同的文件（如镜像站缓存了旧版本）
+        sizes = [size for _, size in filter(None, results.values())]
+        expected_size = max(set(sizes), key=sizes.count) if sizes else None
+        for candidate, result in results.items():
+            if result and result[1] != expected_size:
+                self._log(f"{urlparse(candidate).netloc} 上的文件大小不一致，已忽略")
+                results[candidate] = None
+
+        with self.ranking_lock:
+            ranking = self._load_ranking()
+            for candidate, result in results.items():
+                self._update_ranking(ranking, candidate, result[0] if result else None)
+            self._save_ranking(ranking)
+
+        def sort_key(candidate):
+            if results[candidate]:
+                return 0, results[candidate][0]
+            return 1, ranking.get(urlparse(candidate).netloc, {}).get('seconds', float('inf'))
+
+        ordered = sorted(urls, key=sort_key)
+        self._log("下载源测速: " + ", ".join(
+            f"{urlparse(candidate).netloc} "
+            + (f"{results[candidate][0] * 1000:.0f} ms" if results[candidate] else "失败")
+            for candidate in ordered))
+        return ordered
+
+    def _probe_latency(self, url: str) -> tuple:
+        """
+        请求文件开头的 PROBE_BYTES 字节，返回 (耗时秒数, 文件总大小)
+        耗时包括重定向、建立连接和传输，能同时反映延迟和带宽
+        """
+        start = time.monotonic()
+        headers = {'Range': f'bytes=0-{PROBE_BYTES - 1}'}
+        with self.session.get(url, headers=headers, stream=True, timeout=(PROBE_TIMEOUT, PROBE_TIMEOUT)) as response:
             response.raise_for_status()
-            total_size = int(response.headers.get('content-length', 0))
+            received = 0
+            for chunk in response.iter_content(chunk_size=PROBE_BYTES):
+                received += len(chunk)
+                # 服务器忽略 Range 返回完整文件时，读够 PROBE_BYTES 即停止，剩余内容随连接关闭丢弃
+                if received >= PROBE_BYTES:
+                    break
+                if time.monotonic() - start > PROBE_TIMEOUT:
+                    raise IOError("探测超时")
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rsplit('/', 1)[1] if '/' in content_range else response.headers.get('content-length')
+        return time.monotonic() - start, int(total) if total and total.isdigit() else None
+
+    def _load_ranking(self) -> dict:
+        try:
+            with open(self.ranking_path, 'r', encoding='utf-8') as f:
+                ranking = json.load(f)
+            return ranking if isinstance(ranking, dict) else {}
+        except (OSError, ValueError):
+            return {}
 
-            with open(filepath, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        size = file.write(chunk)
-                        if self.progress_callback:
-                            current_pos = file.tell()
-                            self.progress_callback(current_pos, total_size)
+    def _save_ranking(self, ranking: dict):
+        try:
+            tmp_path = self.ranking_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(ranking, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.ranking_path)
+        except OSError as e:
+            self._log(f"保存下载源排名失败: {e}")
 
-            self._log("下载完成!")
+    @staticmethod
+    def _update_ranking(ranking: dict, url: str, seconds: Optional[float]):
+        """
+        按主机记录下载 PROBE_BYTES 字节所需的时间（指数加权平均），失败时记一次失败并加倍耗时
+        """
+        entry = ranking.setdefault(urlparse(url).netloc, {'seconds': None, 'failures': 0})
+        if seconds is None:
+            entry['failures'] = entry.get('failures', 0) + 1
+            if entry.get('seconds') is not None:
+                entry['seconds'] = entry['seconds'] * 2
+        else:
+            previous = entry.get('seconds')
+            entry['seconds'] = seconds if previous is None else 0.5 * seconds + 0.5 * previous
+            entry['failures'] = 0
+        entry['updated_at'] = time.time()
+
+    def _record_transfer(self, url: str, speed: Optional[float]):
+        """把实际下载的速度（None 表示失败）计入排名，下次探测失败时作为排序依据"""
+        seconds = PROBE_BYTES / speed if speed is not None else None
+        with self.ranking_lock:
+            ranking = self._load_ranking()
+            self._update_ranking(ranking, url, seconds)
+            self._save_ranking(ranking)
+
+    def _perform_download(self, url: str, filepath: str, filename: str,
+                          expected_sha256: Optional[str] = None, min_speed: float = 0) -> bool:
+        """
+        下载文件：服务器支持 Range 时写入 .part 文件并可断点续传、分段并行，
+        否则退回整体下载；写入的同时计算 SHA-256，校验通过后才改为正式文件名。
+        min_speed 大于 0 时，速度持续低于该值（字节/秒）会中止下载，由调用方换下载源
+        """
+        try:
+            total_size, supports_range = self._probe_download(url)
+            download = PartialDownload(filepath, total_size, TransferMeter(self.progress_callback))
+            download.min_speed = min_speed / max(1, self.download_segments)
+            download.rate_limit = self.bandwidth_limit / max(1, self.download_segments)
+            if supports_range and total_size > 0:
+                digest = self._download_ranges(url, download)
+            else:
+                self._log("服务器不支持断点续传，整体下载")
+                digest = self._download_whole(url, download)
+            if digest is None:
+                self._record_transfer(url, None)
+                return False
+            if download.meter.speed > 0:
+                self._record_transfer(url, download.meter.speed)
+            if expected_sha256 and digest != expected_sha256:
+                # 进度一并删除，避免下次在损坏的数据上续传
+                download.discard()
+                self._log(f"SHA-256 校验失败，已删除下载的文件: 期望 {expected_sha256}，实际 {digest}")
+                return False
+            download.finish()
+            self._log("下载完成，SHA-256 校验通过!" if expected_sha256 else "下载完成!")
+            self._log(f"SHA-256: {digest}")
             return True
         except Exception as e:
             self._log(f"下载失败: {e}")
+            self._record_transfer(url, None)
             return False
 
-    def extract_and_install(self, zip_filename: str) -> bool:
+    def _probe_download(self, url: str) -> tuple:
+        """
+        用 Range: bytes=0-0 请求探测文件大小和是否支持断点续传
+        不使用 HEAD：GitHub 发布文件会重定向到只允许 GET 的签名地址
+        Returns:
+            (文件总大小, 是否支持 Range)
+        """
+        response = self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=(10, 30))
+        try:
+            response.raise_for_status()
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                if total.isdigit():
+                    return int(total), True
+            return int(response.headers.get('content-length', 0)), False
+        finally:
+            response.close()
+
+    def _download_ranges(self, url: str, download: PartialDownload) -> Optional[str]:
+        """分段下载到 .part 文件，全部完成时返回 SHA-256，未完成时保存进度并返回 None"""
+        total_size = download.total
+        if download.plan(self.download_segments):
+            self._log(f"继续上次的下载，已完成 {download.downloaded / total_size:.0%}")
+        pending = [segment for segment in download.segments if segment[2] <= segment[1]]
+        if len(download.segments) > 1:
+            self._log(f"分 {len(download.segments)} 段并行下载，共 {total_size / 1024 / 1024:.1f} MB")
+        download.meter.connections = len(pending)
+        download.meter.update(download.downloaded, total_size)
+
+        errors = []
+        if len(pending) == 1:
+            try:
+                self._download_segment(url, download, pending[0])
+            except Exception as e:
+                errors.append(e)
+        elif pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                futures = [executor.submit(self._download_segment, url, download, segment) for segment in pending]
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(e)
+
+        download.save(force=True)
+        if errors or not download.complete:
+            self._log(f"下载未完成，已保存进度 {download.downloaded / total_size:.0%}，下次可继续: "
+                      f"{errors[0] if errors else '分段不完整'}")
+            return None
+        return download.hexdigest()
+
+    def _download_segment(self, url: str, download: PartialDownload, segment: list):
+        """下载一个分段，连接中断时从已写入的位置重试，每个分段独立计算重试次数"""
+        attempt = 0
+        # 无缓冲写入：进度文件记录的位置不会超前于实际写入磁盘的数据
+        with open(download.part_path, 'r+b', buffering=0) as f:
+            while segment[2] <= segment[1]:
+                position = segment[2]
+                try:
+                    headers = {'Range': f'bytes={segment[2]}-{segment[1]}'}
+                    with self.session.get(url, headers=headers, stream=True, timeout=(10, 30)) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise IOError(f"服务器未返回分段数据 (HTTP {response.status_code})")
+                        f.seek(segment[2])
+                        for chunk in self._read_chunks(response, download.meter, download.min_speed,
+                                                       download.rate_limit):
+                            if download.cancelled:
+                                raise SlowTransferError("其他分段已切换下载源")
+                            remaining = segment[1] - segment[2] + 1
+                            if remaining <= 0:
+                                break
+                            chunk = chunk[:remaining]
+                            f.write(chunk)
+                            download.advance(segment, chunk)
+                    if segment[2] <= segment[1]:
+                        raise IOError("连接提前关闭")
+                except SlowTransferError:
+                    download.cancelled = True
+                    raise
+                except (requests.RequestException, IOError) as e:
+                    # 本次连接有进展时重新计数，只有连续失败才会耗尽重试次数
+                    if segment[2] > position:
+                        attempt = 0
+                    attempt += 1
+                    if attempt > SEGMENT_RETRIES:
+                        raise
+                    delay = 0.5 * (2 ** (attempt - 1))
+                    self._log(f"分段 {segment[0]}-{segment[1]} 下载中断: {e}，"
+                              f"{delay:.1f} 秒后从 {segment[2]} 继续 ({attempt}/{SEGMENT_RETRIES})")
+                    time.sleep(delay)
+
+    def _download_whole(self, url: str, download: PartialDownload) -> Optional[str]:
+        """整体下载到 .part 文件，返回 SHA-256"""
+        hasher = hashlib.sha256()
+        with self.session.get(url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            total_size = int(response.headers.get('content-length', 0))
+            written = 0
+            download.meter.update(0, total_size)
+            with open(download.part_path, 'wb') as file:
+                for chunk in self._read_chunks(response, download.meter, download.min_speed,
+                                               download.rate_limit):
+                    file.write(chunk)
+                    hasher.update(chunk)
+                    written += len(chunk)
+                    download.meter.update(written, total_size)
+        if total_size and written != total_size:
+            raise IOError(f"连接提前关闭，只收到 {written}/{total_size} 字节")
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _read_chunks(response, meter: Optional[TransferMeter], min_speed: float = 0, rate_limit: float = 0):
+        """
+        按传输速度决定每次读取的大小；底层连接错误转换为 requests 异常以便统一重试。
+        min_speed 大于 0 时，每 SLOW_CHECK_WINDOW 秒检查一次本连接的平均速度，过低时抛出 SlowTransferError；
+        rate_limit 大于 0 时，读取超前于限速就暂停
+        """
+        start = window_start = time.monotonic()
+        received = window_bytes = 0
+        while True:
+            try:
+                chunk = response.raw.read(meter.chunk_size if meter else DOWNLOAD_CHUNK_SIZE,
+                                          decode_content=True)
+            except Urllib3Error as e:
+                raise requests.ConnectionError(e)
+            if not chunk:
+                return
+            if min_speed:
+                window_bytes += len(chunk)
+                elapsed = time.monotonic() - window_start
+                if elapsed >= SLOW_CHECK_WINDOW:
+                    if window_bytes / elapsed < min_speed:
+                        raise SlowTransferError(f"下载速度 {window_bytes / elapsed / 1024:.1f} KB/s "
+                                                f"低于下限 {min_speed / 1024:.1f} KB/s")
+                    window_start, window_bytes = time.monotonic(), 0
+            if rate_limit:
+                received += len(chunk)
+                ahead = received / rate_limit - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+            yield chunk
+
+    def download_delta(self, url: str, filename: str, release: Dict) -> Optional[str]:
+        """
+        增量更新：对比发布的文件清单与本地安装，从完整安装包中只取回有变化的文件，
+        打包为 <文件名>.delta.zip 供 extract_and_install 安装
+        Returns:
+            增量包文件名；未发布清单、服务器不支持 Range、变化过多或出错时返回 None
+        """
+        asset_name = url.rsplit('/', 1)[-1]
+        manifest_url = self._release_assets(release).get(asset_name + MANIFEST_SUFFIX)
+        if not manifest_url:
+            return None
+        try:
+            files = json.loads(self._fetch(manifest_url).decode('utf-8-sig'))['files']
+            changed = self._find_changed_files(files)
+            self._log(f"文件清单共 {len(files)} 个文件，其中 {len(changed)} 个与本地不同")
+            if self.mirror_only and self.is_github_url(url):
+                url = self.convert_to_mirror_url(url)
+            return self._download_delta_files(url, filename, files, changed, self.versions.current())
+        except Exception as e:
+            self._log(f"增量更新失败，改为完整下载: {e}")
+            return None
+
+    def _find_changed_files(self, files: Dict[str, Dict]) -> List[str]:
+        """返回当前版本中缺失或内容不同的文件；大小不同的文件无需计算哈希"""
+        base_dir = self.versions.current_dir()
+        changed = []
+        for path, info in files.items():
+            local_path = os.path.join(base_dir, *path.split('/'))
+            try:
+                if (os.path.getsize(local_path) == info['size']
+                        and self._file_sha256(local_path) == info['sha256']):
+                    continue
+            except OSError:
+                pass
+            changed.append(path)
+        return changed
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def _download_delta_files(self, url: str, filename: str, files: Dict[str, Dict],
+                              changed: List[str], base: Optional[str] = None) -> Optional[str]:
+        total_size, supports_range = self._probe_download(url)
+        if not supports_range or total_size <= 0:
+            self._log("服务器不支持 Range 请求，无法增量更新")
+            return None
+
+        # 在与安装包等大的稀疏文件中只填入中央目录和有变化的文件，zipfile 可直接从中解压这些文件
+        sparse = PartialDownload(os.path.join(self.work_dir, filename + '.delta'), total_size, verify=False)
+        sparse.rate_limit = self.bandwidth_limit / max(1, self.download_segments)
+        with open(sparse.part_path, 'wb') as f:
+            f.truncate(total_size)
+        try:
+            tail_start = max(0, total_size - ZIP_TAIL_SIZE)
+            self._fetch_ranges(url, sparse, [(tail_start, total_size - 1)])
+            cd_offset = self._central_directory_offset(sparse.part_path, tail_start)
+            if cd_offset < tail_start:
+                self._fetch_ranges(url, sparse, [(cd_offset, tail_start - 1)])
+
+            with zipfile.ZipFile(sparse.part_path) as archive:
+                infos = {info.filename.replace('\\', '/'): info for info in archive.infolist()}
+            missing = [path for path in changed if path not in infos]
+            if missing:
+                raise ValueError(f"安装包中缺少清单记录的文件: {missing[0]}")
+
+            # 每个文件的数据从其本地文件头开始，到下一个文件头（或中央目录）之前结束
+            offsets = sorted(info.header_offset for info in infos.values()) + [cd_offset]
+            ranges = []
+            for start in sorted(infos[path].header_offset for path in changed):
+                end = offsets[bisect.bisect_right(offsets, start)] - 1
+                if ranges and start - ranges[-1][1] <= DELTA_RANGE_GAP:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((start, end))
+            needed = sum(end - start + 1 for start, end in ranges)
+            self._log(f"增量更新需下载 {needed / 1024 / 1024:.1f} MB，完整安装包 {total_size / 1024 / 1024:.1f} MB")
+            if needed > total_size * DELTA_MAX_RATIO:
+                self._log("变化的文件较多，改为下载完整安装包")
+                return None
+            sparse.meter = TransferMeter(self.progress_callback, total=needed)
+            if ranges:
+                self._fetch_ranges(url, sparse, ranges)
+
+            delta_filename = os.path.splitext(filename)[0] + '.delta.zip'
+            self._write_delta_archive(sparse.part_path, infos, files, changed,
+                                      os.path.join(self.work_dir, delta_filename), base)
+            self._log(f"增量包已生成: {delta_filename}，包含 {len(changed)} 个文件")
+            return delta_filename
+        finally:
+            sparse.discard()
+
+    def _fetch_ranges(self, url: str, download: PartialDownload, ranges: list):
+        """把若干字节区间下载到 download 的 .part 文件中对应位置"""
+        download.segments = [[start, end, start] for start, end in ranges]
+        if download.meter:
+            download.meter.connections = min(self.download_segments, len(ranges))
+        if len(ranges) == 1 or self.download_segments == 1:
+            for segment in download.segments:
+                self._download_segment(url, download, segment)
+            return
+        with ThreadPoolExecutor(max_workers=min(self.download_segments, len(ranges))) as executor:
+            for future in [executor.submit(self._download_segment, url, download, segment)
+                           for segment in download.segments]:
+                future.result()
+
+    @staticmethod
+    def _central_directory_offset(path: str, tail_start: int) -> int:
+        """从 zip 末尾的目录结束记录（含 ZIP64）中读取中央目录的起始位置"""
+        with open(path, 'rb') as f:
+            f.seek(tail_start)
+            tail = f.read()
+        index = tail.rfind(b'PK\x05\x06')
+        if index < 0:
+            raise ValueError("未找到 zip 目录结束记录")
+        cd_offset = struct.unpack('<I', tail[index + 16:index + 20])[0]
+        if cd_offset == 0xFFFFFFFF:
+            locator = tail.rfind(b'PK\x06\x07', 0, index)
+            if locator < 0:
+                raise ValueError("未找到 ZIP64 目录结束记录")
+            record = struct.unpack('<Q', tail[locator + 8:locator + 16])[0] - tail_start
+            if record < 0 or tail[record:record + 4] != b'PK\x06\x06':
+                raise ValueError("ZIP64 目录结束记录无效")
+            cd_offset = struct.unpack('<Q', tail[record + 48:record + 56])[0]
+        return cd_offset
+
+    def _write_delta_archive(self, source_path: str, infos: Dict, files: Dict[str, Dict],
+                             changed: List[str], target_path: str, base: Optional[str] = None):
+        """
+        逐个解压有变化的文件并按清单校验 SHA-256，写入增量包；
+        完整文件清单和对比时的当前版本一并写入，并列安装时据此沿用未变化的文件
+        """
+        tmp_path = target_path + '.tmp'
+        with zipfile.ZipFile(source_path) as archive, \
+                zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as delta:
+            delta.writestr(DELTA_MANIFEST_MEMBER, json.dumps({'base': base, 'files': files}, ensure_ascii=False))
+            for path in changed:
+                hasher = hashlib.sha256()
+                info = zipfile.ZipInfo(path, date_time=infos[path].date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(infos[path]) as src, delta.open(info, 'w') as dst:
+                    for block in iter(lambda: src.read(1024 * 1024), b''):
+                        hasher.update(block)
+                        dst.write(block)
+                if hasher.hexdigest() != files[path]['sha256']:
+                    raise ValueError(f"{path} 的 SHA-256 与文件清单不一致")
+        os.replace(tmp_path, target_path)
+
+    def extract_and_install(self, zip_filename: str, version: Optional[str] = None) -> bool:
+        """
+        安装更新包：给出版本号且启用并列安装时解压为新版本并切换指针，否则覆盖安装到程序目录
+        """
         try:
             zip_filepath = os.path.join(self.work_dir, zip_filename)
 
@@ -279,96 +1481,166 @@ class UpdateChecker:
                 self._log(f"找不到文件: {zip_filename}")
                 return False
 
-            self._log(f"开始解压: {zip_filename}")
-
-            temp_dir = os.path.join(self.work_dir, "temp_extract")
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            os.makedirs(temp_dir)
-
-            with zipfile.ZipFile(zip_filepath, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            self._log("解压完成，准备创建批处理脚本进行替换...")
-            
-            # 创建批处理脚本来替换文件
-            bat_content = self._create_update_bat(temp_dir)
-            bat_path = os.path.join(self.work_dir, "update_files.bat")
-            
-            with open(bat_path, "w", encoding="utf-8") as f:
-                f.write(bat_content)
-            
-            self._log("批处理脚本已创建，执行脚本进行更新...")
-            
-            # 执行批处理脚本
-            import subprocess
-            result = subprocess.run([bat_path], shell=True, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                self._log("批处理脚本执行成功!")
-                
-                # 清理临时文件
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                
-                # 删除批处理脚本
-                if os.path.exists(bat_path):
-                    os.remove(bat_path)
-                
-                self._log("安装完成!")
-                return True
+            self._log(f"开始安装: {zip_filename}")
+            if self.side_by_side and version:
+                VersionedInstaller(zip_filepath, self.versions, version,
+                                   self.versions_disk_budget, self._log).install()
             else:
-                self._log(f"批处理脚本执行失败: {result.stderr}")
-                return False
-                
+                installer = AtomicInstaller(zip_filepath, self.work_dir, self._log)
+                if not installer.install():
+                    return False
+            self.clear_ready_update()
+
+            self._log("安装完成!")
+            return True
+
         except Exception as e:
             self._log(f"安装失败: {e}")
             return False
 
-    def _create_update_bat(self, temp_dir: str) -> str:
-        """创建批处理脚本来更新文件，特别是处理_internal目录中的文件"""
-        
-        # 收集需要替换的文件
-        update_commands = []
-        
-        # 遍历临时目录中的所有文件
-        for root, dirs, files in os.walk(temp_dir):
-            rel_path = os.path.relpath(root, temp_dir)
-            
-            for file in files:
-                src_file = os.path.join(root, file).replace("/", "\\").replace("\\\\", "\\")
-                
-                # 计算目标路径
-                if rel_path != ".":
-                    dest_dir = os.path.join(self.work_dir, rel_path).replace("/", "\\").replace("\\\\", "\\")
-                    dest_file = os.path.join(dest_dir, file).replace("/", "\\").replace("\\\\", "\\")
-                else:
-                    dest_dir = self.work_dir.replace("/", "\\").replace("\\\\", "\\")
-                    dest_file = os.path.join(dest_dir, file).replace("/", "\\").replace("\\\\", "\\")
-                
-                # 确保目标目录存在
-                update_commands.append(f'if not exist "{dest_dir}" mkdir "{dest_dir}"')
-                
-                # 复制文件命令
-                update_commands.append(f'copy /Y "{src_file}" "{dest_file}"')
-        
-        # 构建批处理脚本内容
-        bat_content = "@echo off\n"
-        bat_content += "chcp 65001 >nul\n"  # 设置UTF-8编码
-        bat_content += "echo 开始更新文件...\n\n"
-        
-        for cmd in update_commands:
-            bat_content += cmd + "\n"
-        
-        bat_content += "\necho 文件更新完成!\n"
-        bat_content += "timeout /t 2 /nobreak >nul\n"
-        bat_content += "exit /b 0\n"
-        
-        return bat_content
+    def rollback_version(self) -> bool:
+        """把 current 指针切回上一个版本，已安装的文件不做改动"""
+        current = self.versions.current()
+        try:
+            previous = self.versions.rollback()
+        except (KeyError, ValueError) as e:
+            self._log(f"回滚失败: {e.args[0]}")
+            return False
+        self._log(f"已从版本 {current} 回滚到 {previous or '程序目录中的原始版本'}，重新启动程序后生效")
+        return True
+
+
+# ==================== 后台更新 ====================
+
+def user_idle_seconds() -> Optional[float]:
+    """距离最后一次键盘鼠标输入的秒数，非 Windows 平台返回 None"""
+    if sys.platform != 'win32':
+        return None
+    import ctypes
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [('cbSize', ctypes.c_uint), ('dwTime', ctypes.c_uint)]
+
+    info = LASTINPUTINFO()
+    info.cbSize = ctypes.sizeof(info)
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    return ((ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000.0
+
+
+class UpdateAgent:
+    """
+    后台更新代理，由启动器在运行抽号程序时以 --agent 启动，抽号程序退出后随之退出
+    以低优先级运行，首次检查前随机等待一段时间，之后按带抖动的间隔检查更新；
+    只在无人操作且 CPU 空闲时检查和下载，下载限速，完成后只记录“可以安装”，不自动安装
+    """
+
+    def __init__(self, checker: UpdateChecker, interval_hours: float):
+        self.checker = checker
+        self.interval = max(0.1, interval_hours) * 3600
+
+    def run(self):
+        from single_instance import InstanceLock, is_running
+        lock = InstanceLock('update_agent')
+        if not lock.acquire():
+            return
+        self._lower_priority()
+        self.checker._log("后台更新代理已启动")
+        try:
+            delay = random.uniform(*AGENT_START_DELAY)
+            while True:
+                if not self._sleep(delay, is_running):
+                    break
+                if not self.machine_idle():
+                    delay = AGENT_IDLE_RETRY
+                    continue
+                try:
+                    self.check_once()
+                except Exception as e:
+                    self.checker._log(f"后台检查更新失败: {e}")
+                delay = self.interval * random.uniform(1 - AGENT_JITTER, 1 + AGENT_JITTER)
+        finally:
+            self.checker._log("抽号程序已退出，后台更新代理退出")
+            lock.release()
+
+    def check_once(self) -> bool:
+        """检查并预下载更新，已下载好或下载成功时返回 True"""
+        best_source = self.checker.get_best_update_source()
+        if not best_source:
+            return False
+        release = best_source['release']
+        tag_name = release['tag_name']
+        ready = self.checker.load_ready_update()
+        if ready and ready['tag_name'] == tag_name:
+            return True
+        url = self.checker.find_download_url(release, tag_name)
+        if not url:
+            self.checker._log(f"新版本 {tag_name} 中没有 {self.checker.version_type.value} 版本的安装包")
+            return False
+        self.checker._log(f"后台下载新版本: {tag_name}")
+        filename = self.checker.download_update(url, self.checker.package_filename(tag_name), release)
+        if not filename:
+            return False
+        self.checker.mark_update_ready(release, filename)
+        self.checker._log(f"新版本 {tag_name} 已下载完成，等待安装: {filename}")
+        return True
+
+    @staticmethod
+    def machine_idle() -> bool:
+        idle = user_idle_seconds()
+        if idle is not None and idle < AGENT_IDLE_INPUT_SECONDS:
+            return False
+        try:
+            import psutil
+            return psutil.cpu_percent(interval=1) < AGENT_IDLE_CPU_PERCENT
+        except ImportError:
+            return True
+
+    @staticmethod
+    def _sleep(seconds: float, is_running) -> bool:
+        """等待指定时间，期间抽号程序（守护进程或主程序）退出时返回 False"""
+        deadline = time.monotonic() + seconds
+        while True:
+            if not (is_running('daemon') or is_running('main')):
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(AGENT_POLL_INTERVAL, remaining))
+
+    @staticmethod
+    def _lower_priority():
+        try:
+            import psutil
+            process = psutil.Process()
+            if sys.platform == 'win32':
+                process.nice(psutil.IDLE_PRIORITY_CLASS)
+                process.ionice(psutil.IOPRIO_VERYLOW)
+            else:
+                process.nice(19)
+                if hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+                    process.ionice(psutil.IOPRIO_CLASS_IDLE)
+        except Exception:
+            pass
 
 
 # ==================== GUI 组件 ====================
 
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds + 0.5)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
 class VersionSelectDialog(QDialog):
     """版本选择对话框"""
 
@@ -444,7 +1716,7 @@ class VersionSelectDialog(QDialog):
 class UpdateWorker(QThread):
     """后台工作线程"""
     log_signal = Signal(str)
-    progress_signal = Signal(int, int)
+    progress_signal = Signal(int, int, float, float)
     check_finished_signal = Signal(object)
     download_finished_signal = Signal(bool, str)
     install_finished_signal = Signal(bool)
@@ -455,17 +1727,18 @@ class UpdateWorker(QThread):
         self.task = None
         self.args = None
 
-    def run_check(self):
+    def run_check(self, force=False):
+        self.args = (force,)
         self.task = "check"
         self.start()
 
-    def run_download(self, url, filename):
-        self.args = (url, filename)
+    def run_download(self, url, filename, release=None):
+        self.args = (url, filename, release)
         self.task = "download"
         self.start()
 
-    def run_install(self, filename):
-        self.args = (filename,)
+    def run_install(self, filename, version=None):
+        self.args = (filename, version)
         self.task = "install"
         self.start()
 
@@ -475,25 +1748,27 @@ class UpdateWorker(QThread):
             return
         try:
             if self.task == "check":
-                result = self.checker.get_best_update_source()
+                force, = self.args
+                result = self.checker.get_best_update_source(force=force)
                 self.check_finished_signal.emit(result)
 
             elif self.task == "download":
-                url, filename = self.args
-                success = self.checker.download_with_progress(url, filename)
-                self.download_finished_signal.emit(success, filename)
+                url, filename, release = self.args
+                result = self.checker.download_update(url, filename, release)
+                self.download_finished_signal.emit(result is not None, result or filename)
 
             elif self.task == "install":
-                filename, = self.args
-                success = self.checker.extract_and_install(filename)
+                filename, version = self.args
+                success = self.checker.extract_and_install(filename, version)
                 self.install_finished_signal.emit(success)
         except Exception as e:
             self.log_signal.emit(f"任务执行出错: {e}")
-            self.progress_signal.emit(0, 0)
+            self.progress_signal.emit(0, 0, 0.0, -1.0)
 
 
 class UpdateWindow(QMainWindow):
-    def __init__(self, debug=False, mirror_only=False, auto_download=False):
+    def __init__(self, debug=False, mirror_only=False, auto_download=False, cache_ttl=None,
+                 download_segments=None, min_download_speed=None):
         super().__init__()
         self.setWindowTitle(f"课堂抽号程序更新工具 v{THIS_VERSION}")
         self.resize(900, 600)
@@ -507,15 +1782,27 @@ class UpdateWindow(QMainWindow):
 
         config = UpdateConfig.load()
         self.version_type = VersionType(config.get('version_type', VersionType.PYINSTALLER.value))
+        if cache_ttl is None:
+            cache_ttl = config.get('release_cache_ttl', DEFAULT_RELEASE_CACHE_TTL)
+        if download_segments is None:
+            download_segments = config.get('download_segments', DEFAULT_DOWNLOAD_SEGMENTS)
+        if min_download_speed is None:
+            min_download_speed = config.get('min_download_speed', DEFAULT_MIN_DOWNLOAD_SPEED)
 
         self.worker = UpdateWorker(checker=None)
 
         self.checker = UpdateChecker(
             log_callback=lambda msg: self.worker.log_signal.emit(msg),
-            progress_callback=lambda cur, total: self.worker.progress_signal.emit(cur, total),
+            progress_callback=lambda cur, total, speed, eta: self.worker.progress_signal.emit(cur, total, speed, eta),
             debug_mode=self.debug_mode,
             mirror_only=self.mirror_only,
-            version_type=self.version_type
+            version_type=self.version_type,
+            cache_ttl=cache_ttl,
+            download_segments=download_segments,
+            min_download_speed=min_download_speed,
+            side_by_side=config.get('side_by_side_install', True),
+            versions_disk_budget=config.get('versions_disk_budget', DEFAULT_VERSIONS_DISK_BUDGET),
+            endpoints=config
         )
 
         self.worker.checker = self.checker
@@ -542,12 +1829,17 @@ class UpdateWindow(QMainWindow):
         self.btn_install.clicked.connect(self.start_install)
         self.btn_install.setEnabled(False)
 
+        self.btn_rollback = QPushButton("回滚版本")
+        self.btn_rollback.clicked.connect(self.start_rollback)
+        self.btn_rollback.setEnabled(False)
+
         self.btn_exit = QPushButton("退出")
         self.btn_exit.clicked.connect(self.close)
 
         btn_layout.addWidget(self.btn_check)
         btn_layout.addWidget(self.btn_download)
         btn_layout.addWidget(self.btn_install)
+        btn_layout.addWidget(self.btn_rollback)
         btn_layout.addWidget(self.btn_exit)
 
         self.lbl_status = QLabel("正在初始化...")
@@ -589,12 +1881,17 @@ class UpdateWindow(QMainWindow):
         sb = self.log_text.verticalScrollBar()
         sb.setValue(sb.maximum())
 
-    def update_progress(self, current, total):
+    def update_progress(self, current, total, speed=0.0, eta=-1.0):
         if total > 0:
             self.progress_bar.setMaximum(total)
             self.progress_bar.setValue(current)
             percent = int((current / total) * 100)
-            self.progress_bar.setFormat(f"{percent}%")
+            text = f"{percent}%"
+            if speed > 0:
+                text += f"  {format_size(speed)}/s"
+            if eta >= 0 and current < total:
+                text += f"  剩余 {format_duration(eta)}"
+            self.progress_bar.setFormat(text)
         else:
             self.progress_bar.setRange(0, 0)
 
@@ -604,15 +1901,18 @@ class UpdateWindow(QMainWindow):
             self.btn_check.setEnabled(False)
             self.btn_download.setEnabled(False)
             self.btn_install.setEnabled(False)
+            self.btn_rollback.setEnabled(False)
         else:
             self.btn_check.setEnabled(True)
+            self.btn_rollback.setEnabled(self.checker.versions.current() is not None)
             if task == "check" and self.current_best_source:
                 self.btn_download.setEnabled(True)
             elif task == "download" and self.current_filename:
                 self.btn_install.setEnabled(True)
 
     def on_check_click(self):
-        self.worker.run_check()
+        # 手动检查时忽略 TTL，但仍使用条件请求，未变化时只需一次 304 往返
+        self.worker.run_check(force=True)
 
     def start_download(self):
         if not self.current_best_source:
@@ -621,10 +1921,9 @@ class UpdateWindow(QMainWindow):
         download_url = self.checker.find_download_url(self.current_best_source['release'], tag_name)
 
         if download_url:
-            version_suffix = "nuitka" if self.checker.version_type == VersionType.NUITKA else "pyinstaller"
-            self.current_filename = f"classroom_lottery_{version_suffix}_{tag_name}.zip"
+            self.current_filename = self.checker.package_filename(tag_name)
             self.lbl_status.setText(f"正在下载: {self.current_filename}")
-            self.worker.run_download(download_url, self.current_filename)
+            self.worker.run_download(download_url, self.current_filename, self.current_best_source['release'])
         else:
             QMessageBox.warning(self, "错误", "未找到合适的下载链接，可能是该版本不包含所选构建类型。")
 
@@ -632,34 +1931,32 @@ class UpdateWindow(QMainWindow):
         if not self.current_filename:
             return
 
-        if not self.debug_mode and os.path.exists("update.exe"):
-            reply = QMessageBox.question(
-                self, '确认安装',
-                "即将启动自我更新流程。\n程序将复制 update.exe 为 update_old.exe 并运行安装。\n完成后请手动重新启动程序。\n\n是否继续?",
-                QMessageBox.Yes | QMessageBox.No
-            )
-            if reply == QMessageBox.Yes:
-                try:
-                    shutil.copy2("update.exe", "update_old.exe")
-                    self.append_log("已复制 update.exe 为 update_old.exe")
-                    import subprocess
-                    # 创建一个批处理脚本来处理更新并在其中启动主程序
-                    update_bat_content = self._create_self_update_bat()
-                    update_bat_path = os.path.join(self.work_dir, "self_update.bat")
-                    
-                    with open(update_bat_path, "w", encoding="utf-8") as f:
-                        f.write(update_bat_content)
-                    
-                    # 启动批处理脚本后退出主程序
-                    subprocess.Popen(["cmd", "/c", "start", "cmd", "/c", f'"{update_bat_path}"'])
-                    self.append_log("已启动更新安装程序，主程序即将退出。")
-                    QTimer.singleShot(2000, QApplication.quit)
-                except Exception as e:
-                    QMessageBox.critical(self, "错误", f"启动更新失败: {e}")
-            else:
-                self.worker.run_install(self.current_filename)
+        if self.checker.side_by_side and self.current_best_source:
+            # 新版本解压到单独的目录，正在运行的程序不受影响
+            message = "即将安装更新，新版本会安装到单独的目录，重新启动程序后生效；\n如有问题可点击“回滚版本”切换回当前版本。\n\n是否继续?"
+        elif not self.debug_mode and os.path.exists("update.exe"):
+            # 安装器通过改名替换文件，正在运行的 update.exe 也会被直接替换，无需另起脚本
+            message = "即将安装更新，正在运行的程序文件会被直接替换。\n完成后请手动重新启动程序。\n\n是否继续?"
         else:
-            self.worker.run_install(self.current_filename)
+            message = None
+        if message:
+            reply = QMessageBox.question(self, '确认安装', message, QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        version = self.current_best_source['release']['tag_name'] if self.current_best_source else None
+        self.worker.run_install(self.current_filename, version)
+
+    def start_rollback(self):
+        reply = QMessageBox.question(
+            self, '确认回滚',
+            f"即将从版本 {self.checker.versions.current()} 切换回上一个版本，重新启动程序后生效。\n\n是否继续?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        if self.checker.rollback_version():
+            self.lbl_status.setText("已回滚到上一个版本")
+        self.btn_rollback.setEnabled(self.checker.versions.current() is not None)
 
     def on_check_finished(self, best_source):
         if best_source:
@@ -669,6 +1966,17 @@ class UpdateWindow(QMainWindow):
 
             self.append_log(f"发现新版本: {tag_name}")
 
+            ready = self.checker.load_ready_update()
+            if ready and ready['tag_name'] == tag_name:
+                self.checker.version_type = VersionType(ready['version_type'])
+                self.current_filename = ready['filename']
+                self.lbl_status.setText(f"更新已在后台下载完成: {tag_name}")
+                self.append_log(f"后台已下载好更新: {ready['filename']}，可直接安装")
+                self.btn_install.setEnabled(True)
+                if 'body' in release and release['body']:
+                    self.append_log("更新内容:\n" + release['body'])
+                return
+
             # 检测可用性：遍历 assets 查看是否有 nuitka 或 pyinstaller 关键字
             assets = release.get('assets', [])
             asset_names = [a.get('name', '') for a in assets]
@@ -727,6 +2035,7 @@ class UpdateWindow(QMainWindow):
 
     def on_download_finished(self, success, filename):
         if success:
+            self.current_filename = filename
             self.lbl_status.setText("下载完成")
             self.append_log(f"文件已保存为: {filename}")
             self.btn_install.setEnabled(True)
@@ -748,20 +2057,37 @@ from PySide2.QtCore import QTimer
 
 
 def main():
-    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
-    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
-
-    app = QApplication(sys.argv)
-
     parser = argparse.ArgumentParser(description="课堂抽号程序更新工具 (GUI版)")
     parser.add_argument('-y', '--auto-download', action='store_true', help="自动下载，无需确认")
     parser.add_argument('--debug', action='store_true', help="调试模式，工作目录为./debug")
     parser.add_argument('--mirror-only', action='store_true', help="优先使用镜像站下载GitHub资源")
     parser.add_argument('--version-type', choices=['pyinstaller', 'nuitka'], default=None,
                         help="指定版本类型 (pyinstaller/nuitka)，如未指定则弹窗选择或使用配置文件")
+    parser.add_argument('--cache-ttl', type=int, default=None,
+                        help="发布信息缓存有效期(秒)，0表示每次都发起条件请求；默认读取配置文件")
+    parser.add_argument('--segments', type=int, default=None,
+                        help="并行下载的分段数，1表示只断点续传不并行；默认读取配置文件")
+    parser.add_argument('--min-speed', type=int, default=None,
+                        help="下载速度低于该值(KB/s)时切换下载源，0表示不切换；默认读取配置文件")
+    parser.add_argument('--agent', action='store_true',
+                        help="以后台更新代理运行：不显示界面，空闲时检查并预下载更新")
+    parser.add_argument('--rollback', action='store_true',
+                        help="把已安装的版本切换回上一个版本后退出")
 
     args, unknown = parser.parse_known_args()
 
+    if args.agent:
+        run_agent(args)
+        return
+    if args.rollback:
+        checker = UpdateChecker(log_callback=print, progress_callback=None, debug_mode=args.debug)
+        sys.exit(0 if checker.rollback_version() else 1)
+
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
+    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
+
+    app = QApplication(sys.argv)
+
     version_type = None
     if args.version_type:
         if args.version_type == 'nuitka':
@@ -777,12 +2103,33 @@ def main():
     window = UpdateWindow(
         debug=args.debug,
         mirror_only=args.mirror_only,
-        auto_download=args.auto_download
+        auto_download=args.auto_download,
+        cache_ttl=args.cache_ttl,
+        download_segments=args.segments,
+        min_download_speed=args.min_speed
     )
     window.show()
 
     sys.exit(app.exec_())
 
 
+def run_agent(args):
+    config = UpdateConfig.load()
+    checker = UpdateChecker(
+        log_callback=None,
+        progress_callback=None,
+        debug_mode=args.debug,
+        mirror_only=args.mirror_only,
+        version_type=VersionType(config.get('version_type', VersionType.PYINSTALLER.value)),
+        cache_ttl=config.get('release_cache_ttl', DEFAULT_RELEASE_CACHE_TTL),
+        download_segments=args.segments if args.segments is not None else config.get('download_segments', DEFAULT_DOWNLOAD_SEGMENTS),
+        # 限速时不按速度下限切换下载源
+        min_download_speed=0,
+        bandwidth_limit=config.get('background_bandwidth', DEFAULT_BACKGROUND_BANDWIDTH),
+        endpoints=config,
+    )
+    UpdateAgent(checker, config.get('auto_check_interval', DEFAULT_AUTO_CHECK_INTERVAL)).run()
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+并列安装的版本目录与 current 指针
+每个版本解压在 versions/<版本号>/ 下，current.json 记录当前使用的版本和上一个版本；
+启动器和守护进程按指针启动对应目录中的程序，切换版本、回滚都只需原子地改写指针文件。
+没有指针（旧版直接覆盖安装的目录结构）时使用程序根目录
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+
+VERSIONS_DIR = 'versions'
+CURRENT_FILE = 'current.json'
+STAGING_SUFFIX = '.staging'
+# 临时目录超过该时长（秒）未修改才视为中断的安装，避免删除另一个进程正在解压的目录
+STAGING_MAX_AGE = 3600
+# 版本号直接用作 versions/ 下的目录名，而它来自远程发布信息的标签名：
+# 只允许字母、数字和 . _ + -，且不能以 . 开头，避免 "release/v2"、".." 之类的标签嵌套或越出版本目录
+VERSION_NAME_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9._+-]{0,63}')
+
+
+def is_valid_version_name(version):
+    """版本号能否用作版本目录名；以 .staging 结尾的名称会被当作临时目录清理，同样不允许"""
+    return (isinstance(version, str) and VERSION_NAME_PATTERN.fullmatch(version) is not None
+            and not version.endswith(STAGING_SUFFIX))
+
+
+class VersionStore:
+    """版本目录与 current 指针"""
+    def __init__(self, root='.'):
+        self.root = root
+        self.versions_root = os.path.join(root, VERSIONS_DIR)
+        self.pointer_path = os.path.join(root, CURRENT_FILE)
+
+    def load_pointer(self):
+        """读取指针，不存在或损坏时返回空指针"""
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                pointer = json.load(f)
+        except (OSError, ValueError):
+            pointer = {}
+        if not isinstance(pointer, dict):
+            pointer = {}
+        pointer.setdefault('version', None)
+        pointer.setdefault('previous', None)
+        return pointer
+
+    def current(self):
+        """当前版本号，未使用并列安装或指向的目录已不存在时返回 None"""
+        version = self.load_pointer()['version']
+        if is_valid_version_name(version) and os.path.isdir(self.version_dir(version)):
+            return version
+        return None
+
+    def previous(self):
+        return self.load_pointer()['previous']
+
+    def version_dir(self, version):
+        """版本号为 None 时表示程序根目录；版本号不能用作目录名时抛出 ValueError"""
+        if version is None:
+            return self.root
+        if not is_valid_version_name(version):
+            raise ValueError(f'版本号 {version!r} 不能用作目录名')
+        return os.path.join(self.versions_root, version)
+
+    def current_dir(self):
+        return self.version_dir(self.current())
+
+    def resolve(self, name):
+        """当前版本目录中的程序文件，不存在时回退到根目录中的同名文件"""
+        path = os.path.join(self.current_dir(), name)
+        if os.path.exists(path):
+            return path
+        return os.path.join(self.root, name)
+
+    def list_versions(self):
+        """已安装的版本号，按安装时间从新到旧排序"""
+        if not os.path.isdir(self.versions_root):
+            return []
+        versions = [name for name in os.listdir(self.versions_root)
+                    if is_valid_version_name(name)
+                    and os.path.isdir(os.path.join(self.versions_root, name))]
+        return sorted(versions, key=lambda name: os.path.getmtime(self.version_dir(name)), reverse=True)
+
+    # ---------- 切换 ----------
+    def switch(self, version):
+        """把指针指向 version（None 表示根目录），原来的版本记为上一个版本"""
+        if version is not None and not os.path.isdir(self.version_dir(version)):
+            raise KeyError(f'版本 {version} 不存在')
+        pointer = self.load_pointer()
+        if pointer['version'] != version:
+            pointer['previous'] = pointer['version']
+        pointer['version'] = version
+        pointer['switched_at'] = time.time()
+        tmp_path = f'{self.pointer_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.pointer_path)
+
+    def rollback(self):
+        """切换回上一个版本，返回切换后的版本号；没有可回滚的版本时抛出 KeyError"""
+        pointer = self.load_pointer()
+        if pointer['version'] is None:
+            raise KeyError('没有可回滚的版本')
+        previous = pointer['previous']
+        self.switch(previous)
+        return previous
+
+    # ---------- 清理 ----------
+    def disk_usage(self, version):
+        total = 0
+        for root, _, files in os.walk(self.version_dir(version)):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def collect_garbage(self, budget_bytes):
+        """
+        删除最旧的版本直到总大小不超过预算，当前版本和上一个版本始终保留；
+        各版本间硬链接的文件按每个目录各自计算，结果偏保守
+        返回被删除的版本号列表
+        """
+        pointer = self.load_pointer()
+        keep = {pointer['version'], pointer['previous']}
+        if os.path.isdir(self.versions_root):
+            # 清理中断的安装留下的临时目录
+            now = time.time()
+            for name in os.listdir(self.versions_root):
+                path = os.path.join(self.versions_root, name)
+                if not name.endswith(STAGING_SUFFIX):
+                    continue
+                try:
+                    stale = now - os.path.getmtime(path) > STAGING_MAX_AGE
+                except OSError:
+                    continue
+                if stale:
+                    shutil.rmtree(path, ignore_errors=True)
+        versions = self.list_versions()
+        sizes = {version: self.disk_usage(version) for version in versions}
+        total = sum(sizes.values())
+        removed = []
+        for version in reversed(versions):
+            if total <= budget_bytes:
+                break
+            if version in keep:
+                continue
+            shutil.rmtree(self.version_dir(version), ignore_errors=True)
+            if not os.path.exists(self.version_dir(version)):
+                total -= sizes[version]
+                removed.append(version)
+        return removed